@@ -1,5 +1,5 @@
 import runpod
-from runpod.serverless.utils import rp_upload
+import asyncio
 import json
 import urllib.request
 import urllib.parse
@@ -7,18 +7,46 @@ import time
 import os
 import requests
 import base64
-from io import BytesIO
 import websocket
-import uuid
-import tempfile
+import queue
+import signal
 import socket
+import threading
 import traceback
+import uuid
 import logging
-
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from comfy_client import ComfyClient
+from comfy_health import READY, ComfyHealth
+from comfy_ws import (
+    ComfyWebsocketManager,
+    EVENT_BINARY,
+    EVENT_DISCONNECTED,
+    EVENT_RECONNECTED,
+    decode_image_frame,
+    reconnect_delay,
+)
+from input_cache import InputImageCache, rewrite_image_names, unrewritten_names
+from input_images import MultipartImageBody
+from job_batcher import JobBatcher, batch_key, merge_workflows, split_outputs
+from job_deadline import DEADLINE, DeadlineExceeded, JobDeadline, SharedDeadline
+from job_timings import JobTimings
+from metrics import MetricsRegistry, TextfileExporter, start_http_server
+from model_index import ModelIndex, load_model_folders
+from object_info import ObjectInfoCache, format_errors, input_options, validate_workflow
+from workflow_templates import TemplateError, load_templates
+from warmup import WarmupTimeline, warmup_workflow
 from network_volume import (
+    get_network_volume_diagnostics,
     is_network_volume_debug_enabled,
     run_network_volume_diagnostics,
 )
+from output_encoding import parse_output_options, transcode
+from progress import ProgressReporter
+from queue_gate import ComfyQueueGate, model_fingerprint
+import s3_upload
+import crash_diagnostics
 
 # ---------------------------------------------------------------------------
 # Logging setup
@@ -26,6 +54,9 @@ from network_volume import (
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Start of the handler process; the warm-up timeline is measured from here
+WORKER_STARTED_AT = time.monotonic()
+
 # Time to wait between API check attempts in milliseconds
 COMFY_API_AVAILABLE_INTERVAL_MS = 50
 # Maximum number of API check attempts
@@ -33,11 +64,14 @@ COMFY_API_AVAILABLE_MAX_RETRIES = 500
 # Websocket reconnection behaviour (can be overridden through environment variables)
 # NOTE: more attempts and diagnostics improve debuggability whenever ComfyUI crashes mid-job.
 #   • WEBSOCKET_RECONNECT_ATTEMPTS sets how many times we will try to reconnect.
-#   • WEBSOCKET_RECONNECT_DELAY_S sets the sleep in seconds between attempts.
+#   • WEBSOCKET_RECONNECT_DELAY_S sets the sleep in seconds after the first failed
+#     attempt; it doubles (with jitter) after every further one, up to
+#     WEBSOCKET_RECONNECT_MAX_DELAY_S.
 #
-# If the respective env-vars are not supplied we fall back to sensible defaults ("5" and "3").
+# If the respective env-vars are not supplied we fall back to sensible defaults ("5", "1" and "10").
 WEBSOCKET_RECONNECT_ATTEMPTS = int(os.environ.get("WEBSOCKET_RECONNECT_ATTEMPTS", 5))
-WEBSOCKET_RECONNECT_DELAY_S = int(os.environ.get("WEBSOCKET_RECONNECT_DELAY_S", 3))
+WEBSOCKET_RECONNECT_DELAY_S = float(os.environ.get("WEBSOCKET_RECONNECT_DELAY_S", 1))
+WEBSOCKET_RECONNECT_MAX_DELAY_S = float(os.environ.get("WEBSOCKET_RECONNECT_MAX_DELAY_S", 10))
 
 # Extra verbose websocket trace logs (set WEBSOCKET_TRACE=true to enable)
 if os.environ.get("WEBSOCKET_TRACE", "false").lower() == "true":
@@ -50,6 +84,196 @@ COMFY_HOST = "127.0.0.1:8188"
 # Enforce a clean state after each job is done
 # see https://docs.runpod.io/docs/handler-additional-controls#refresh-worker
 REFRESH_WORKER = os.environ.get("REFRESH_WORKER", "false").lower() == "true"
+# Number of jobs this worker handles at the same time (1 = strictly one job at a time)
+COMFY_MAX_CONCURRENCY = int(os.environ.get("COMFY_MAX_CONCURRENCY", 1))
+# Maximum number of this worker's prompts inside ComfyUI's queue (running + pending).
+# With 2, the next prompt is already queued while the previous job post-processes its outputs.
+COMFY_MAX_QUEUED_PROMPTS = int(os.environ.get("COMFY_MAX_QUEUED_PROMPTS", 2))
+# Seconds to wait for a websocket event before logging that we are still waiting
+WEBSOCKET_EVENT_WAIT_S = 10
+# Number of input images uploaded to ComfyUI at the same time (per job)
+COMFY_INPUT_UPLOAD_WORKERS = int(os.environ.get("COMFY_INPUT_UPLOAD_WORKERS", 4))
+# Number of threads that fetch, encode and upload output images in parallel
+COMFY_OUTPUT_WORKERS = int(os.environ.get("COMFY_OUTPUT_WORKERS", 4))
+# Read output images straight from ComfyUI's directories instead of GET /view
+# (ComfyUI and the handler share the filesystem; /view remains the fallback)
+COMFY_LOCAL_OUTPUTS = os.environ.get("COMFY_LOCAL_OUTPUTS", "true").lower() == "true"
+# ComfyUI directory for each image "type" reported in the history
+COMFY_IMAGE_DIRS = {
+    "output": os.environ.get("COMFY_OUTPUT_PATH", "/comfyui/output"),
+    "input": os.environ.get("COMFY_INPUT_PATH", "/comfyui/input"),
+    "temp": os.environ.get("COMFY_TEMP_PATH", "/comfyui/temp"),
+}
+# Keep input images under content-addressed names and skip re-uploading known ones
+COMFY_INPUT_CACHE = os.environ.get("COMFY_INPUT_CACHE", "true").lower() == "true"
+# Size limit of cached input images in ComfyUI's input directory (LRU eviction)
+COMFY_INPUT_CACHE_MAX_MB = int(os.environ.get("COMFY_INPUT_CACHE_MAX_MB", 1024))
+# Check workflows against the cached /object_info schema before queueing them
+COMFY_VALIDATE_WORKFLOWS = (
+    os.environ.get("COMFY_VALIDATE_WORKFLOWS", "true").lower() == "true"
+)
+# Refetch /object_info after this many seconds (0 = only when it looks stale)
+COMFY_OBJECT_INFO_TTL_S = float(os.environ.get("COMFY_OBJECT_INFO_TTL_S", 0))
+# Directory with the named workflow templates jobs can refer to
+COMFY_TEMPLATES_DIR = os.environ.get("COMFY_TEMPLATES_DIR", "/templates")
+# Cross-job batching: how long the first job waits for compatible jobs (0 = off)
+COMFY_BATCH_WINDOW_MS = int(os.environ.get("COMFY_BATCH_WINDOW_MS", 0))
+# Maximum number of jobs merged into one prompt
+COMFY_BATCH_MAX_SIZE = int(os.environ.get("COMFY_BATCH_MAX_SIZE", 4))
+# Input names whose values may differ between jobs of one batch
+COMFY_BATCH_VARYING_INPUTS = [
+    name.strip()
+    for name in os.environ.get(
+        "COMFY_BATCH_VARYING_INPUTS", "seed,noise_seed,text,value,filename_prefix"
+    ).split(",")
+    if name.strip()
+]
+# How often a waiting job may be passed over by jobs using the models already
+# loaded in ComfyUI (0 = strict arrival order)
+COMFY_AFFINITY_MAX_SKIPS = int(os.environ.get("COMFY_AFFINITY_MAX_SKIPS", 3))
+# Output nodes that send their images as binary websocket frames instead of
+# writing them to the output directory
+COMFY_WEBSOCKET_OUTPUT_NODES = {
+    name.strip()
+    for name in os.environ.get("COMFY_WEBSOCKET_OUTPUT_NODES", "SaveImageWebsocket").split(",")
+    if name.strip()
+}
+# Fetch /history after every prompt to check the outputs announced by "executed"
+# events (it is always fetched when no event announced any output)
+COMFY_VERIFY_HISTORY = os.environ.get("COMFY_VERIFY_HISTORY", "false").lower() == "true"
+# Generator handler that streams progress updates while the prompt runs
+COMFY_STREAM_PROGRESS = os.environ.get("COMFY_STREAM_PROGRESS", "false").lower() == "true"
+# Minimum time between two streamed progress updates of a job
+COMFY_PROGRESS_INTERVAL_MS = int(os.environ.get("COMFY_PROGRESS_INTERVAL_MS", 1000))
+# Longest side (px) of streamed latent previews
+COMFY_PREVIEW_MAX_SIZE = int(os.environ.get("COMFY_PREVIEW_MAX_SIZE", 256))
+# Template run once at worker start to load its models ("" = no warm-up)
+COMFY_WARMUP_TEMPLATE = os.environ.get("COMFY_WARMUP_TEMPLATE", "z_image_s4v4nn4h")
+# Template parameters of the warm-up run (JSON), keeping it as cheap as possible
+COMFY_WARMUP_PARAMS = json.loads(
+    os.environ.get(
+        "COMFY_WARMUP_PARAMS", '{"width": 256, "height": 256, "steps": 1, "batch_size": 1}'
+    )
+)
+# Longest time the warm-up prompt may run (seconds, 0 = no limit); it is then
+# interrupted and the worker starts taking jobs anyway
+COMFY_WARMUP_TIMEOUT_S = float(os.environ.get("COMFY_WARMUP_TIMEOUT_S", 600))
+
+# Longest time a job may run (ms, 0 = no limit); jobs can set their own "deadline_ms"
+COMFY_JOB_DEADLINE_MS = int(os.environ.get("COMFY_JOB_DEADLINE_MS", 0))
+# Seconds to wait for ComfyUI to confirm that an interrupted prompt stopped
+PROMPT_STOP_WAIT_S = 5
+# ComfyUI's log file (written by start.sh), tailed into the crash diagnostics
+COMFY_LOG_PATH = os.environ.get("COMFY_LOG_PATH", "/var/log/comfyui.log")
+# Longest time spent collecting crash diagnostics once ComfyUI is down
+COMFY_CRASH_DIAGNOSTICS_BUDGET_MS = int(os.environ.get("COMFY_CRASH_DIAGNOSTICS_BUDGET_MS", 1000))
+
+# Port of the Prometheus /metrics endpoint (0 = not served)
+COMFY_METRICS_PORT = int(os.environ.get("COMFY_METRICS_PORT", 0))
+# Interface the /metrics endpoint binds to (set to 0.0.0.0 to expose it beyond the worker)
+COMFY_METRICS_HOST = os.environ.get("COMFY_METRICS_HOST", "127.0.0.1")
+# File written for node_exporter's textfile collector when no port can be exposed ("" = off)
+COMFY_METRICS_TEXTFILE = os.environ.get("COMFY_METRICS_TEXTFILE", "")
+# Seconds between two writes of COMFY_METRICS_TEXTFILE
+COMFY_METRICS_TEXTFILE_INTERVAL_S = float(os.environ.get("COMFY_METRICS_TEXTFILE_INTERVAL_S", 15))
+
+# ---------------------------------------------------------------------------
+# Worker-wide ComfyUI connections (shared by all jobs)
+# ---------------------------------------------------------------------------
+# Keep-alive HTTP client used for every call to the ComfyUI API
+comfy_client = ComfyClient(COMFY_HOST)
+# Readiness gate and health state of ComfyUI, kept up to date by the websocket
+# and by failed requests so jobs do not probe ComfyUI themselves
+comfy_health = ComfyHealth(
+    wait_ready=lambda: check_server(
+        f"http://{COMFY_HOST}/",
+        COMFY_API_AVAILABLE_MAX_RETRIES,
+        COMFY_API_AVAILABLE_INTERVAL_MS,
+    ),
+    probe=lambda: _comfy_server_status()["reachable"],
+)
+# OOM kills of the container's memory cgroup before this worker started, so the
+# crash diagnostics only blame kills that happened since
+OOM_KILLS_AT_START = crash_diagnostics.oom_kill_count()
+# Persistent websocket; reconnects in its own thread
+ws_manager = ComfyWebsocketManager(
+    COMFY_HOST,
+    reconnect=lambda ws_url, error: _reconnect_websocket(ws_url, error),
+    on_status=lambda status: _on_comfy_status(),
+)
+# Limits how many prompts concurrent jobs keep inside ComfyUI's queue
+queue_gate = ComfyQueueGate(
+    COMFY_MAX_QUEUED_PROMPTS, lambda: ws_manager.queue_remaining, COMFY_AFFINITY_MAX_SKIPS
+)
+# Content-addressed index of input images already uploaded to ComfyUI
+input_cache = (
+    InputImageCache(COMFY_IMAGE_DIRS["input"], COMFY_INPUT_CACHE_MAX_MB * 1024 * 1024)
+    if COMFY_INPUT_CACHE
+    else None
+)
+# Inventory of the model folders in extra_model_paths.yaml (refreshed incrementally)
+model_index = ModelIndex(load_model_folders())
+# Node schema used to validate workflows locally
+object_info_cache = ObjectInfoCache(lambda: fetch_object_info(), COMFY_OBJECT_INFO_TTL_S)
+# Named workflow templates, compiled once
+workflow_templates = load_templates(COMFY_TEMPLATES_DIR)
+# Merges compatible concurrent jobs into one prompt (needs COMFY_MAX_CONCURRENCY > 1)
+job_batcher = (
+    JobBatcher(COMFY_BATCH_WINDOW_MS / 1000, COMFY_BATCH_MAX_SIZE, lambda w: run_batch(w))
+    if COMFY_BATCH_WINDOW_MS > 0
+    else None
+)
+# Deadline of every running job by job id (used to cancel jobs RunPod stopped)
+running_jobs = {}
+# Bounded thread pool for output retrieval / encoding / upload (shared by all jobs)
+output_pool = ThreadPoolExecutor(
+    max_workers=COMFY_OUTPUT_WORKERS, thread_name_prefix="comfy-output"
+)
+
+# ---------------------------------------------------------------------------
+# Prometheus metrics (rendered only when scraped / written, see metrics.py)
+# ---------------------------------------------------------------------------
+metrics = MetricsRegistry()
+job_duration = metrics.histogram(
+    "worker_comfyui_job_duration_seconds",
+    "Time from job start to result.",
+    ("workflow", "status"),
+)
+job_stage_duration = metrics.histogram(
+    "worker_comfyui_job_stage_duration_seconds",
+    "Time a job spent in each stage (per-image stages are summed per job).",
+    ("stage", "workflow"),
+)
+websocket_reconnects = metrics.counter(
+    "worker_comfyui_websocket_reconnects_total",
+    "Websocket reconnects to ComfyUI by outcome (reconnected, failed, comfyui_down).",
+    ("result",),
+)
+transfer_bytes = metrics.counter(
+    "worker_comfyui_transfer_bytes_total",
+    "Image bytes moved by the worker.",
+    ("direction", "peer"),
+)
+jobs_stopped = metrics.counter(
+    "worker_comfyui_jobs_stopped_total",
+    "Jobs stopped because their deadline passed or they were cancelled, by stage.",
+    ("reason", "stage"),
+)
+comfyui_crashes = metrics.counter(
+    "worker_comfyui_crashes_total",
+    "ComfyUI crashes by the classification of the crash diagnostics.",
+    ("classification",),
+)
+metrics.gauge(
+    "worker_comfyui_up",
+    "1 while ComfyUI is ready, 0 while starting or unhealthy.",
+    callback=lambda: int(comfy_health.state == READY),
+)
+metrics.gauge(
+    "worker_comfyui_queue_remaining",
+    "Prompts in ComfyUI's queue as last reported on the websocket.",
+    callback=lambda: ws_manager.queue_remaining,
+)
 
 # ---------------------------------------------------------------------------
 # Helper: quick reachability probe of ComfyUI HTTP endpoint (port 8188)
@@ -59,7 +283,7 @@ REFRESH_WORKER = os.environ.get("REFRESH_WORKER", "false").lower() == "true"
 def _comfy_server_status():
     """Return a dictionary with basic reachability info for the ComfyUI HTTP server."""
     try:
-        resp = requests.get(f"http://{COMFY_HOST}/", timeout=5)
+        resp = comfy_client.get("/", "probe")
         return {
             "reachable": resp.status_code == 200,
             "status_code": resp.status_code,
@@ -71,93 +295,49 @@ def _comfy_server_status():
 def _collect_crash_diagnostics():
     """
     Collect system diagnostics after ComfyUI crashes to help identify root cause
-    (OOM kill, CUDA error, etc.). Returns a dict of diagnostic info.
+    (OOM kill, CUDA error, etc.). Returns a dict of diagnostic info (see
+    crash_diagnostics.collect).
     """
-    import subprocess
+    return crash_diagnostics.collect(
+        "comfyui/main.py",
+        COMFY_LOG_PATH,
+        COMFY_CRASH_DIAGNOSTICS_BUDGET_MS / 1000,
+        oom_kills_at_start=OOM_KILLS_AT_START,
+    )
 
-    diag = {}
 
-    # Check if ComfyUI process is still running
-    try:
-        result = subprocess.run(
-            ["pgrep", "-f", "comfyui/main.py"],
-            capture_output=True, text=True, timeout=5,
-        )
-        diag["comfyui_process_alive"] = result.returncode == 0
-        if result.stdout.strip():
-            diag["comfyui_pids"] = result.stdout.strip().split("\n")
-    except Exception as e:
-        diag["comfyui_process_check_error"] = str(e)
-
-    # Check dmesg for recent OOM kills
-    try:
-        result = subprocess.run(
-            ["dmesg", "-T"],
-            capture_output=True, text=True, timeout=5,
-        )
-        oom_lines = [
-            line for line in result.stdout.splitlines()
-            if "oom" in line.lower() or "killed process" in line.lower()
-                or "out of memory" in line.lower()
-        ]
-        if oom_lines:
-            diag["oom_kill_detected"] = True
-            diag["oom_messages"] = oom_lines[-5:]  # last 5 OOM lines
-        else:
-            diag["oom_kill_detected"] = False
-    except Exception as e:
-        diag["dmesg_error"] = str(e)
+def _on_comfy_status():
+    """Websocket status event: ComfyUI is alive and its queue size changed."""
+    comfy_health.mark_ready()
+    queue_gate.notify()
 
-    # GPU memory usage via nvidia-smi
-    try:
-        result = subprocess.run(
-            ["nvidia-smi", "--query-gpu=memory.used,memory.total,gpu_name",
-             "--format=csv,noheader,nounits"],
-            capture_output=True, text=True, timeout=5,
-        )
-        if result.returncode == 0 and result.stdout.strip():
-            diag["gpu_info"] = result.stdout.strip()
-        elif result.stderr.strip():
-            diag["nvidia_smi_error"] = result.stderr.strip()
-    except Exception as e:
-        diag["nvidia_smi_error"] = str(e)
 
-    # System memory
+def _reconnect_websocket(ws_url, error):
+    """Reconnect the shared websocket and record the outcome in comfy_health."""
     try:
-        result = subprocess.run(
-            ["free", "-h"],
-            capture_output=True, text=True, timeout=5,
+        new_ws = _attempt_websocket_reconnect(
+            ws_url, WEBSOCKET_RECONNECT_ATTEMPTS, WEBSOCKET_RECONNECT_DELAY_S, error
         )
-        if result.returncode == 0:
-            diag["system_memory"] = result.stdout.strip()
-    except Exception as e:
-        diag["free_error"] = str(e)
+    except websocket.WebSocketConnectionClosedException as e:
+        comfy_health.mark_unhealthy(str(e))
+        raise
+    comfy_health.mark_ready()
+    return new_ws
 
-    # Tail of ComfyUI log file (captures the actual crash output)
-    comfy_log = "/var/log/comfyui.log"
-    try:
-        if os.path.exists(comfy_log):
-            result = subprocess.run(
-                ["tail", "-n", "50", comfy_log],
-                capture_output=True, text=True, timeout=5,
-            )
-            if result.stdout.strip():
-                diag["comfyui_log_tail"] = result.stdout.strip()
-    except Exception as e:
-        diag["comfyui_log_error"] = str(e)
 
-    return diag
-
-
-def _attempt_websocket_reconnect(ws_url, max_attempts, delay_s, initial_error):
+def _attempt_websocket_reconnect(
+    ws_url, max_attempts, delay_s, initial_error, max_delay_s=WEBSOCKET_RECONNECT_MAX_DELAY_S
+):
     """
     Attempts to reconnect to the WebSocket server after a disconnect.
 
     Args:
         ws_url (str): The WebSocket URL (including client_id).
         max_attempts (int): Maximum number of reconnection attempts.
-        delay_s (int): Delay in seconds between attempts.
+        delay_s (float): Delay in seconds after the first failed attempt; doubled
+            (with jitter) after every further one.
         initial_error (Exception): The error that triggered the reconnect attempt.
+        max_delay_s (float, optional): Upper bound of the delay between attempts.
 
     Returns:
         websocket.WebSocket: The newly connected WebSocket object.
@@ -184,20 +364,30 @@ def _attempt_websocket_reconnect(ws_url, max_attempts, delay_s, initial_error):
 
             # Collect diagnostics to help identify root cause (OOM, CUDA, etc.)
             diag = _collect_crash_diagnostics()
-            for key, val in diag.items():
-                print(f"worker-comfyui - CRASH DIAG [{key}]: {val}")
+            print(f"worker-comfyui - CRASH DIAG: {json.dumps(diag)}")
 
             crash_reason = "ComfyUI process crashed during execution"
+            classification = "unknown"
             if diag.get("oom_kill_detected"):
+                classification = "oom"
                 crash_reason = (
                     "ComfyUI was OOM-killed (out of memory). "
                     "Try a GPU with more VRAM or use a smaller/more quantized model."
                 )
+            elif diag.get("cuda_oom_in_log"):
+                classification = "cuda_oom"
+                crash_reason = (
+                    "ComfyUI ran out of GPU memory (CUDA out of memory). "
+                    "Try a GPU with more VRAM, a smaller resolution or a more quantized model."
+                )
             elif diag.get("comfyui_process_alive") is False:
+                classification = "process_exited"
                 crash_reason = (
                     "ComfyUI process is no longer running (likely crashed). "
                     "Check logs above for CUDA errors or segfaults."
                 )
+            comfyui_crashes.inc(classification=classification)
+            websocket_reconnects.inc(result="comfyui_down")
 
             raise websocket.WebSocketConnectionClosedException(crash_reason)
 
@@ -210,6 +400,7 @@ def _attempt_websocket_reconnect(ws_url, max_attempts, delay_s, initial_error):
             new_ws = websocket.WebSocket()
             new_ws.connect(ws_url, timeout=10)  # Use existing ws_url
             print(f"worker-comfyui - Websocket reconnected successfully.")
+            websocket_reconnects.inc(result="reconnected")
             return new_ws  # Return the new connected socket
         except (
             websocket.WebSocketException,
@@ -222,15 +413,17 @@ def _attempt_websocket_reconnect(ws_url, max_attempts, delay_s, initial_error):
                 f"worker-comfyui - Reconnect attempt {attempt + 1} failed: {reconn_err}"
             )
             if attempt < max_attempts - 1:
+                wait_s = reconnect_delay(attempt, delay_s, max_delay_s)
                 print(
-                    f"worker-comfyui - Waiting {delay_s} seconds before next attempt..."
+                    f"worker-comfyui - Waiting {wait_s:.2f} seconds before next attempt..."
                 )
-                time.sleep(delay_s)
+                time.sleep(wait_s)
             else:
                 print(f"worker-comfyui - Max reconnection attempts reached.")
 
     # If loop completes without returning, raise an exception
     print("worker-comfyui - Failed to reconnect websocket after connection closed.")
+    websocket_reconnects.inc(result="failed")
     raise websocket.WebSocketConnectionClosedException(
         f"Connection closed and failed to reconnect. Last error: {last_reconnect_error}"
     )
@@ -258,16 +451,34 @@ def validate_input(job_input):
         except json.JSONDecodeError:
             return None, "Invalid JSON format in input"
 
-    # Validate 'workflow' in input
+    # Validate 'workflow' in input (or build it from a named template)
     workflow = job_input.get("workflow")
+    template = None
+    template_name = job_input.get("template")
+    if workflow is None and template_name is not None:
+        template = workflow_templates.get(template_name)
+        if template is None:
+            available = ", ".join(sorted(workflow_templates)) or "none"
+            return None, f"Unknown template '{template_name}'. Available templates: {available}"
+        try:
+            workflow = template.bind(job_input.get("params"))
+        except TemplateError as e:
+            return None, str(e)
     if workflow is None:
         return None, "Missing 'workflow' parameter"
+    if not isinstance(workflow, dict) or not all(
+        isinstance(node, dict) for node in workflow.values()
+    ):
+        return None, "'workflow' must be an object mapping node ids to nodes (API format)"
 
     # Validate 'images' in input, if provided
     images = job_input.get("images")
     if images is not None:
         if not isinstance(images, list) or not all(
-            "name" in image and "image" in image for image in images
+            isinstance(image, dict)
+            and isinstance(image.get("name"), str)
+            and isinstance(image.get("image"), str)
+            for image in images
         ):
             return (
                 None,
@@ -277,11 +488,38 @@ def validate_input(job_input):
     # Optional: API key for Comfy.org API Nodes, passed per-request
     comfy_org_api_key = job_input.get("comfy_org_api_key")
 
+    # Optional: re-run the network volume diagnostics before this job
+    refresh_diagnostics = job_input.get("refresh_diagnostics", False) is True
+
+    # Optional: stream downscaled latent previews (COMFY_STREAM_PROGRESS mode only)
+    stream_previews = job_input.get("stream_previews", False) is True
+
+    # Optional: re-encode the output images (format, quality, size, metadata)
+    output_options, error_message = parse_output_options(job_input)
+    if error_message:
+        return None, error_message
+
+    # Optional: add the job's stage timings to the result
+    return_timings = job_input.get("return_timings", False) is True
+
+    # Optional: time limit of this job (replaces COMFY_JOB_DEADLINE_MS)
+    deadline_ms = job_input.get("deadline_ms")
+    if deadline_ms is not None and (
+        not isinstance(deadline_ms, int) or isinstance(deadline_ms, bool) or deadline_ms <= 0
+    ):
+        return None, "'deadline_ms' must be a positive integer"
+
     # Return validated data and no error
     return {
         "workflow": workflow,
+        "template": template,
         "images": images,
         "comfy_org_api_key": comfy_org_api_key,
+        "refresh_diagnostics": refresh_diagnostics,
+        "stream_previews": stream_previews,
+        "output_options": output_options,
+        "return_timings": return_timings,
+        "deadline_ms": deadline_ms,
     }, None
 
 
@@ -301,7 +539,7 @@ def check_server(url, retries=500, delay=50):
     print(f"worker-comfyui - Checking API server at {url}...")
     for i in range(retries):
         try:
-            response = requests.get(url, timeout=5)
+            response = comfy_client.get(url, "probe")
 
             # If the response status code is 200, the server is up and running
             if response.status_code == 200:
@@ -321,10 +559,65 @@ def check_server(url, retries=500, delay=50):
     return False
 
 
+def _upload_image(image):
+    """
+    Upload a single base64 encoded image to the ComfyUI /upload/image endpoint.
+
+    The base64 payload is decoded while the request body is streamed, so the
+    decoded image is never held in memory as a whole.
+
+    Args:
+        image (dict): Dictionary with the 'name' and the base64 'image' (optionally a data URI).
+
+    Returns:
+        tuple: (success message or None, error message or None)
+    """
+    # Name shown in messages (the name the client sent, not the cached one)
+    label = image.get("original_name", image.get("name", "unknown"))
+    try:
+        name = image["name"]
+        image_data_uri = image["image"]  # Full string (might have a data URI prefix)
+
+        if input_cache and input_cache.contains(name):
+            print(f"worker-comfyui - {label} is already in ComfyUI as {name}, skipping upload")
+            return f"Reused cached {label}", None
+
+        body = MultipartImageBody(name, image_data_uri, fields={"overwrite": "true"})
+
+        # POST request to upload the image
+        response = comfy_client.post(
+            "/upload/image",
+            "upload",
+            data=body,
+            headers={"Content-Type": body.content_type},
+        )
+        response.raise_for_status()
+        transfer_bytes.inc(body.image_size, direction="upload", peer="comfyui")
+        if input_cache:
+            input_cache.add(name, body.image_size)
+
+        print(f"worker-comfyui - Successfully uploaded {label}")
+        return f"Successfully uploaded {label}", None
+
+    except base64.binascii.Error as e:
+        error_msg = f"Error decoding base64 for {label}: {e}"
+    except requests.Timeout:
+        error_msg = f"Timeout uploading {label}"
+    except requests.RequestException as e:
+        error_msg = f"Error uploading {label}: {e}"
+    except Exception as e:
+        error_msg = f"Unexpected error uploading {label}: {e}"
+    print(f"worker-comfyui - {error_msg}")
+    return None, error_msg
+
+
 def upload_images(images):
     """
     Upload a list of base64 encoded images to the ComfyUI server using the /upload/image endpoint.
 
+    Images are uploaded concurrently (at most COMFY_INPUT_UPLOAD_WORKERS at a time);
+    results and errors are reported in input order.
+
     Args:
         images (list): A list of dictionaries, each containing the 'name' of the image and the 'image' as a base64 encoded string.
 
@@ -339,55 +632,15 @@ def upload_images(images):
 
     print(f"worker-comfyui - Uploading {len(images)} image(s)...")
 
-    for image in images:
-        try:
-            name = image["name"]
-            image_data_uri = image["image"]  # Get the full string (might have prefix)
-
-            # --- Strip Data URI prefix if present ---
-            if "," in image_data_uri:
-                # Find the comma and take everything after it
-                base64_data = image_data_uri.split(",", 1)[1]
+    workers = min(len(images), COMFY_INPUT_UPLOAD_WORKERS)
+    with ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="comfy-input"
+    ) as upload_pool:
+        for response, error_msg in upload_pool.map(_upload_image, images):
+            if error_msg:
+                upload_errors.append(error_msg)
             else:
-                # Assume it's already pure base64
-                base64_data = image_data_uri
-            # --- End strip ---
-
-            blob = base64.b64decode(base64_data)  # Decode the cleaned data
-
-            # Prepare the form data
-            files = {
-                "image": (name, BytesIO(blob), "image/png"),
-                "overwrite": (None, "true"),
-            }
-
-            # POST request to upload the image
-            response = requests.post(
-                f"http://{COMFY_HOST}/upload/image", files=files, timeout=30
-            )
-            response.raise_for_status()
-
-            responses.append(f"Successfully uploaded {name}")
-            print(f"worker-comfyui - Successfully uploaded {name}")
-
-        except base64.binascii.Error as e:
-            error_msg = f"Error decoding base64 for {image.get('name', 'unknown')}: {e}"
-            print(f"worker-comfyui - {error_msg}")
-            upload_errors.append(error_msg)
-        except requests.Timeout:
-            error_msg = f"Timeout uploading {image.get('name', 'unknown')}"
-            print(f"worker-comfyui - {error_msg}")
-            upload_errors.append(error_msg)
-        except requests.RequestException as e:
-            error_msg = f"Error uploading {image.get('name', 'unknown')}: {e}"
-            print(f"worker-comfyui - {error_msg}")
-            upload_errors.append(error_msg)
-        except Exception as e:
-            error_msg = (
-                f"Unexpected error uploading {image.get('name', 'unknown')}: {e}"
-            )
-            print(f"worker-comfyui - {error_msg}")
-            upload_errors.append(error_msg)
+                responses.append(response)
 
     if upload_errors:
         print(f"worker-comfyui - image(s) upload finished with errors")
@@ -405,6 +658,28 @@ def upload_images(images):
     }
 
 
+# Loader inputs reported by get_available_models(): model type -> (node class, input)
+MODEL_LOADER_INPUTS = {
+    "checkpoints": ("CheckpointLoaderSimple", "ckpt_name"),
+    "unet": ("UNETLoader", "unet_name"),
+    "clip": ("CLIPLoader", "clip_name"),
+    "vae": ("VAELoader", "vae_name"),
+    "loras": ("LoraLoaderModelOnly", "lora_name"),
+}
+
+
+def fetch_object_info():
+    """
+    Fetch the node schema from ComfyUI.
+
+    Returns:
+        dict: The /object_info document.
+    """
+    response = comfy_client.get("/object_info", "object_info")
+    response.raise_for_status()
+    return response.json()
+
+
 def get_available_models():
     """
     Get list of available models from ComfyUI
@@ -412,29 +687,76 @@ def get_available_models():
     Returns:
         dict: Dictionary containing available models by type
     """
-    try:
-        response = requests.get(f"http://{COMFY_HOST}/object_info", timeout=10)
-        response.raise_for_status()
-        object_info = response.json()
-
-        # Extract available checkpoints from CheckpointLoaderSimple
-        available_models = {}
-        if "CheckpointLoaderSimple" in object_info:
-            checkpoint_info = object_info["CheckpointLoaderSimple"]
-            if "input" in checkpoint_info and "required" in checkpoint_info["input"]:
-                ckpt_options = checkpoint_info["input"]["required"].get("ckpt_name")
-                if ckpt_options and len(ckpt_options) > 0:
-                    available_models["checkpoints"] = (
-                        ckpt_options[0] if isinstance(ckpt_options[0], list) else []
-                    )
+    object_info = object_info_cache.get()
+    if not object_info:
+        print("worker-comfyui - Warning: Could not fetch available models")
+        # Fall back to what is on disk
+        model_index.refresh()
+        checkpoints = model_index.names("checkpoints")
+        return {"checkpoints": checkpoints} if checkpoints else {}
+
+    available_models = {}
+    for model_type, (class_type, input_name) in MODEL_LOADER_INPUTS.items():
+        spec = object_info.get(class_type, {}).get("input", {}).get("required", {}).get(input_name)
+        options = input_options(spec)
+        if options is not None:
+            available_models[model_type] = options
+    return available_models
+
+
+def validate_workflow_locally(workflow, template=None):
+    """
+    Check a workflow against the cached /object_info schema.
 
-        return available_models
-    except Exception as e:
-        print(f"worker-comfyui - Warning: Could not fetch available models: {e}")
-        return {}
+    A value missing from an option list may be a model that was added after the
+    schema was fetched; in that case the schema is fetched again before the
+    workflow is rejected.
+
+    Args:
+        workflow (dict): API-format workflow.
+        template (WorkflowTemplate, optional): Template the workflow was bound
+            from. Once its graph passed with the current schema, only the nodes
+            its parameters write to are checked again.
+
+    Returns:
+        str: Error message for the job, or None if the workflow looks valid
+             (or no schema is available).
+    """
+    object_info = object_info_cache.get()
+    if not object_info:
+        return None
+    schema_version = object_info_cache.fetches
+    nodes = None
+    if template is not None and template.validated_with == schema_version:
+        nodes = template.param_nodes
+    warnings = []
+    errors = validate_workflow(workflow, object_info, nodes, warnings)
+
+    missing = [e["value"] for e in errors if e["options"]]
+    if missing:
+        index_changed = model_index.refresh()["dirs_scanned"] > 0
+        on_disk = any(isinstance(v, str) and model_index.lookup(v) for v in missing)
+        if index_changed or on_disk:
+            print("worker-comfyui - Model folders changed, fetching /object_info again")
+            object_info_cache.invalidate()
+            object_info = object_info_cache.get()
+            if not object_info:
+                return None
+            schema_version = object_info_cache.fetches
+            warnings = []
+            errors = validate_workflow(workflow, object_info, warnings=warnings)
+
+    if warnings:
+        # Custom nodes may accept these values through VALIDATE_INPUTS; ComfyUI decides
+        print(f"worker-comfyui - Workflow validation warnings:\n{format_errors(warnings)}")
+    if not errors:
+        if template is not None:
+            template.validated_with = schema_version
+        return None
+    return f"Workflow validation failed:\n{format_errors(errors)}"
 
 
-def queue_workflow(workflow, client_id, comfy_org_api_key=None):
+def queue_workflow(workflow, client_id, comfy_org_api_key=None, prompt_id=None):
     """
     Queue a workflow to be processed by ComfyUI
 
@@ -442,6 +764,7 @@ def queue_workflow(workflow, client_id, comfy_org_api_key=None):
         workflow (dict): A dictionary containing the workflow to be processed
         client_id (str): The client ID for the websocket connection
         comfy_org_api_key (str, optional): Comfy.org API key for API Nodes
+        prompt_id (str, optional): Prompt id to use (older ComfyUI versions ignore it)
 
     Returns:
         dict: The JSON response from ComfyUI after processing the workflow
@@ -451,6 +774,8 @@ def queue_workflow(workflow, client_id, comfy_org_api_key=None):
     """
     # Include client_id in the prompt payload
     payload = {"prompt": workflow, "client_id": client_id}
+    if prompt_id:
+        payload["prompt_id"] = prompt_id
 
     # Optionally inject Comfy.org API key for API Nodes.
     # Precedence: per-request key (argument) overrides environment variable.
@@ -462,15 +787,14 @@ def queue_workflow(workflow, client_id, comfy_org_api_key=None):
         payload["extra_data"] = {"api_key_comfy_org": effective_key}
     data = json.dumps(payload).encode("utf-8")
 
-    # Use requests for consistency and timeout
     headers = {"Content-Type": "application/json"}
-    response = requests.post(
-        f"http://{COMFY_HOST}/prompt", data=data, headers=headers, timeout=30
-    )
+    response = comfy_client.post("/prompt", "prompt", data=data, headers=headers)
 
     # Handle validation errors with detailed information
     if response.status_code == 400:
         print(f"worker-comfyui - ComfyUI returned 400. Response body: {response.text}")
+        # The cached schema let this workflow through, so it may be out of date
+        object_info_cache.invalidate()
         try:
             error_data = response.json()
             print(f"worker-comfyui - Parsed error data: {error_data}")
@@ -549,6 +873,109 @@ def queue_workflow(workflow, client_id, comfy_org_api_key=None):
     return response.json()
 
 
+def get_queue():
+    """
+    Retrieve ComfyUI's queue.
+
+    Returns:
+        dict: "queue_running" and "queue_pending", lists of [number, prompt_id, ...].
+    """
+    response = comfy_client.get("/queue", "queue")
+    response.raise_for_status()
+    return response.json()
+
+
+def check_prompt_after_reconnect(prompt_id):
+    """
+    Find out what happened to a prompt while the websocket was down.
+
+    Events ComfyUI sent during the gap (including the final "executing" event)
+    are lost, so the prompt's state is read from /history and /queue instead.
+
+    Args:
+        prompt_id (str): The prompt being monitored.
+
+    Returns:
+        tuple: (state, history) where state is "finished" (history has the
+               prompt's entry), "running" (still queued or executing) or "missing"
+               (ComfyUI knows nothing about it); history is None unless finished.
+    """
+    history = get_history(prompt_id)
+    if prompt_id in history:
+        return "finished", history
+    queue_state = get_queue()
+    for item in queue_state.get("queue_running", []) + queue_state.get("queue_pending", []):
+        if len(item) > 1 and item[1] == prompt_id:
+            return "running", None
+    # It may have finished between the two requests
+    history = get_history(prompt_id)
+    if prompt_id in history:
+        return "finished", history
+    return "missing", None
+
+
+def stop_prompt(prompt_id, events=None):
+    """
+    Remove a prompt from ComfyUI's queue, or interrupt it if it is already running.
+
+    /interrupt stops whatever ComfyUI is executing, so it is only sent after
+    /queue confirmed that this prompt is the running one (the prompt_id in the
+    body makes newer ComfyUI versions ignore it for any other prompt).
+
+    Args:
+        prompt_id (str): The prompt to stop.
+        events (queue.Queue, optional): The prompt's websocket events; if given,
+            wait (up to PROMPT_STOP_WAIT_S) until ComfyUI reports that it stopped.
+
+    Returns:
+        str: "interrupted", or "deleted" if it was not running (any more).
+    """
+    comfy_client.post("/queue", "queue", json={"delete": [prompt_id]})
+    queue_state = get_queue()
+    if not any(
+        len(item) > 1 and item[1] == prompt_id for item in queue_state.get("queue_running", [])
+    ):
+        return "deleted"
+
+    comfy_client.post("/interrupt", "queue", json={"prompt_id": prompt_id})
+    wait_until = time.monotonic() + PROMPT_STOP_WAIT_S
+    while events is not None:
+        left = wait_until - time.monotonic()
+        if left <= 0:
+            print(f"worker-comfyui - Prompt {prompt_id} did not confirm the interrupt")
+            break
+        try:
+            message = events.get(timeout=left)
+        except queue.Empty:
+            continue
+        data = message.get("data") or {}
+        if message.get("type") in ("execution_interrupted", "execution_error") or (
+            message.get("type") == "executing" and data.get("node") is None
+        ):
+            break
+    return "interrupted"
+
+
+def history_error(prompt_id, history):
+    """
+    Return the execution error recorded in a prompt's history entry.
+
+    Args:
+        prompt_id (str): The prompt.
+        history (dict): /history response containing the prompt.
+
+    Returns:
+        str: Error message, or None if the prompt did not fail.
+    """
+    status = history[prompt_id].get("status") or {}
+    if status.get("status_str") != "error":
+        return None
+    for event, data in status.get("messages") or []:
+        if event == "execution_error":
+            return f"Workflow execution error: Node Type: {data.get('node_type')}, Node ID: {data.get('node_id')}, Message: {data.get('exception_message')}"
+    return f"Workflow execution failed (prompt {prompt_id})"
+
+
 def get_history(prompt_id):
     """
     Retrieve the history of a given prompt using its ID
@@ -559,15 +986,42 @@ def get_history(prompt_id):
     Returns:
         dict: The history of the prompt, containing all the processing steps and results
     """
-    # Use requests for consistency and timeout
-    response = requests.get(f"http://{COMFY_HOST}/history/{prompt_id}", timeout=30)
+    response = comfy_client.get(f"/history/{prompt_id}", "history")
     response.raise_for_status()
     return response.json()
 
 
+def resolve_local_image_path(filename, subfolder, image_type):
+    """
+    Map an image reference from the ComfyUI history to a file on the shared filesystem.
+
+    Args:
+        filename (str): The filename of the image.
+        subfolder (str): The subfolder where the image is stored.
+        image_type (str): The type of the image (e.g., 'output').
+
+    Returns:
+        str: The absolute file path, or None if the type is unknown, the path
+             would escape the ComfyUI directory or the file is not there.
+    """
+    base_dir = COMFY_IMAGE_DIRS.get(image_type or "output")
+    if not base_dir or not filename:
+        return None
+    base_dir = os.path.realpath(base_dir)
+    path = os.path.realpath(os.path.join(base_dir, subfolder or "", filename))
+    # Reject "../" and absolute components (path traversal)
+    if os.path.commonpath([base_dir, path]) != base_dir:
+        print(
+            f"worker-comfyui - Refusing to read {filename} outside of {base_dir}"
+        )
+        return None
+    return path if os.path.isfile(path) else None
+
+
 def get_image_data(filename, subfolder, image_type):
     """
-    Fetch image bytes from the ComfyUI /view endpoint.
+    Get image bytes, read directly from ComfyUI's directory when the file is
+    local, otherwise fetched from the ComfyUI /view endpoint.
 
     Args:
         filename (str): The filename of the image.
@@ -577,15 +1031,29 @@ def get_image_data(filename, subfolder, image_type):
     Returns:
         bytes: The raw image data, or None if an error occurs.
     """
+    if COMFY_LOCAL_OUTPUTS:
+        local_path = resolve_local_image_path(filename, subfolder, image_type)
+        if local_path:
+            try:
+                with open(local_path, "rb") as f:
+                    data = f.read()
+                transfer_bytes.inc(len(data), direction="download", peer="disk")
+                print(f"worker-comfyui - Read image data for {filename} from disk")
+                return data
+            except OSError as e:
+                print(
+                    f"worker-comfyui - Could not read {local_path} ({e}), falling back to /view"
+                )
+
     print(
         f"worker-comfyui - Fetching image data: type={image_type}, subfolder={subfolder}, filename={filename}"
     )
     data = {"filename": filename, "subfolder": subfolder, "type": image_type}
     url_values = urllib.parse.urlencode(data)
     try:
-        # Use requests for consistency and timeout
-        response = requests.get(f"http://{COMFY_HOST}/view?{url_values}", timeout=60)
+        response = comfy_client.get(f"/view?{url_values}", "view")
         response.raise_for_status()
+        transfer_bytes.inc(len(response.content), direction="download", peer="comfyui")
         print(f"worker-comfyui - Successfully fetched image data for {filename}")
         return response.content
     except requests.Timeout:
@@ -601,81 +1069,294 @@ def get_image_data(filename, subfolder, image_type):
         return None
 
 
-def handler(job):
+def process_output_image(
+    job_id, filename, subfolder, img_type, output_options=None, timings=None
+):
     """
-    Handles a job using ComfyUI via websockets for status and image retrieval.
+    Fetch one output image from ComfyUI and either upload it to S3 or encode it as base64.
+
+    Runs on the shared output thread pool.
 
     Args:
-        job (dict): A dictionary containing job details and input parameters.
+        job_id (str): The RunPod job ID (used as S3 prefix).
+        filename (str): The filename of the image.
+        subfolder (str): The subfolder where the image is stored.
+        img_type (str): The type of the image (e.g., 'output').
+        output_options (OutputOptions, optional): Re-encoding requested by the job.
+        timings (JobTimings, optional): Receives the fetch / encode / upload times.
 
     Returns:
-        dict: A dictionary containing either an error message or a success status with generated images.
+        tuple: (output entry or None, error message or None)
     """
-    # ---------------------------------------------------------------------------
-    # Network Volume Diagnostics (opt-in via NETWORK_VOLUME_DEBUG=true)
-    # ---------------------------------------------------------------------------
-    if is_network_volume_debug_enabled():
-        run_network_volume_diagnostics()
+    timings = timings or JobTimings()
+    if output_options and output_options.transcode:
+        with timings.stage("output_fetch"):
+            image_bytes = get_image_data(filename, subfolder, img_type)
+        if not image_bytes:
+            return None, f"Failed to fetch image data for {filename} from /view endpoint."
+        return process_image_bytes(job_id, filename, image_bytes, output_options, timings)
+
+    if os.environ.get("BUCKET_ENDPOINT_URL"):
+        try:
+            print(f"worker-comfyui - Uploading {filename} to S3...")
+            # Stream straight from ComfyUI's output file when it is local,
+            # otherwise upload the bytes fetched from /view from memory.
+            local_path = (
+                resolve_local_image_path(filename, subfolder, img_type)
+                if COMFY_LOCAL_OUTPUTS
+                else None
+            )
+            if local_path:
+                with timings.stage("s3_upload"):
+                    s3_url = s3_upload.upload_image(job_id, filename, path=local_path)
+                transfer_bytes.inc(os.path.getsize(local_path), direction="upload", peer="s3")
+            else:
+                with timings.stage("output_fetch"):
+                    image_bytes = get_image_data(filename, subfolder, img_type)
+                if not image_bytes:
+                    return (
+                        None,
+                        f"Failed to fetch image data for {filename} from /view endpoint.",
+                    )
+                with timings.stage("s3_upload"):
+                    s3_url = s3_upload.upload_image(job_id, filename, data=image_bytes)
+                transfer_bytes.inc(len(image_bytes), direction="upload", peer="s3")
+            print(f"worker-comfyui - Uploaded {filename} to S3: {s3_url}")
+            # Dictionary with filename and URL
+            return {"filename": filename, "type": "s3_url", "data": s3_url}, None
+        except Exception as e:
+            error_msg = f"Error uploading {filename} to S3: {e}"
+            print(f"worker-comfyui - {error_msg}")
+            return None, error_msg
 
-    job_input = job["input"]
-    job_id = job["id"]
+    with timings.stage("output_fetch"):
+        image_bytes = get_image_data(filename, subfolder, img_type)
+    if not image_bytes:
+        return None, f"Failed to fetch image data for {filename} from /view endpoint."
 
-    # Make sure that the input is valid
-    validated_data, error_message = validate_input(job_input)
-    if error_message:
-        return {"error": error_message}
+    # Return as base64 string
+    try:
+        with timings.stage("encode"):
+            base64_image = base64.b64encode(image_bytes).decode("utf-8")
+        print(f"worker-comfyui - Encoded {filename} as base64")
+        # Dictionary with filename and base64 data
+        return {"filename": filename, "type": "base64", "data": base64_image}, None
+    except Exception as e:
+        error_msg = f"Error encoding {filename} to base64: {e}"
+        print(f"worker-comfyui - {error_msg}")
+        return None, error_msg
 
-    # Extract validated data
-    workflow = validated_data["workflow"]
-    input_images = validated_data.get("images")
 
-    # Make sure that the ComfyUI HTTP API is available before proceeding
-    if not check_server(
-        f"http://{COMFY_HOST}/",
-        COMFY_API_AVAILABLE_MAX_RETRIES,
-        COMFY_API_AVAILABLE_INTERVAL_MS,
-    ):
-        return {
-            "error": f"ComfyUI server ({COMFY_HOST}) not reachable after multiple retries."
-        }
+def process_image_bytes(job_id, filename, image_bytes, output_options=None, timings=None):
+    """
+    Re-encode an image held in memory if requested, then upload it to S3 or
+    encode it as base64.
 
-    # Upload input images if they exist
-    if input_images:
-        upload_result = upload_images(input_images)
-        if upload_result["status"] == "error":
-            # Return upload errors
-            return {
-                "error": "Failed to upload one or more input images",
-                "details": upload_result["details"],
-            }
+    Runs on the shared output thread pool. Used for images received over the
+    websocket (which never touch the disk) and for images that are re-encoded.
 
-    ws = None
-    client_id = str(uuid.uuid4())
+    Args:
+        job_id (str): The RunPod job ID (used as S3 prefix).
+        filename (str): Name given to the image.
+        image_bytes (bytes-like): The encoded image.
+        output_options (OutputOptions, optional): Re-encoding requested by the job.
+        timings (JobTimings, optional): Receives the encode / upload times.
+
+    Returns:
+        tuple: (output entry or None, error message or None)
+    """
+    timings = timings or JobTimings()
+    encoding = None
+    try:
+        if output_options and output_options.transcode:
+            with timings.stage("transcode"):
+                image_bytes, extension, encoding = transcode(image_bytes, output_options)
+            filename = f"{os.path.splitext(filename)[0]}.{extension}"
+            print(
+                f"worker-comfyui - Encoded {filename} as {encoding['format']} in {encoding['encode_ms']:.0f} ms: {encoding['bytes_in']} -> {encoding['bytes_out']} bytes"
+            )
+        if os.environ.get("BUCKET_ENDPOINT_URL"):
+            with timings.stage("s3_upload"):
+                s3_url = s3_upload.upload_image(job_id, filename, data=image_bytes)
+            transfer_bytes.inc(len(image_bytes), direction="upload", peer="s3")
+            print(f"worker-comfyui - Uploaded {filename} to S3: {s3_url}")
+            output = {"filename": filename, "type": "s3_url", "data": s3_url}
+        else:
+            with timings.stage("encode"):
+                base64_image = base64.b64encode(image_bytes).decode("utf-8")
+            print(f"worker-comfyui - Encoded {filename} as base64")
+            output = {"filename": filename, "type": "base64", "data": base64_image}
+    except Exception as e:
+        error_msg = f"Error processing image {filename}: {e}"
+        print(f"worker-comfyui - {error_msg}")
+        return None, error_msg
+    if encoding:
+        output["encoding"] = encoding
+    return output, None
+
+
+def _image_reference(image_output):
+    """
+    The streamed form of a finished image: S3 URLs as they are, base64 images
+    without their data (it is only sent once, in the job's result; RunPod's
+    aggregated stream would otherwise carry every image twice).
+    """
+    if image_output.get("type") != "base64":
+        return image_output
+    return {key: value for key, value in image_output.items() if key != "data"}
+
+
+def _process_and_report(process, node_id, on_progress, *args):
+    """Run process(*args), streaming a reference to the finished image before returning it."""
+    image_output, error_msg = process(*args)
+    if image_output and on_progress:
+        on_progress({"status": "output", "node": node_id, "images": [_image_reference(image_output)]})
+    return image_output, error_msg
+
+
+def submit_node_output(
+    job_id, node_id, node_output, on_progress=None, output_options=None, timings=None
+):
+    """
+    Start fetching / encoding / uploading the images of one output node.
+
+    Args:
+        job_id (str): The RunPod job ID.
+        node_id (str): The output node.
+        node_output (dict): Its output ({"images": [...], ...}).
+        on_progress (callable, optional): Called with {"status": "output", ...}
+            for every image as soon as it is ready (see _image_reference()).
+        output_options (OutputOptions, optional): Re-encoding requested by the job.
+        timings (JobTimings, optional): Receives the per-image stage times.
+
+    Returns:
+        list: (future, None) per image on the output pool, or (None, message)
+              for images that are skipped with a warning.
+    """
+    pending_images = []
+    if "images" in node_output:
+        print(
+            f"worker-comfyui - Node {node_id} contains {len(node_output['images'])} image(s)"
+        )
+        for image_info in node_output["images"]:
+            filename = image_info.get("filename")
+            subfolder = image_info.get("subfolder", "")
+            img_type = image_info.get("type")
+
+            # skip temp images
+            if img_type == "temp":
+                print(
+                    f"worker-comfyui - Skipping image {filename} because type is 'temp'"
+                )
+                continue
+
+            if not filename:
+                warn_msg = f"Skipping image in node {node_id} due to missing filename: {image_info}"
+                print(f"worker-comfyui - {warn_msg}")
+                pending_images.append((None, warn_msg))
+                continue
+
+            future = output_pool.submit(
+                _process_and_report,
+                process_output_image,
+                node_id,
+                on_progress,
+                job_id,
+                filename,
+                subfolder,
+                img_type,
+                output_options,
+                timings,
+            )
+            pending_images.append((future, None))
+
+    # Check for other output types
+    other_keys = [k for k in node_output.keys() if k != "images"]
+    if other_keys:
+        warn_msg = f"Node {node_id} produced unhandled output keys: {other_keys}."
+        print(f"worker-comfyui - WARNING: {warn_msg}")
+        print(
+            f"worker-comfyui - --> If this output is useful, please consider opening an issue on GitHub to discuss adding support."
+        )
+    return pending_images
+
+
+def run_prompt(workflow, comfy_org_api_key=None, on_event=None, timings=None, deadline=None):
+    """
+    Queue a workflow in ComfyUI and wait until it has been executed.
+
+    Args:
+        workflow (dict): API-format workflow.
+        comfy_org_api_key (str, optional): Comfy.org API key for API Nodes.
+        on_event (callable, optional): Called with every websocket event of the prompt.
+        timings (JobTimings, optional): Receives the times of the prompt's stages.
+        deadline (JobDeadline, optional): When it is exceeded the prompt is removed
+            from ComfyUI's queue or interrupted.
+
+    Returns:
+        tuple: (prompt_id, outputs, errors). ``outputs`` maps node ids to the
+               outputs announced by "executed" events, or is the "outputs" of the
+               prompt's history entry if it was fetched (None if the prompt is
+               missing from the history). ``errors`` lists execution errors.
+
+    Raises:
+        ValueError, requests.RequestException, websocket.WebSocketException:
+            If the prompt could not be queued or ComfyUI was lost.
+        DeadlineExceeded: If the deadline passed or the job was cancelled.
+    """
+    timings = timings or JobTimings()
+    deadline = deadline or JobDeadline()
     prompt_id = None
-    output_data = []
+    events = None
+    gate_held = False
     errors = []
+    executed_outputs = {}
+    # /history response read while recovering from a websocket reconnect
+    history = None
 
     try:
-        # Establish WebSocket connection
-        ws_url = f"ws://{COMFY_HOST}/ws?clientId={client_id}"
-        print(f"worker-comfyui - Connecting to websocket: {ws_url}")
-        ws = websocket.WebSocket()
-        ws.connect(ws_url, timeout=10)
-        print(f"worker-comfyui - Websocket connected")
+        # Make sure the worker-wide websocket is up (no-op once connected)
+        with timings.stage("websocket_connect"):
+            ws_manager.ensure_connected()
+
+        # Wait until ComfyUI's queue has room for another prompt of this worker;
+        # prompts using the models that are already loaded may go first
+        with timings.stage("queue_gate"):
+            # Cancelling the job wakes the waiting jobs so this one stops waiting
+            deadline.on_cancel(queue_gate.notify)
+            gate_held = queue_gate.acquire(
+                timeout=deadline.remaining(),
+                fingerprint=model_fingerprint(workflow),
+                abort=lambda: deadline.exceeded() is not None,
+            )
+        if not gate_held:
+            raise DeadlineExceeded("queue_gate", deadline.exceeded() or DEADLINE)
+
+        # Subscribe before queueing under a prompt_id of our own, so no event of
+        # the prompt (binary image frames included) arrives before its subscriber
+        prompt_id = str(uuid.uuid4())
+        events = ws_manager.subscribe(prompt_id)
 
         # Queue the workflow
         try:
             # Pass per-request API key if provided in input
-            queued_workflow = queue_workflow(
-                workflow,
-                client_id,
-                comfy_org_api_key=validated_data.get("comfy_org_api_key"),
-            )
-            prompt_id = queued_workflow.get("prompt_id")
-            if not prompt_id:
+            with timings.stage("queue"):
+                queued_workflow = queue_workflow(
+                    workflow,
+                    ws_manager.client_id,
+                    comfy_org_api_key=comfy_org_api_key,
+                    prompt_id=prompt_id,
+                )
+            queued_prompt_id = queued_workflow.get("prompt_id")
+            if not queued_prompt_id:
                 raise ValueError(
                     f"Missing 'prompt_id' in queue response: {queued_workflow}"
                 )
+            if queued_prompt_id != prompt_id:
+                # ComfyUI versions that pick the prompt_id themselves
+                ws_manager.unsubscribe(prompt_id)
+                prompt_id = queued_prompt_id
+                events = ws_manager.subscribe(prompt_id)
             print(f"worker-comfyui - Queued workflow with ID: {prompt_id}")
         except requests.RequestException as e:
             print(f"worker-comfyui - Error queuing workflow: {e}")
@@ -688,78 +1369,439 @@ def handler(job):
             else:
                 raise ValueError(f"Unexpected error queuing workflow: {e}")
 
-        # Wait for execution completion via WebSocket
+        # Wait for execution completion via the shared websocket
+        deadline.on_cancel(lambda: events.put({"type": "_cancelled", "data": {}}))
         print(f"worker-comfyui - Waiting for workflow execution ({prompt_id})...")
         execution_done = False
+        queued_at = time.monotonic()
+        execution_started_at = None
         while True:
+            deadline.check("execution" if execution_started_at else "wait_for_start")
+            remaining = deadline.remaining()
             try:
-                out = ws.recv()
-                if isinstance(out, str):
-                    message = json.loads(out)
-                    if message.get("type") == "status":
-                        status_data = message.get("data", {}).get("status", {})
-                        print(
-                            f"worker-comfyui - Status update: {status_data.get('exec_info', {}).get('queue_remaining', 'N/A')} items remaining in queue"
-                        )
-                    elif message.get("type") == "executing":
-                        data = message.get("data", {})
-                        if (
-                            data.get("node") is None
-                            and data.get("prompt_id") == prompt_id
-                        ):
-                            print(
-                                f"worker-comfyui - Execution finished for prompt {prompt_id}"
-                            )
-                            execution_done = True
-                            break
-                    elif message.get("type") == "execution_error":
-                        data = message.get("data", {})
-                        if data.get("prompt_id") == prompt_id:
-                            error_details = f"Node Type: {data.get('node_type')}, Node ID: {data.get('node_id')}, Message: {data.get('exception_message')}"
-                            print(
-                                f"worker-comfyui - Execution error received: {error_details}"
-                            )
-                            errors.append(f"Workflow execution error: {error_details}")
-                            break
-                else:
+                message = events.get(
+                    timeout=WEBSOCKET_EVENT_WAIT_S
+                    if remaining is None
+                    else min(WEBSOCKET_EVENT_WAIT_S, remaining)
+                )
+            except queue.Empty:
+                if deadline.exceeded():
                     continue
-            except websocket.WebSocketTimeoutException:
+                if not ws_manager.alive:
+                    raise websocket.WebSocketConnectionClosedException(
+                        "Websocket connection to ComfyUI lost"
+                    )
                 print(f"worker-comfyui - Websocket receive timed out. Still waiting...")
                 continue
-            except websocket.WebSocketConnectionClosedException as closed_err:
-                try:
-                    # Attempt to reconnect
-                    ws = _attempt_websocket_reconnect(
-                        ws_url,
-                        WEBSOCKET_RECONNECT_ATTEMPTS,
-                        WEBSOCKET_RECONNECT_DELAY_S,
-                        closed_err,
-                    )
+            if message.get("type") == "_cancelled":
+                continue
 
+            if on_event:
+                on_event(message)
+            if execution_started_at is None and message.get("type") in (
+                "execution_start",
+                "executing",
+            ):
+                execution_started_at = time.monotonic()
+                timings.add("wait_for_start", execution_started_at - queued_at)
+            if message.get("type") == "status":
+                status_data = message.get("data", {}).get("status", {})
+                print(
+                    f"worker-comfyui - Status update: {status_data.get('exec_info', {}).get('queue_remaining', 'N/A')} items remaining in queue"
+                )
+            elif message.get("type") == "executed":
+                data = message.get("data", {})
+                if data.get("prompt_id") == prompt_id and data.get("output"):
+                    executed_outputs[data["node"]] = data["output"]
+            elif message.get("type") == "executing":
+                data = message.get("data", {})
+                if data.get("node") is None and data.get("prompt_id") == prompt_id:
+                    print(f"worker-comfyui - Execution finished for prompt {prompt_id}")
+                    execution_done = True
+                    break
+            elif message.get("type") == "execution_error":
+                data = message.get("data", {})
+                if data.get("prompt_id") == prompt_id:
+                    error_details = f"Node Type: {data.get('node_type')}, Node ID: {data.get('node_id')}, Message: {data.get('exception_message')}"
                     print(
-                        "worker-comfyui - Resuming message listening after successful reconnect."
+                        f"worker-comfyui - Execution error received: {error_details}"
                     )
-                    continue
-                except (
-                    websocket.WebSocketConnectionClosedException
-                ) as reconn_failed_err:
-                    # If _attempt_websocket_reconnect fails, it raises this exception
-                    # Let this exception propagate to the outer handler's except block
-                    raise reconn_failed_err
+                    errors.append(f"Workflow execution error: {error_details}")
+                    break
+            elif message.get("type") == EVENT_RECONNECTED:
+                # Events sent while the websocket was down are lost for good:
+                # ask ComfyUI whether the prompt finished (or failed) in the gap
+                state, history = check_prompt_after_reconnect(prompt_id)
+                print(f"worker-comfyui - Websocket reconnected, prompt {prompt_id} is {state}")
+                if state == "finished":
+                    error = history_error(prompt_id, history)
+                    if error:
+                        errors.append(error)
+                    else:
+                        execution_done = True
+                    break
+                if state == "missing":
+                    errors.append(
+                        f"Prompt {prompt_id} is neither queued nor in the history after the websocket reconnected"
+                    )
+                    break
+            elif message.get("type") == EVENT_DISCONNECTED:
+                # The websocket manager gave up reconnecting (e.g. ComfyUI crashed)
+                raise websocket.WebSocketConnectionClosedException(
+                    message["data"]["error"]
+                )
 
-            except json.JSONDecodeError:
-                print(f"worker-comfyui - Received invalid JSON message via websocket.")
+        # ComfyUI is done with this prompt: let the next job queue its workflow
+        queue_gate.release()
+        gate_held = False
+        timings.add("execution", time.monotonic() - (execution_started_at or queued_at))
 
         if not execution_done and not errors:
             raise ValueError(
                 "Workflow monitoring loop exited without confirmation of completion or error."
             )
 
+        # "executed" events announced the outputs; /history is only a cross-check
+        # (unless it was already read because events were lost while reconnecting)
+        if executed_outputs and not COMFY_VERIFY_HISTORY and history is None:
+            return prompt_id, executed_outputs, errors
+
         # Fetch history even if there were execution errors, some outputs might exist
-        print(f"worker-comfyui - Fetching history for prompt {prompt_id}...")
-        history = get_history(prompt_id)
+        if history is None:
+            print(f"worker-comfyui - Fetching history for prompt {prompt_id}...")
+            with timings.stage("history"):
+                history = get_history(prompt_id)
 
         if prompt_id not in history:
+            return prompt_id, None, errors
+        outputs = history[prompt_id].get("outputs", {})
+        missed = [node_id for node_id in outputs if node_id not in executed_outputs]
+        if executed_outputs and missed:
+            print(
+                f"worker-comfyui - History lists outputs of node(s) {missed} that no executed event announced"
+            )
+        return prompt_id, outputs, errors
+    except DeadlineExceeded as e:
+        if prompt_id and gate_held:
+            # Free the GPU for the next job: the prompt is not needed any more
+            try:
+                outcome = stop_prompt(prompt_id, events)
+                print(f"worker-comfyui - {e}: prompt {prompt_id} {outcome}")
+            except requests.RequestException as stop_err:
+                print(f"worker-comfyui - {e}: could not stop prompt {prompt_id}: {stop_err}")
+        raise
+    finally:
+        if gate_held:
+            queue_gate.release()
+        if prompt_id:
+            ws_manager.unsubscribe(prompt_id)
+
+
+def run_batch(jobs):
+    """
+    Run the workflows of several jobs as one merged prompt (see job_batcher).
+
+    Args:
+        jobs (list): (workflow, on_event, timings, deadline) per job; every job's
+            on_event (if any) receives the events of the merged prompt, except for
+            events of output nodes ("executed", websocket images), which only go to
+            the job owning the node (with the node id of the job's own workflow). The
+            stage timings of the shared prompt are added to every job's timings. A
+            job whose deadline was exceeded (it stopped waiting, see JobBatcher)
+            gets no more events or timings; the prompt is stopped only once every
+            job's deadline was exceeded.
+
+    Returns:
+        list: One (prompt_id, outputs, errors) tuple per job, like run_prompt().
+    """
+    workflows = [workflow for workflow, _, _, _ in jobs]
+    if len(workflows) == 1:
+        _, on_event, timings, deadline = jobs[0]
+        return [run_prompt(workflows[0], on_event=on_event, timings=timings, deadline=deadline)]
+    object_info = object_info_cache.get() or {}
+
+    def is_output_node(class_type):
+        if class_type in object_info:
+            return bool(object_info[class_type].get("output_node"))
+        return "Save" in class_type or "Preview" in class_type
+
+    merged, owners = merge_workflows(workflows, is_output_node)
+
+    def on_event(message):
+        data = message.get("data") or {}
+        if message.get("type") in ("executed", EVENT_BINARY) and data.get("node") in owners:
+            index, node_id = owners[data["node"]]
+            _, callback, _, deadline = jobs[index]
+            if callback and not deadline.exceeded():
+                callback({**message, "data": {**data, "node": node_id}})
+            return
+        for _, callback, _, deadline in jobs:
+            # Jobs that stopped waiting are not fed any more
+            if callback and not deadline.exceeded():
+                callback(message)
+
+    prompt_timings = JobTimings()
+    prompt_id, outputs, errors = run_prompt(
+        merged,
+        on_event=on_event,
+        timings=prompt_timings,
+        deadline=SharedDeadline([deadline for _, _, _, deadline in jobs]),
+    )
+    for _, _, timings, deadline in jobs:
+        if not deadline.exceeded():
+            timings.merge(prompt_timings)
+    print(
+        f"worker-comfyui - Batch prompt {prompt_id} ran {len(workflows)} jobs, batching stats: {job_batcher.stats()}"
+    )
+    return [
+        (prompt_id, job_outputs, list(errors))
+        for job_outputs in split_outputs(outputs, owners, len(workflows))
+    ]
+
+
+def handler(job, on_progress=None):
+    """
+    Handles a job using ComfyUI via websockets for status and image retrieval.
+
+    Every stage of the job is timed (see job_timings); the timings are logged
+    as one JSON record per job and added to the result if the job sets
+    "return_timings". A job that exceeds its deadline or is cancelled (see
+    job_deadline) returns an error naming the stage it was stopped in.
+
+    Args:
+        job (dict): A dictionary containing job details and input parameters.
+        on_progress (callable, optional): Called with throttled progress updates
+            while the prompt runs (see stream_handler()).
+
+    Returns:
+        dict: A dictionary containing either an error message or a success status with generated images.
+    """
+    job_id = job["id"]
+    timings = JobTimings()
+    deadline = JobDeadline(COMFY_JOB_DEADLINE_MS / 1000 if COMFY_JOB_DEADLINE_MS else None)
+    running_jobs[job_id] = deadline
+
+    try:
+        # Make sure that the input is valid
+        with timings.stage("validation"):
+            validated_data, error_message = validate_input(job["input"])
+        if error_message:
+            result = {"error": error_message}
+        else:
+            if validated_data["deadline_ms"]:
+                deadline.set_timeout(validated_data["deadline_ms"] / 1000)
+            try:
+                result = _run_job(job_id, validated_data, on_progress, timings, deadline)
+            except DeadlineExceeded as e:
+                print(f"worker-comfyui - {e}")
+                jobs_stopped.inc(reason=e.reason, stage=e.stage)
+                result = {"error": str(e), "reason": e.reason, "stage": e.stage}
+    finally:
+        running_jobs.pop(job_id, None)
+
+    report = timings.report()
+    status = "error" if "error" in result else "ok"
+    record = {"job_id": job_id, "status": status, **report}
+    print(f"worker-comfyui - Job timings: {json.dumps(record)}")
+    workflow = _workflow_label(validated_data)
+    job_duration.observe(report["total_ms"] / 1000, workflow=workflow, status=status)
+    for stage, stage_report in report["stages"].items():
+        job_stage_duration.observe(stage_report["ms"] / 1000, stage=stage, workflow=workflow)
+    if validated_data and validated_data["return_timings"]:
+        result["timings"] = report
+    return result
+
+
+def _workflow_label(validated_data):
+    """
+    Return the "workflow" metrics label of a job.
+
+    Template jobs are labelled with the template name. Workflows sent by
+    clients are all labelled "custom": a label per distinct graph would add
+    histogram series for as long as the worker lives.
+    """
+    if not validated_data:
+        return "invalid"
+    if validated_data["template"] is not None:
+        return validated_data["template"].name
+    return "custom"
+
+
+def cancel_job(job_id):
+    """
+    Cancel a running job: it stops at its next check and stops its prompt in ComfyUI.
+
+    Args:
+        job_id (str): The RunPod job ID.
+
+    Returns:
+        bool: True if the job was running.
+    """
+    deadline = running_jobs.get(job_id)
+    if deadline is None:
+        return False
+    print(f"worker-comfyui - Cancelling job {job_id}")
+    deadline.cancel()
+    return True
+
+
+def _run_job(job_id, validated_data, on_progress, timings, deadline):
+    """
+    Run a validated job: upload its inputs, run its workflow and collect its images.
+
+    Args:
+        job_id (str): The job's id.
+        validated_data (dict): From validate_input().
+        on_progress (callable): See handler() (may be None).
+        timings (JobTimings): Receives the time of every stage.
+        deadline (JobDeadline): Checked between stages and while waiting.
+
+    Returns:
+        dict: The job's result (see handler()).
+
+    Raises:
+        DeadlineExceeded: If the deadline passed or the job was cancelled.
+    """
+    # Network volume diagnostics run once at startup; a job can ask for a fresh report,
+    # which is collected in the background so the job does not wait for the walk
+    if validated_data["refresh_diagnostics"]:
+        if is_network_volume_debug_enabled():
+            _refresh_diagnostics_in_background()
+        else:
+            print(
+                f"worker-comfyui - {job_id}: ignoring refresh_diagnostics (NETWORK_VOLUME_DEBUG is not enabled)"
+            )
+
+    # Extract validated data
+    workflow = validated_data["workflow"]
+    input_images = validated_data.get("images")
+
+    # Make sure that ComfyUI is available before proceeding (free while it is healthy)
+    with timings.stage("check_server"):
+        health_error = comfy_health.ensure_ready()
+    if health_error:
+        return {"error": f"ComfyUI server ({COMFY_HOST}) not available: {health_error}"}
+    deadline.check("check_server")
+
+    # Content-addressed names of the job's input images (pinned while it runs)
+    cached_inputs = {}
+    try:
+        # Reject invalid workflows before uploading anything or queueing them
+        if COMFY_VALIDATE_WORKFLOWS:
+            with timings.stage("validation"):
+                validation_error = validate_workflow_locally(workflow, validated_data["template"])
+            deadline.check("validation")
+            if validation_error:
+                print(f"worker-comfyui - {validation_error}")
+                return {"error": validation_error}
+
+        # Upload input images if they exist
+        if input_images:
+            with timings.stage("input_upload"):
+                if input_cache:
+                    # Content-addressed names: images already in ComfyUI are not uploaded again
+                    input_images, cached_inputs = input_cache.prepare(input_images)
+                    rewrite_image_names(workflow, cached_inputs, object_info_cache.get())
+                    # Nodes that are not known image loaders still read the name the client sent
+                    keep_names = unrewritten_names(workflow, cached_inputs)
+                    input_images += [
+                        {**image, "name": image["original_name"]}
+                        for image in input_images
+                        if image["original_name"] in keep_names
+                    ]
+                upload_result = upload_images(input_images)
+            if upload_result["status"] == "error":
+                # Return upload errors (the cached names are unpinned below)
+                return {
+                    "error": "Failed to upload one or more input images",
+                    "details": upload_result["details"],
+                }
+
+        output_data = []
+        errors = []
+
+        # Node id -> [(future, skip message)]; filled as soon as each output node finishes
+        node_images = {}
+        reporter = None
+        if on_progress:
+            reporter = ProgressReporter(
+                workflow,
+                COMFY_PROGRESS_INTERVAL_MS / 1000,
+                COMFY_PREVIEW_MAX_SIZE if validated_data["stream_previews"] else 0,
+            )
+
+        def process_node_output(node_id, node_output):
+            if node_id not in node_images:
+                node_images[node_id] = submit_node_output(
+                    job_id,
+                    node_id,
+                    node_output,
+                    on_progress,
+                    validated_data["output_options"],
+                    timings,
+                )
+
+        # Stage of the (possibly shared) prompt, reported if a batched job stops waiting
+        prompt_stage = {"stage": "wait_for_start"}
+
+        # Output nodes that send their images over the websocket
+        websocket_nodes = {
+            node_id
+            for node_id, node in workflow.items()
+            if node.get("class_type") in COMFY_WEBSOCKET_OUTPUT_NODES
+        }
+
+        def on_event(message):
+            data = message.get("data", {})
+            if message.get("type") in ("execution_start", "executing"):
+                prompt_stage["stage"] = "execution"
+            if message.get("type") == "executed":
+                if data.get("output"):
+                    # Fetch / encode / upload this node's images while the rest runs
+                    process_node_output(data["node"], data["output"])
+            elif message.get("type") == EVENT_BINARY and data.get("node") in websocket_nodes:
+                frame = decode_image_frame(message["payload"])
+                if frame:
+                    transfer_bytes.inc(len(frame[1]), direction="download", peer="websocket")
+                    node_id = data["node"]
+                    pending_images = node_images.setdefault(node_id, [])
+                    extension = frame[0] or "png"
+                    filename = f"{node_id.replace(':', '_')}_{len(pending_images) + 1:05d}.{extension}"
+                    future = output_pool.submit(
+                        _process_and_report,
+                        process_image_bytes,
+                        node_id,
+                        on_progress,
+                        job_id,
+                        filename,
+                        frame[1],
+                        validated_data["output_options"],
+                        timings,
+                    )
+                    pending_images.append((future, None))
+                return
+            if reporter:
+                update = reporter.update(message)
+                if update:
+                    on_progress(update)
+
+        deadline.check("input_upload")
+        comfy_org_api_key = validated_data.get("comfy_org_api_key")
+        if job_batcher and not comfy_org_api_key:
+            # Compatible jobs arriving within the batch window share one prompt
+            key = batch_key(workflow, COMFY_BATCH_VARYING_INPUTS)
+            prompt_id, outputs, errors = job_batcher.submit(
+                key,
+                (workflow, on_event, timings, deadline),
+                deadline=deadline,
+                stage=lambda: prompt_stage["stage"],
+            )
+        else:
+            prompt_id, outputs, errors = run_prompt(
+                workflow, comfy_org_api_key, on_event, timings, deadline
+            )
+
+        if outputs is None:
             error_msg = f"Prompt ID {prompt_id} not found in history after execution."
             print(f"worker-comfyui - {error_msg}")
             if not errors:
@@ -771,116 +1813,42 @@ def handler(job):
                     "details": errors,
                 }
 
-        prompt_history = history.get(prompt_id, {})
-        outputs = prompt_history.get("outputs", {})
-
-        if not outputs:
+        if not outputs and not node_images:
             warning_msg = f"No outputs found in history for prompt {prompt_id}."
             print(f"worker-comfyui - {warning_msg}")
             if not errors:
                 errors.append(warning_msg)
 
-        print(f"worker-comfyui - Processing {len(outputs)} output nodes...")
+        # Outputs no "executed" event announced (e.g. found only in /history)
         for node_id, node_output in outputs.items():
-            if "images" in node_output:
-                print(
-                    f"worker-comfyui - Node {node_id} contains {len(node_output['images'])} image(s)"
-                )
-                for image_info in node_output["images"]:
-                    filename = image_info.get("filename")
-                    subfolder = image_info.get("subfolder", "")
-                    img_type = image_info.get("type")
-
-                    # skip temp images
-                    if img_type == "temp":
-                        print(
-                            f"worker-comfyui - Skipping image {filename} because type is 'temp'"
-                        )
-                        continue
-
-                    if not filename:
-                        warn_msg = f"Skipping image in node {node_id} due to missing filename: {image_info}"
-                        print(f"worker-comfyui - {warn_msg}")
-                        errors.append(warn_msg)
+            process_node_output(node_id, node_output)
+
+        print(f"worker-comfyui - Collecting the images of {len(node_images)} output nodes...")
+        # Results are collected in node and image order so the output stays deterministic.
+        # Most of the images were processed while the prompt still ran; this is the tail.
+        with timings.stage("collect_outputs"):
+            for pending_images in node_images.values():
+                for future, skip_msg in pending_images:
+                    if future is None:
+                        errors.append(skip_msg)
                         continue
-
-                    image_bytes = get_image_data(filename, subfolder, img_type)
-
-                    if image_bytes:
-                        file_extension = os.path.splitext(filename)[1] or ".png"
-
-                        if os.environ.get("BUCKET_ENDPOINT_URL"):
-                            try:
-                                with tempfile.NamedTemporaryFile(
-                                    suffix=file_extension, delete=False
-                                ) as temp_file:
-                                    temp_file.write(image_bytes)
-                                    temp_file_path = temp_file.name
-                                print(
-                                    f"worker-comfyui - Wrote image bytes to temporary file: {temp_file_path}"
-                                )
-
-                                print(f"worker-comfyui - Uploading {filename} to S3...")
-                                s3_url = rp_upload.upload_image(job_id, temp_file_path)
-                                os.remove(temp_file_path)  # Clean up temp file
-                                print(
-                                    f"worker-comfyui - Uploaded {filename} to S3: {s3_url}"
-                                )
-                                # Append dictionary with filename and URL
-                                output_data.append(
-                                    {
-                                        "filename": filename,
-                                        "type": "s3_url",
-                                        "data": s3_url,
-                                    }
-                                )
-                            except Exception as e:
-                                error_msg = f"Error uploading {filename} to S3: {e}"
-                                print(f"worker-comfyui - {error_msg}")
-                                errors.append(error_msg)
-                                if "temp_file_path" in locals() and os.path.exists(
-                                    temp_file_path
-                                ):
-                                    try:
-                                        os.remove(temp_file_path)
-                                    except OSError as rm_err:
-                                        print(
-                                            f"worker-comfyui - Error removing temp file {temp_file_path}: {rm_err}"
-                                        )
-                        else:
-                            # Return as base64 string
-                            try:
-                                base64_image = base64.b64encode(image_bytes).decode(
-                                    "utf-8"
-                                )
-                                # Append dictionary with filename and base64 data
-                                output_data.append(
-                                    {
-                                        "filename": filename,
-                                        "type": "base64",
-                                        "data": base64_image,
-                                    }
-                                )
-                                print(f"worker-comfyui - Encoded {filename} as base64")
-                            except Exception as e:
-                                error_msg = f"Error encoding {filename} to base64: {e}"
-                                print(f"worker-comfyui - {error_msg}")
-                                errors.append(error_msg)
-                    else:
-                        error_msg = f"Failed to fetch image data for {filename} from /view endpoint."
+                    try:
+                        image_output, error_msg = future.result(timeout=deadline.remaining())
+                    except FutureTimeoutError:
+                        # Images not started yet are dropped; running ones finish unused
+                        for other_images in node_images.values():
+                            for other, _ in other_images:
+                                if other is not None:
+                                    other.cancel()
+                        raise DeadlineExceeded("collect_outputs", deadline.exceeded() or DEADLINE)
+                    if image_output:
+                        output_data.append(image_output)
+                    if error_msg:
                         errors.append(error_msg)
 
-            # Check for other output types
-            other_keys = [k for k in node_output.keys() if k != "images"]
-            if other_keys:
-                warn_msg = (
-                    f"Node {node_id} produced unhandled output keys: {other_keys}."
-                )
-                print(f"worker-comfyui - WARNING: {warn_msg}")
-                print(
-                    f"worker-comfyui - --> If this output is useful, please consider opening an issue on GitHub to discuss adding support."
-                )
-
+    except DeadlineExceeded:
+        # Reported by handler()
+        raise
     except websocket.WebSocketException as e:
         print(f"worker-comfyui - WebSocket Error: {e}")
         print(traceback.format_exc())
@@ -888,6 +1856,9 @@ def handler(job):
     except requests.RequestException as e:
         print(f"worker-comfyui - HTTP Request Error: {e}")
         print(traceback.format_exc())
+        if isinstance(e, requests.ConnectionError):
+            # The next job probes ComfyUI once instead of trusting the old state
+            comfy_health.mark_unhealthy(f"HTTP connection to ComfyUI failed: {e}")
         return {"error": f"HTTP communication error with ComfyUI: {e}"}
     except ValueError as e:
         print(f"worker-comfyui - Value Error: {e}")
@@ -898,9 +1869,10 @@ def handler(job):
         print(traceback.format_exc())
         return {"error": f"An unexpected error occurred: {e}"}
     finally:
-        if ws and ws.connected:
-            print(f"worker-comfyui - Closing websocket connection.")
-            ws.close()
+        if input_cache and cached_inputs:
+            input_cache.unpin(cached_inputs.values())
+        print(f"worker-comfyui - ComfyUI HTTP pool stats: {comfy_client.stats()}")
+        print(f"worker-comfyui - Queue gate stats: {queue_gate.stats()}")
 
     final_result = {}
 
@@ -928,6 +1900,194 @@ def handler(job):
     return final_result
 
 
+async def async_handler(job):
+    """
+    Runs handler() in a worker thread so that the RunPod event loop can take
+    further jobs while this one waits on ComfyUI or post-processes its outputs.
+
+    RunPod stops a cancelled or timed-out job by cancelling this coroutine; the
+    thread is then told to stop the job's prompt in ComfyUI.
+    """
+    try:
+        return await asyncio.to_thread(handler, job)
+    except asyncio.CancelledError:
+        cancel_job(job["id"])
+        raise
+
+
+def stream_handler(job):
+    """
+    Generator handler: yields progress updates while the job runs, then its result.
+
+    handler() runs in a thread; its throttled progress updates are passed
+    through a queue and yielded as they arrive. The last item is the
+    job's result.
+    """
+    updates = queue.Queue()
+    result = {}
+
+    def run():
+        try:
+            result["output"] = handler(job, on_progress=updates.put)
+        except Exception as e:
+            result["output"] = {"error": f"An unexpected error occurred: {e}"}
+        finally:
+            updates.put(None)
+
+    threading.Thread(target=run, name=f"job-{job['id']}", daemon=True).start()
+    while True:
+        update = updates.get()
+        if update is None:
+            break
+        yield update
+    yield result["output"]
+
+
+async def async_stream_handler(job):
+    """
+    stream_handler() for the RunPod event loop: the job's thread is awaited, not
+    blocked on, and a stopped job is cancelled like in async_handler().
+    """
+    updates = stream_handler(job)
+    done = object()
+    try:
+        while True:
+            update = await asyncio.to_thread(next, updates, done)
+            if update is done:
+                return
+            yield update
+    except asyncio.CancelledError:
+        cancel_job(job["id"])
+        raise
+
+
+def concurrency_modifier(current_concurrency):
+    """
+    Tell RunPod how many jobs this worker takes at once.
+
+    The limit stays fixed at COMFY_MAX_CONCURRENCY (RunPod drains all running jobs
+    before it resizes its job queue); how many of those jobs actually occupy
+    ComfyUI is driven by ComfyUI's queue_remaining through `queue_gate`.
+    """
+    return COMFY_MAX_CONCURRENCY
+
+
+def run_warmup():
+    """
+    Run a tiny version of COMFY_WARMUP_TEMPLATE before the worker accepts jobs.
+
+    Loads the template's models into ComfyUI (and the node schema into the
+    cache) so the first job does not pay for it. A failed warm-up is reported
+    and does not stop the worker; a prompt that runs longer than
+    COMFY_WARMUP_TIMEOUT_S is interrupted.
+
+    Returns:
+        dict: Start-up timeline (see warmup.WarmupTimeline.report()) plus
+              "template" and "error" (None if the warm-up succeeded).
+    """
+    timeline = WarmupTimeline(WORKER_STARTED_AT)
+    template = workflow_templates.get(COMFY_WARMUP_TEMPLATE)
+    error = None
+    try:
+        if template is None:
+            raise ValueError(f"Unknown workflow template '{COMFY_WARMUP_TEMPLATE}'")
+        health_error = comfy_health.ensure_ready()
+        if health_error:
+            raise ValueError(f"ComfyUI server ({COMFY_HOST}) not available: {health_error}")
+        timeline.mark("server_up")
+        if object_info_cache.get():
+            timeline.mark("object_info")
+
+        workflow = warmup_workflow(template, COMFY_WARMUP_PARAMS)
+        if COMFY_VALIDATE_WORKFLOWS:
+            validation_error = validate_workflow_locally(workflow)
+            if validation_error:
+                raise ValueError(validation_error)
+        timeline.watch(workflow)
+        deadline = JobDeadline(COMFY_WARMUP_TIMEOUT_S or None)
+        prompt_id, outputs, errors = run_prompt(
+            workflow, on_event=timeline.on_event, deadline=deadline
+        )
+        if errors:
+            raise ValueError("; ".join(errors))
+        timeline.mark("done")
+    except DeadlineExceeded as e:
+        # run_prompt() already removed or interrupted the prompt
+        error = f"Warm-up timed out after {COMFY_WARMUP_TIMEOUT_S:g} s during {e.stage}"
+        print(f"worker-comfyui - {error}, the first job loads the models")
+    except Exception as e:
+        error = str(e)
+        print(f"worker-comfyui - Warm-up failed, the first job loads the models: {error}")
+
+    report = {"template": COMFY_WARMUP_TEMPLATE, **timeline.report(), "error": error}
+    print(f"worker-comfyui - Warm-up report: {json.dumps(report)}")
+    return report
+
+
+# Held while a background refresh of the network volume diagnostics runs
+_diagnostics_refresh_lock = threading.Lock()
+
+
+def _refresh_diagnostics_in_background():
+    """
+    Collect the network volume diagnostics again in a background thread.
+
+    Returns:
+        bool: False if a refresh is already running (no second walk is started).
+    """
+    if not _diagnostics_refresh_lock.acquire(blocking=False):
+        return False
+
+    def refresh():
+        try:
+            run_network_volume_diagnostics(model_index)
+        finally:
+            _diagnostics_refresh_lock.release()
+
+    threading.Thread(target=refresh, name="nv-diagnostics", daemon=True).start()
+    return True
+
+
+def _refresh_diagnostics_on_signal(signum, frame):
+    """SIGUSR1: collect the network volume diagnostics again (off the event loop)."""
+    _refresh_diagnostics_in_background()
+
+
 if __name__ == "__main__":
     print("worker-comfyui - Starting handler...")
-    runpod.serverless.start({"handler": handler})
+    # Network Volume Diagnostics (opt-in via NETWORK_VOLUME_DEBUG=true), once per worker
+    index_stats = model_index.refresh()
+    print(
+        f"worker-comfyui - Model index: {index_stats['files']} file(s), {index_stats['dirs_scanned']} folder(s) scanned, {index_stats['dirs_reused']} unchanged ({index_stats['elapsed_ms']} ms)"
+    )
+    if is_network_volume_debug_enabled():
+        get_network_volume_diagnostics(model_index=model_index)
+    signal.signal(signal.SIGUSR1, _refresh_diagnostics_on_signal)
+    if COMFY_METRICS_PORT:
+        start_http_server(metrics, COMFY_METRICS_PORT, COMFY_METRICS_HOST)
+    if COMFY_METRICS_TEXTFILE:
+        TextfileExporter(metrics, COMFY_METRICS_TEXTFILE, COMFY_METRICS_TEXTFILE_INTERVAL_S).start()
+    # Readiness gate: wait for ComfyUI once, before the first job arrives
+    comfy_health.ensure_ready()
+    if COMFY_WARMUP_TEMPLATE:
+        run_warmup()
+    if COMFY_MAX_CONCURRENCY > 1:
+        print(
+            f"worker-comfyui - Concurrent mode: up to {COMFY_MAX_CONCURRENCY} jobs, {COMFY_MAX_QUEUED_PROMPTS} prompt(s) queued in ComfyUI"
+        )
+        runpod.serverless.start(
+            {
+                "handler": async_stream_handler if COMFY_STREAM_PROGRESS else async_handler,
+                "concurrency_modifier": concurrency_modifier,
+                "return_aggregate_stream": COMFY_STREAM_PROGRESS,
+            }
+        )
+    else:
+        # One job at a time, still awaited in a thread so RunPod's event loop can
+        # deliver cancellations while the job runs
+        runpod.serverless.start(
+            {
+                "handler": async_stream_handler if COMFY_STREAM_PROGRESS else async_handler,
+                "return_aggregate_stream": COMFY_STREAM_PROGRESS,
+            }
+        )
@@ -0,0 +1,145 @@
+"""
+Pooled HTTP client for the ComfyUI API.
+
+Every HTTP call the handler makes to ComfyUI goes through one shared
+``requests.Session`` so that TCP connections to the local ComfyUI server are
+kept alive and reused across calls and across jobs, instead of opening a new
+connection for every request.
+
+Timeouts and retry behaviour for each ComfyUI endpoint are configured in one
+place (``ENDPOINT_POLICIES``).
+"""
+
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Maximum number of idle keep-alive connections kept open to ComfyUI
+COMFY_HTTP_POOL_SIZE = int(os.environ.get("COMFY_HTTP_POOL_SIZE", 16))
+
+# Per-endpoint timeout (seconds) and retry policy.
+#   • "retries" is the number of extra attempts on connection errors and on
+#     502/503/504 responses. Read timeouts are never retried.
+#   • POST /prompt is not idempotent (a retry could queue the workflow twice),
+#     therefore it is never retried.
+ENDPOINT_POLICIES = {
+    "probe": {"timeout": 5, "retries": 0},
+    "upload": {"timeout": 30, "retries": 2},
+    "prompt": {"timeout": 30, "retries": 0},
+    "history": {"timeout": 30, "retries": 2},
+    "queue": {"timeout": 10, "retries": 2},
+    "view": {"timeout": 60, "retries": 2},
+    "object_info": {"timeout": 30, "retries": 1},
+}
+
+# Response status codes that are worth retrying
+RETRY_STATUS_CODES = (502, 503, 504)
+# Base delay between retries, doubled on every attempt
+RETRY_BACKOFF_S = 0.1
+
+
+class ComfyClient:
+    """
+    Shared, connection-pooled HTTP client for a single ComfyUI server.
+
+    Args:
+        host (str): ComfyUI host and port, e.g. "127.0.0.1:8188".
+        pool_size (int): Maximum number of keep-alive connections to keep open.
+    """
+
+    def __init__(self, host, pool_size=COMFY_HTTP_POOL_SIZE):
+        self.base_url = f"http://{host}"
+        self._adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, max_retries=0
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", self._adapter)
+        self._lock = threading.Lock()
+        self._retries = 0
+
+    def url(self, path):
+        """Return the absolute URL for an API path (absolute URLs are kept as-is)."""
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        return f"{self.base_url}{path}"
+
+    def request(self, method, path, endpoint, **kwargs):
+        """
+        Send a request using the timeout and retry policy of the given endpoint.
+
+        Args:
+            method (str): HTTP method.
+            path (str): API path (e.g. "/history/<id>") or absolute URL.
+            endpoint (str): Key into ENDPOINT_POLICIES.
+            **kwargs: Passed through to requests.Session.request.
+
+        Returns:
+            requests.Response: The response of the last attempt.
+
+        Raises:
+            requests.RequestException: If the last attempt failed.
+        """
+        policy = ENDPOINT_POLICIES[endpoint]
+        kwargs.setdefault("timeout", policy["timeout"])
+        attempts = policy["retries"] + 1
+
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            _rewind_body(kwargs)
+            try:
+                response = self.session.request(method, self.url(path), **kwargs)
+            except requests.ConnectionError:
+                if last_attempt:
+                    raise
+            else:
+                if last_attempt or response.status_code not in RETRY_STATUS_CODES:
+                    return response
+
+            with self._lock:
+                self._retries += 1
+            time.sleep(RETRY_BACKOFF_S * (2**attempt))
+
+    def get(self, path, endpoint, **kwargs):
+        return self.request("GET", path, endpoint, **kwargs)
+
+    def post(self, path, endpoint, **kwargs):
+        return self.request("POST", path, endpoint, **kwargs)
+
+    def stats(self):
+        """
+        Return connection pool counters.
+
+        Returns:
+            dict: Total requests sent, connections opened, connections reused
+                  (requests that went over an already open connection) and retries.
+        """
+        opened = 0
+        sent = 0
+        pools = self._adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            opened += pool.num_connections
+            sent += pool.num_requests
+        with self._lock:
+            retries = self._retries
+        return {
+            "requests": sent,
+            "connections_opened": opened,
+            "connections_reused": max(sent - opened, 0),
+            "retries": retries,
+        }
+
+
+def _rewind_body(kwargs):
+    """Seek file-like request bodies back to the start so a retry resends them."""
+    data = kwargs.get("data")
+    if hasattr(data, "seek"):
+        data.seek(0)
+    for value in (kwargs.get("files") or {}).values():
+        if isinstance(value, tuple) and len(value) > 1 and hasattr(value[1], "seek"):
+            value[1].seek(0)
@@ -0,0 +1,102 @@
+"""
+Worker-wide health state of the ComfyUI server.
+
+ComfyUI is waited for once (the readiness gate, at worker start or on the
+first job). After that the state is kept up to date by what the worker sees
+anyway: websocket status events and reconnects, and failed HTTP requests.
+Jobs only read the state, so a healthy worker spends nothing on probing, and
+a job that arrives after ComfyUI died fails at once with the recorded reason
+instead of polling a dead server.
+"""
+
+import threading
+import time
+
+STARTING = "starting"
+READY = "ready"
+UNHEALTHY = "unhealthy"
+
+
+class ComfyHealth:
+    """
+    Readiness gate and health state of ComfyUI.
+
+    Args:
+        wait_ready (callable): Blocks until ComfyUI answers; returns False if it
+            never did (run once, by the first caller of ensure_ready()).
+        probe (callable): One quick check of ComfyUI (True if it answers); used
+            to notice that an unhealthy ComfyUI is back.
+    """
+
+    def __init__(self, wait_ready, probe):
+        self._wait_ready = wait_ready
+        self._probe = probe
+        self._gate_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.state = STARTING
+        self.reason = None
+        self.changed_at = time.monotonic()
+        self._failures = 0
+
+    def _set(self, state, reason=None):
+        with self._lock:
+            if state == self.state and reason == self.reason:
+                return False
+            self.state = state
+            self.reason = reason
+            self.changed_at = time.monotonic()
+            if state == UNHEALTHY:
+                self._failures += 1
+        return True
+
+    def mark_ready(self):
+        """ComfyUI answered (status event, reconnect, successful probe)."""
+        if self.state != READY and self._set(READY):
+            print("worker-comfyui - ComfyUI is ready")
+
+    def mark_unhealthy(self, reason):
+        """ComfyUI is gone (crash diagnostics, failed reconnect, refused connection)."""
+        if self._set(UNHEALTHY, reason):
+            print(f"worker-comfyui - ComfyUI marked unhealthy: {reason}")
+
+    def ensure_ready(self):
+        """
+        Check that a job can use ComfyUI.
+
+        Free while ComfyUI is ready. The first call waits for the readiness
+        gate (concurrent callers wait for the same gate). While ComfyUI is
+        unhealthy, one probe is made to see whether it came back.
+
+        Returns:
+            str: Reason why ComfyUI is not available, or None if it is.
+        """
+        if self.state == READY:
+            return None
+        if self.state == STARTING:
+            with self._gate_lock:
+                if self.state == STARTING:
+                    if self._wait_ready():
+                        self.mark_ready()
+                    else:
+                        self.mark_unhealthy("ComfyUI did not become reachable")
+            return self.reason
+        if self._probe():
+            self.mark_ready()
+            return None
+        return self.reason
+
+    def stats(self):
+        """
+        Return the health state.
+
+        Returns:
+            dict: "state", "reason", "since_s" (seconds since the last change) and the
+                  number of times ComfyUI was marked unhealthy ("failures").
+        """
+        with self._lock:
+            return {
+                "state": self.state,
+                "reason": self.reason,
+                "since_s": round(time.monotonic() - self.changed_at, 1),
+                "failures": self._failures,
+            }
@@ -0,0 +1,309 @@
+"""
+Persistent, multiplexed websocket connection to ComfyUI.
+
+One websocket (with one ComfyUI client_id) is opened per worker and shared by
+every job. A background thread receives all messages and routes each one to the
+queue of the prompt it belongs to, so jobs never pay for a websocket handshake
+and several prompts can be monitored over the same connection.
+"""
+
+import json
+import queue
+import random
+import struct
+import threading
+import uuid
+from collections import OrderedDict
+
+import websocket
+
+# Seconds a blocking recv() waits before the reader thread loops again
+WEBSOCKET_RECV_TIMEOUT_S = 10
+# Maximum number of not-yet-subscribed prompts whose events are buffered
+MAX_BUFFERED_PROMPTS = 64
+# Maximum number of buffered events (of all prompts together)
+MAX_BUFFERED_MESSAGES = 1024
+# Unsubscribed prompts remembered so their late events are dropped, not buffered
+MAX_FINISHED_PROMPTS = 256
+
+# Synthetic event types delivered to subscribers by the manager itself
+EVENT_RECONNECTED = "_reconnected"
+EVENT_DISCONNECTED = "_disconnected"
+# Event type used for binary frames (previews / websocket image outputs)
+EVENT_BINARY = "binary"
+
+# Binary frame types sent by ComfyUI (first 4 bytes, big-endian)
+BINARY_PREVIEW_IMAGE = 1
+BINARY_PREVIEW_IMAGE_WITH_METADATA = 4
+# Image formats of BINARY_PREVIEW_IMAGE frames (next 4 bytes)
+BINARY_IMAGE_FORMATS = {1: "jpeg", 2: "png"}
+
+
+def decode_image_frame(payload):
+    """
+    Split a binary image frame into its format and the encoded image.
+
+    Latent previews and the images of websocket save nodes (e.g.
+    SaveImageWebsocket) both arrive as such frames.
+
+    Args:
+        payload (bytes): Binary websocket frame.
+
+    Returns:
+        tuple: (format, image bytes) with format "jpeg" or "png" (None if
+               unknown), or None if the frame does not carry an image. The image
+               bytes are a memoryview of the frame, not a copy.
+    """
+    if len(payload) < 8:
+        return None
+    event_type, field = struct.unpack(">II", payload[:8])
+    view = memoryview(payload)
+    if event_type == BINARY_PREVIEW_IMAGE:
+        return BINARY_IMAGE_FORMATS.get(field), view[8:]
+    if event_type == BINARY_PREVIEW_IMAGE_WITH_METADATA:
+        # field is the length of a JSON metadata block ("image_type": "image/png", ...)
+        try:
+            metadata = json.loads(bytes(view[8 : 8 + field]))
+        except ValueError:
+            metadata = {}
+        image_format = str(metadata.get("image_type", "")).split("/")[-1] or None
+        return image_format, view[8 + field :]
+    return None
+
+
+def reconnect_delay(attempt, base_s, max_s):
+    """
+    Delay before reconnect attempt ``attempt + 1``: exponential backoff with jitter.
+
+    The delay doubles with every attempt up to ``max_s``; half of it is random
+    ("equal jitter"), so workers that lost ComfyUI at the same moment do not
+    all reconnect in lockstep.
+
+    Args:
+        attempt (int): Number of the failed attempt (0 for the first).
+        base_s (float): Delay after the first failed attempt.
+        max_s (float): Upper bound of the delay.
+
+    Returns:
+        float: Seconds to wait.
+    """
+    delay = min(max_s, base_s * 2**attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class ComfyWebsocketManager:
+    """
+    Long-lived websocket connection to ComfyUI shared across jobs.
+
+    Messages are delivered as dictionaries (``{"type": ..., "data": {...}}``)
+    to the queue returned by ``subscribe(prompt_id)``:
+      • events that carry a ``prompt_id`` go to that prompt only,
+      • ``status`` events (queue size) go to every subscriber,
+      • binary frames go to the prompt that is currently executing.
+
+    Text events of prompts nobody subscribed to yet are buffered (up to
+    MAX_BUFFERED_PROMPTS prompts and MAX_BUFFERED_MESSAGES events); binary
+    frames and events of prompts that were already unsubscribed are dropped,
+    so subscribe before queueing a prompt whose images arrive as binary frames.
+
+    Args:
+        host (str): ComfyUI host and port, e.g. "127.0.0.1:8188".
+        reconnect (callable): ``reconnect(ws_url, error)`` returning a newly
+            connected ``websocket.WebSocket`` or raising
+            ``websocket.WebSocketConnectionClosedException`` when it gives up.
+        on_status (callable, optional): Called with the status payload whenever
+            ComfyUI reports a new queue size.
+    """
+
+    def __init__(self, host, reconnect, on_status=None):
+        self.client_id = str(uuid.uuid4())
+        self.ws_url = f"ws://{host}/ws?clientId={self.client_id}"
+        self._reconnect = reconnect
+        self._on_status = on_status
+        self._ws = None
+        self._reader = None
+        self._connect_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._buffered = OrderedDict()
+        self._buffered_count = 0
+        self._finished = OrderedDict()
+        # Prompt / node ComfyUI reported as executing most recently
+        self.current_prompt_id = None
+        self.current_node = None
+        # Latest "status" payload (contains exec_info.queue_remaining)
+        self.last_status = {}
+
+    @property
+    def connected(self):
+        ws = self._ws
+        return ws is not None and ws.connected
+
+    @property
+    def queue_remaining(self):
+        """Latest queue size reported by ComfyUI, or None before the first status event."""
+        return self.last_status.get("exec_info", {}).get("queue_remaining")
+
+    @property
+    def alive(self):
+        """True while the reader thread is running (connected or reconnecting)."""
+        return self._reader is not None and self._reader.is_alive()
+
+    def ensure_connected(self):
+        """
+        Connect the websocket and start the reader thread unless already running.
+
+        While the reader thread is alive it owns the connection (including
+        reconnects), so this is a no-op for every job but the first one.
+
+        Raises:
+            websocket.WebSocketException / OSError: If the connection cannot be established.
+        """
+        with self._connect_lock:
+            if self.alive:
+                return
+            print(f"worker-comfyui - Connecting to websocket: {self.ws_url}")
+            ws = websocket.WebSocket()
+            ws.connect(self.ws_url, timeout=WEBSOCKET_RECV_TIMEOUT_S)
+            self._ws = ws
+            print(f"worker-comfyui - Websocket connected")
+            self._reader = threading.Thread(
+                target=self._run, name="comfy-websocket", daemon=True
+            )
+            self._reader.start()
+
+    def subscribe(self, prompt_id):
+        """
+        Register a prompt and return the queue its events are delivered to.
+
+        Events that arrived for the prompt before it was subscribed are replayed
+        into the queue first.
+        """
+        events = queue.Queue()
+        with self._lock:
+            buffered = self._buffered.pop(prompt_id, [])
+            self._buffered_count -= len(buffered)
+            for message in buffered:
+                events.put(message)
+            self._finished.pop(prompt_id, None)
+            self._subscribers[prompt_id] = events
+        return events
+
+    def unsubscribe(self, prompt_id):
+        """Stop delivering the prompt's events; events that still arrive for it are dropped."""
+        with self._lock:
+            self._subscribers.pop(prompt_id, None)
+            self._buffered_count -= len(self._buffered.pop(prompt_id, []))
+            self._finished[prompt_id] = True
+            while len(self._finished) > MAX_FINISHED_PROMPTS:
+                self._finished.popitem(last=False)
+
+    def close(self):
+        with self._connect_lock:
+            ws, self._ws = self._ws, None
+        if ws and ws.connected:
+            ws.close()
+
+    # ------------------------------------------------------------------
+    # Reader thread
+    # ------------------------------------------------------------------
+
+    def _run(self):
+        while True:
+            ws = self._ws
+            if ws is None:
+                return
+            try:
+                out = ws.recv()
+            except websocket.WebSocketTimeoutException:
+                continue
+            except (websocket.WebSocketException, OSError) as closed_err:
+                if self._ws is None:
+                    # Closed on purpose through close()
+                    return
+                try:
+                    new_ws = self._reconnect(self.ws_url, closed_err)
+                except websocket.WebSocketConnectionClosedException as reconn_err:
+                    with self._connect_lock:
+                        self._ws = None
+                    self._broadcast(
+                        {"type": EVENT_DISCONNECTED, "data": {"error": str(reconn_err)}}
+                    )
+                    return
+                with self._connect_lock:
+                    self._ws = new_ws
+                self._broadcast({"type": EVENT_RECONNECTED, "data": {}})
+                continue
+
+            try:
+                self._dispatch(out)
+            except Exception as e:
+                print(f"worker-comfyui - Error dispatching websocket message: {e}")
+
+    def _dispatch(self, out):
+        if not isinstance(out, str):
+            # Binary frames carry no prompt_id: they belong to the executing node
+            self._deliver(
+                self.current_prompt_id,
+                {
+                    "type": EVENT_BINARY,
+                    "data": {
+                        "prompt_id": self.current_prompt_id,
+                        "node": self.current_node,
+                    },
+                    "payload": out,
+                },
+            )
+            return
+
+        try:
+            message = json.loads(out)
+        except json.JSONDecodeError:
+            print(f"worker-comfyui - Received invalid JSON message via websocket.")
+            return
+
+        message_type = message.get("type")
+        data = message.get("data") or {}
+
+        if message_type == "status":
+            self.last_status = data.get("status", {})
+            if self._on_status:
+                self._on_status(self.last_status)
+            self._broadcast(message)
+            return
+
+        prompt_id = data.get("prompt_id")
+        if message_type == "executing":
+            self.current_prompt_id = prompt_id if data.get("node") is not None else None
+            self.current_node = data.get("node")
+
+        if prompt_id is not None:
+            self._deliver(prompt_id, message)
+
+    def _deliver(self, prompt_id, message):
+        if prompt_id is None:
+            return
+        with self._lock:
+            events = self._subscribers.get(prompt_id)
+            if events is None:
+                if prompt_id in self._finished or message["type"] == EVENT_BINARY:
+                    # Nobody will read it (binary frames can be megabytes of image data)
+                    return
+                # Not subscribed (yet): keep the event until the job subscribes
+                self._buffered.setdefault(prompt_id, []).append(message)
+                self._buffered.move_to_end(prompt_id)
+                self._buffered_count += 1
+                while (
+                    len(self._buffered) > MAX_BUFFERED_PROMPTS
+                    or self._buffered_count > MAX_BUFFERED_MESSAGES
+                ):
+                    _, dropped = self._buffered.popitem(last=False)
+                    self._buffered_count -= len(dropped)
+                return
+        events.put(message)
+
+    def _broadcast(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers.values())
+        for events in subscribers:
+            events.put(message)
@@ -0,0 +1,231 @@
+"""
+Crash diagnostics read straight from /proc and the memory cgroup.
+
+When ComfyUI stops answering, the worker records why: whether the ComfyUI
+process still exists, whether the container's memory cgroup OOM-killed
+something since the worker started, how much memory is left, and the end of
+ComfyUI's log (CUDA out-of-memory errors show up there). Every source is a
+small file read, no subprocess is started (dmesg is usually not permitted in
+containers anyway), and the collectors run in parallel daemon threads under
+one time budget, so a stuck read cannot hold up the failing job.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+# Bytes read from the end of the log file
+LOG_TAIL_BYTES = 16 * 1024
+# Lines of the log file kept
+LOG_TAIL_LINES = 50
+# Log lines that mean CUDA ran out of memory
+CUDA_OOM_MARKERS = ("CUDA out of memory", "OutOfMemoryError", "CUBLAS_STATUS_ALLOC_FAILED")
+
+
+def _read(path):
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+def find_processes(pattern, proc_root="/proc"):
+    """
+    Find running (non-zombie) processes whose command line contains ``pattern``.
+
+    Args:
+        pattern (str): Substring of the command line, e.g. "comfyui/main.py".
+        proc_root (str): Mount point of procfs.
+
+    Returns:
+        list: Matching pids (the calling process excluded).
+    """
+    pids = []
+    own_pid = os.getpid()
+    for entry in os.listdir(proc_root):
+        if not entry.isdigit() or int(entry) == own_pid:
+            continue
+        try:
+            cmdline = _read(os.path.join(proc_root, entry, "cmdline")).replace("\0", " ")
+            if pattern not in cmdline:
+                continue
+            # State is the field after the parenthesised command name
+            state = _read(os.path.join(proc_root, entry, "stat")).rsplit(")", 1)[1].split()[0]
+        except (OSError, IndexError):
+            # The process exited while we were looking
+            continue
+        if state not in ("Z", "X"):
+            pids.append(int(entry))
+    return sorted(pids)
+
+
+def read_meminfo(proc_root="/proc"):
+    """
+    Read the system memory figures.
+
+    Returns:
+        dict: "total_mb", "available_mb", "swap_free_mb" (missing fields are left out).
+    """
+    fields = {"MemTotal": "total_mb", "MemAvailable": "available_mb", "SwapFree": "swap_free_mb"}
+    memory = {}
+    for line in _read(os.path.join(proc_root, "meminfo")).splitlines():
+        name, _, value = line.partition(":")
+        if name in fields:
+            memory[fields[name]] = int(value.split()[0]) // 1024
+    return memory
+
+
+def read_memory_cgroup(cgroup_root="/sys/fs/cgroup"):
+    """
+    Read the OOM counters and usage of the container's memory cgroup.
+
+    Supports cgroup v2 (memory.events) and v1 (memory/memory.oom_control).
+
+    Args:
+        cgroup_root (str): Mount point of the cgroup filesystem.
+
+    Returns:
+        dict: "oom_kill" (kills so far), "oom" (times the limit was hit, v2
+              only), "current_mb" and "max_mb" (None if unlimited), or None if
+              no memory cgroup is readable.
+    """
+    v2_events = os.path.join(cgroup_root, "memory.events")
+    v1_dir = os.path.join(cgroup_root, "memory")
+    if os.path.exists(v2_events):
+        counters = dict(line.split() for line in _read(v2_events).splitlines() if line.strip())
+        cgroup = {"oom_kill": int(counters.get("oom_kill", 0)), "oom": int(counters.get("oom", 0))}
+        usage_file, limit_file = "memory.current", "memory.max"
+        base = cgroup_root
+    elif os.path.exists(os.path.join(v1_dir, "memory.oom_control")):
+        counters = dict(
+            line.split() for line in _read(os.path.join(v1_dir, "memory.oom_control")).splitlines() if line.strip()
+        )
+        cgroup = {"oom_kill": int(counters.get("oom_kill", 0))}
+        usage_file, limit_file = "memory.usage_in_bytes", "memory.limit_in_bytes"
+        base = v1_dir
+    else:
+        return None
+
+    for key, name in (("current_mb", usage_file), ("max_mb", limit_file)):
+        try:
+            value = _read(os.path.join(base, name)).strip()
+        except OSError:
+            continue
+        # v2 writes "max", v1 a huge number when there is no limit
+        cgroup[key] = None if value == "max" or int(value) >= 2**60 else int(value) // (1024 * 1024)
+    return cgroup
+
+
+def oom_kill_count(cgroup_root="/sys/fs/cgroup"):
+    """
+    Return the number of OOM kills of the memory cgroup (0 if it cannot be read).
+    """
+    try:
+        cgroup = read_memory_cgroup(cgroup_root)
+    except (OSError, ValueError):
+        return 0
+    return cgroup["oom_kill"] if cgroup else 0
+
+
+def tail_file(path, max_bytes=LOG_TAIL_BYTES, max_lines=LOG_TAIL_LINES):
+    """
+    Read the last lines of a file without reading the whole file.
+
+    Args:
+        path (str): File to read.
+        max_bytes (int): Bytes read from the end at most.
+        max_lines (int): Lines returned at most.
+
+    Returns:
+        list: The last lines (the first one may be cut off if the file is longer than max_bytes).
+    """
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - max_bytes))
+        data = f.read(max_bytes)
+    return data.decode("utf-8", errors="replace").splitlines()[-max_lines:]
+
+
+def collect(
+    process_pattern,
+    log_path,
+    budget_s,
+    oom_kills_at_start=0,
+    proc_root="/proc",
+    cgroup_root="/sys/fs/cgroup",
+):
+    """
+    Collect the crash diagnostics in parallel, within ``budget_s``.
+
+    Args:
+        process_pattern (str): Command line substring of the ComfyUI process.
+        log_path (str): ComfyUI's log file.
+        budget_s (float): Time after which collectors that did not finish are given up.
+        oom_kills_at_start (int): Cgroup oom_kill counter when the worker started,
+            so only kills since then count.
+        proc_root (str): Mount point of procfs.
+        cgroup_root (str): Mount point of the cgroup filesystem.
+
+    Returns:
+        dict: "comfyui_process_alive", "comfyui_pids", "oom_kill_detected",
+              "memory_cgroup", "system_memory", "cuda_oom_in_log",
+              "comfyui_log_tail", plus "errors" (collector -> message),
+              "timed_out" (collectors that exceeded the budget) and "elapsed_ms".
+              Keys of collectors that failed or timed out are missing.
+    """
+    start = time.monotonic()
+    collectors = {
+        "processes": lambda: find_processes(process_pattern, proc_root),
+        "memory_cgroup": lambda: read_memory_cgroup(cgroup_root),
+        "system_memory": lambda: read_meminfo(proc_root),
+        "log_tail": lambda: tail_file(log_path) if os.path.exists(log_path) else None,
+    }
+    # One future per collector: a collector that finishes after the budget only
+    # completes its own future, never state this function is still reading
+    futures = {name: Future() for name in collectors}
+
+    def run(name, collector):
+        try:
+            futures[name].set_result(collector())
+        except Exception as e:
+            futures[name].set_exception(e)
+
+    # Daemon threads: a read stuck on a hung filesystem never blocks the worker's exit
+    threads = [
+        threading.Thread(target=run, args=(name, collector), name=f"crash-diag-{name}", daemon=True)
+        for name, collector in collectors.items()
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(max(0.0, start + budget_s - time.monotonic()))
+
+    # Snapshot of the collectors that completed within the budget
+    results, errors, timed_out = {}, {}, []
+    for name, future in futures.items():
+        if not future.done():
+            timed_out.append(name)
+        elif future.exception() is not None:
+            errors[name] = str(future.exception())
+        else:
+            results[name] = future.result()
+
+    diag = {}
+    if "processes" in results:
+        diag["comfyui_process_alive"] = bool(results["processes"])
+        diag["comfyui_pids"] = results["processes"]
+    if "memory_cgroup" in results:
+        cgroup = results["memory_cgroup"]
+        diag["memory_cgroup"] = cgroup
+        if cgroup is not None:
+            diag["oom_kill_detected"] = cgroup["oom_kill"] > oom_kills_at_start
+    if "system_memory" in results:
+        diag["system_memory"] = results["system_memory"]
+    if results.get("log_tail") is not None:
+        lines = results["log_tail"]
+        diag["comfyui_log_tail"] = lines
+        diag["cuda_oom_in_log"] = any(marker in line for line in lines for marker in CUDA_OOM_MARKERS)
+    diag["errors"] = errors
+    diag["timed_out"] = timed_out
+    diag["elapsed_ms"] = round((time.monotonic() - start) * 1000, 1)
+    return diag
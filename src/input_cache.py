@@ -0,0 +1,246 @@
+"""
+Content-addressed cache of input images in ComfyUI's input directory.
+
+Clients often send the same reference / ControlNet images with many jobs.
+Every input image is named after a hash of its payload, so an image that is
+already in ComfyUI's input directory does not need to be uploaded again; the
+workflow is rewritten to point at the content-addressed filename.
+
+The cache is bounded by total size: least recently used images that no
+running job needs are deleted from the input directory.
+"""
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from input_images import base64_payload_start
+
+# Base64 characters hashed per update() call
+HASH_CHUNK_CHARS = 1024 * 1024
+# Node inputs that name an image in ComfyUI's input directory, besides the
+# inputs /object_info marks with "image_upload"; only these are pointed at
+# the content-addressed names
+IMAGE_LOADER_INPUTS = {
+    "LoadImage": ("image",),
+    "LoadImageMask": ("image",),
+}
+# Content-addressed filenames: 32 hex characters + extension
+_CACHED_NAME = re.compile(r"^[0-9a-f]{32}\.[A-Za-z0-9]+$")
+
+
+def payload_digest(image_data_uri):
+    """Hash the base64 payload of an image (without decoding it)."""
+    start = base64_payload_start(image_data_uri)
+    digest = hashlib.sha256()
+    for pos in range(start, len(image_data_uri), HASH_CHUNK_CHARS):
+        digest.update(image_data_uri[pos : pos + HASH_CHUNK_CHARS].encode("ascii", "replace"))
+    return digest.hexdigest()[:32]
+
+
+def image_loader_inputs(class_type, object_info=None):
+    """
+    Return the inputs of a node class that name an image in ComfyUI's input directory.
+
+    Args:
+        class_type (str): Node class.
+        object_info (dict, optional): The /object_info document; inputs with
+            the "image_upload" flag (the upload widget of LoadImage and of
+            custom loaders) count as image inputs.
+
+    Returns:
+        set: Input names.
+    """
+    names = set(IMAGE_LOADER_INPUTS.get(class_type, ()))
+    node_info = object_info.get(class_type) if object_info else None
+    if not isinstance(node_info, dict):
+        return names
+    for section in ("required", "optional"):
+        for name, spec in (node_info.get("input", {}).get(section) or {}).items():
+            if (
+                isinstance(spec, list)
+                and len(spec) > 1
+                and isinstance(spec[1], dict)
+                and spec[1].get("image_upload")
+            ):
+                names.add(name)
+    return names
+
+
+def rewrite_image_names(workflow, renamed, object_info=None):
+    """
+    Point image loader inputs that reference an uploaded image at its cached filename.
+
+    Other string inputs (prompts, filename prefixes, ...) are left alone even
+    if they happen to equal an image name.
+
+    Args:
+        workflow (dict): API-format workflow (modified in place).
+        renamed (dict): Original image name -> content-addressed name.
+        object_info (dict, optional): See image_loader_inputs().
+
+    Returns:
+        dict: The workflow.
+    """
+    if not renamed:
+        return workflow
+    for node in workflow.values():
+        if not isinstance(node, dict):
+            continue
+        inputs = node.get("inputs")
+        if not isinstance(inputs, dict):
+            continue
+        for key in image_loader_inputs(node.get("class_type"), object_info):
+            value = inputs.get(key)
+            if isinstance(value, str) and value in renamed:
+                inputs[key] = renamed[value]
+    return workflow
+
+
+def unrewritten_names(workflow, renamed):
+    """
+    Return the original image names a workflow still references after rewrite_image_names().
+
+    These inputs belong to nodes that are not known image loaders, so the
+    image must also be available under the name the client sent.
+
+    Args:
+        workflow (dict): API-format workflow.
+        renamed (dict): Original image name -> content-addressed name.
+
+    Returns:
+        set: Original names still used as input values.
+    """
+    names = set()
+    for node in workflow.values():
+        inputs = node.get("inputs") if isinstance(node, dict) else None
+        if not isinstance(inputs, dict):
+            continue
+        for value in inputs.values():
+            if isinstance(value, str) and value in renamed:
+                names.add(value)
+    return names
+
+
+class InputImageCache:
+    """
+    Index of content-addressed images in ComfyUI's input directory.
+
+    Args:
+        input_dir (str): ComfyUI's input directory. If it is not on the local
+            filesystem the index is kept in memory only and nothing is deleted.
+        max_bytes (int): Total size of cached images to keep.
+    """
+
+    def __init__(self, input_dir, max_bytes):
+        self.input_dir = input_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._pins = {}
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+        self._load_existing()
+
+    @property
+    def local(self):
+        return os.path.isdir(self.input_dir)
+
+    @property
+    def total_bytes(self):
+        return self._total
+
+    def _load_existing(self):
+        """Rebuild the index from content-addressed files left by a previous run."""
+        if not self.local:
+            return
+        entries = []
+        with os.scandir(self.input_dir) as it:
+            for entry in it:
+                if _CACHED_NAME.match(entry.name) and entry.is_file():
+                    stat = entry.stat()
+                    entries.append((stat.st_atime, entry.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._entries[name] = size
+            self._total += size
+        self._evict()
+
+    def prepare(self, images):
+        """
+        Give every input image its content-addressed name and pin it for the job.
+
+        Args:
+            images (list): Input images ({"name": ..., "image": ...}).
+
+        Returns:
+            tuple: (images with cached names, {original name: cached name})
+        """
+        prepared = []
+        renamed = {}
+        for image in images:
+            name = image["name"]
+            extension = os.path.splitext(name)[1].lower() or ".png"
+            cached_name = f"{payload_digest(image['image'])}{extension}"
+            renamed[name] = cached_name
+            prepared.append({**image, "name": cached_name, "original_name": name})
+        self.pin(renamed.values())
+        return prepared, renamed
+
+    def contains(self, name):
+        """Return True if the image is in ComfyUI's input directory (and mark it as used)."""
+        with self._lock:
+            if name not in self._entries:
+                self.misses += 1
+                return False
+            if self.local and not os.path.isfile(os.path.join(self.input_dir, name)):
+                # Deleted behind our back
+                self._total -= self._entries.pop(name)
+                self.misses += 1
+                return False
+            self._entries.move_to_end(name)
+            self.hits += 1
+            return True
+
+    def add(self, name, size):
+        """Record an uploaded image (ignored for names that are not content-addressed)."""
+        if not _CACHED_NAME.match(name):
+            return
+        with self._lock:
+            self._total -= self._entries.pop(name, 0)
+            self._entries[name] = size
+            self._total += size
+            self._evict()
+
+    def pin(self, names):
+        with self._lock:
+            for name in names:
+                self._pins[name] = self._pins.get(name, 0) + 1
+
+    def unpin(self, names):
+        with self._lock:
+            for name in names:
+                count = self._pins.get(name, 0) - 1
+                if count > 0:
+                    self._pins[name] = count
+                else:
+                    self._pins.pop(name, None)
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used, unpinned images until the cache fits (lock held)."""
+        if self._total <= self.max_bytes:
+            return
+        for name in list(self._entries):
+            if self._total <= self.max_bytes:
+                break
+            if name in self._pins:
+                continue
+            self._total -= self._entries.pop(name)
+            if self.local:
+                try:
+                    os.remove(os.path.join(self.input_dir, name))
+                except OSError as e:
+                    print(f"worker-comfyui - Could not evict cached input {name}: {e}")
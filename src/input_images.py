@@ -0,0 +1,123 @@
+"""
+Streaming multipart body for uploading base64 input images to ComfyUI.
+
+The base64 string from the job input is decoded chunk by chunk while the
+request body is being sent, so neither the decoded image nor the encoded
+multipart body is ever held in memory as a whole.
+"""
+
+import base64
+import re
+import uuid
+
+# Base64 characters decoded per read (must be a multiple of 4)
+DECODE_CHUNK_CHARS = 64 * 1024
+
+_CANONICAL_BASE64 = re.compile(r"[A-Za-z0-9+/]*={0,2}")
+
+
+def base64_payload_start(image_data_uri):
+    """Return the index where the base64 payload starts (after an optional data: URI prefix)."""
+    comma = image_data_uri.find(",")
+    return comma + 1 if comma != -1 else 0
+
+
+def decoded_length(data, start=0):
+    """
+    Exact decoded size of ``data[start:]``.
+
+    Returns:
+        int: The decoded size, or None when the payload is not canonical base64
+             (whitespace, missing padding, URL-safe alphabet, ...).
+    """
+    length = len(data) - start
+    if length % 4 != 0 or not _CANONICAL_BASE64.fullmatch(data, start):
+        return None
+    padding = 0
+    if length and data[-1] == "=":
+        padding = 2 if data[-2] == "=" else 1
+    return length // 4 * 3 - padding
+
+
+def _quote(value):
+    return value.replace("\\", "\\\\").replace('"', "%22")
+
+
+class MultipartImageBody:
+    """
+    File-like ``multipart/form-data`` body for ComfyUI's /upload/image endpoint.
+
+    Canonical base64 is decoded lazily in ``read()``. Anything else is decoded
+    up front with ``base64.b64decode`` (same leniency as before, and decoding
+    errors are raised from the constructor).
+
+    Args:
+        name (str): Filename of the image in ComfyUI's input directory.
+        image_data_uri (str): Base64 image, optionally with a data: URI prefix.
+        fields (dict, optional): Extra form fields (e.g. {"overwrite": "true"}).
+        content_type (str): Content type of the image part.
+    """
+
+    def __init__(self, name, image_data_uri, fields=None, content_type="image/png"):
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+
+        head = b""
+        for field, value in (fields or {}).items():
+            head += (
+                f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="{_quote(field)}"\r\n\r\n'
+                f"{value}\r\n"
+            ).encode()
+        head += (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="image"; filename="{_quote(name)}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode()
+        self._head = head
+        self._tail = f"\r\n--{boundary}--\r\n".encode()
+
+        self._data = image_data_uri
+        self._start = base64_payload_start(image_data_uri)
+        size = decoded_length(image_data_uri, self._start)
+        self._decoded = None
+        if size is None:
+            self._decoded = base64.b64decode(image_data_uri[self._start :])
+            size = len(self._decoded)
+        self.image_size = size
+        self._length = len(self._head) + size + len(self._tail)
+        self.seek(0)
+
+    def __len__(self):
+        return self._length
+
+    def seek(self, offset, whence=0):
+        if offset != 0 or whence != 0:
+            raise ValueError("MultipartImageBody can only be rewound to the start")
+        self._pieces = self._iter_pieces()
+        self._pending = memoryview(b"")
+
+    def _iter_pieces(self):
+        yield self._head
+        if self._decoded is not None:
+            yield self._decoded
+        else:
+            for pos in range(self._start, len(self._data), DECODE_CHUNK_CHARS):
+                yield base64.b64decode(self._data[pos : pos + DECODE_CHUNK_CHARS])
+        yield self._tail
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._length
+        chunks = []
+        remaining = size
+        while remaining > 0:
+            if not self._pending:
+                self._pending = memoryview(next(self._pieces, b""))
+                if not self._pending:
+                    break
+            chunk = self._pending[:remaining]
+            self._pending = self._pending[len(chunk) :]
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
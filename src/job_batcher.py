@@ -0,0 +1,272 @@
+"""
+Cross-job batching: merge compatible workflows into one ComfyUI prompt.
+
+Jobs whose workflows only differ in per-job values (seed, prompt text, ...)
+are collected for a short window and queued as a single prompt. Every job
+keeps its own sub-graph (its node ids get a "<n>:" prefix); nodes whose
+whole upstream graph is identical across the jobs (model / LoRA / CLIP / VAE
+loaders, latent sizes, ...) are merged so they are loaded and executed once.
+Output nodes are never merged, so the outputs in the prompt's history can
+be split back to the job they belong to.
+"""
+
+import hashlib
+import json
+import threading
+import time
+
+from object_info import is_link
+
+
+def batch_key(workflow, varying_inputs):
+    """
+    Return a key that is equal for workflows which only differ in varying inputs.
+
+    Args:
+        workflow (dict): API-format workflow.
+        varying_inputs (iterable): Input names whose literal values may differ
+            between jobs of one batch (e.g. "seed", "text").
+
+    Returns:
+        str: Hex digest of the workflow with those values masked.
+    """
+    varying_inputs = set(varying_inputs)
+    masked = {}
+    for node_id, node in workflow.items():
+        inputs = {
+            name: "<varying>" if name in varying_inputs and not isinstance(value, list) else value
+            for name, value in node.get("inputs", {}).items()
+        }
+        masked[node_id] = [node.get("class_type"), inputs]
+    return hashlib.sha256(json.dumps(masked, sort_keys=True).encode()).hexdigest()
+
+
+def merge_workflows(workflows, is_output_node):
+    """
+    Merge workflows into one prompt, sharing identical upstream nodes.
+
+    Args:
+        workflows (list): API-format workflows.
+        is_output_node (callable): class_type -> True for output nodes.
+
+    Returns:
+        tuple: (merged workflow, {merged output node id: (job index, original node id)})
+    """
+    merged = {}
+    owners = {}
+    # Node signature -> merged node id
+    shared = {}
+
+    for index, workflow in enumerate(workflows):
+        signatures = {}
+        merged_ids = {}
+
+        def visit(node_id, trail=()):
+            if node_id in merged_ids:
+                return signatures[node_id]
+            if node_id in trail:
+                raise ValueError(f"Workflow has a cycle through node {node_id}")
+            node = workflow[node_id]
+            inputs = {}
+            signature_inputs = {}
+            for name, value in node.get("inputs", {}).items():
+                if is_link(value) and value[0] in workflow:
+                    source_signature = visit(value[0], trail + (node_id,))
+                    inputs[name] = [merged_ids[value[0]], value[1]]
+                    signature_inputs[name] = ["<link>", source_signature, value[1]]
+                else:
+                    inputs[name] = value
+                    signature_inputs[name] = value
+            class_type = node.get("class_type")
+            output = is_output_node(class_type)
+            signature = hashlib.sha256(
+                json.dumps(
+                    [class_type, signature_inputs, [index, node_id] if output else None],
+                    sort_keys=True,
+                ).encode()
+            ).hexdigest()
+            merged_id = shared.get(signature)
+            if merged_id is None:
+                merged_id = f"{index}:{node_id}"
+                merged[merged_id] = {**node, "inputs": inputs}
+                shared[signature] = merged_id
+            if output:
+                owners[merged_id] = (index, node_id)
+            signatures[node_id] = signature
+            merged_ids[node_id] = merged_id
+            return signature
+
+        for node_id in workflow:
+            visit(node_id)
+
+    return merged, owners
+
+
+def split_outputs(outputs, owners, count):
+    """
+    Split the outputs of a merged prompt back into per-job outputs.
+
+    Args:
+        outputs (dict): "outputs" of the merged prompt's history entry (or None).
+        owners (dict): From merge_workflows().
+        count (int): Number of merged jobs.
+
+    Returns:
+        list: Per job, its outputs keyed by its own node ids (None if outputs is None).
+    """
+    if outputs is None:
+        return [None] * count
+    per_job = [{} for _ in range(count)]
+    for merged_id, node_output in outputs.items():
+        if merged_id in owners:
+            index, node_id = owners[merged_id]
+            per_job[index][node_id] = node_output
+    return per_job
+
+
+class _Batch:
+    def __init__(self):
+        self.items = []
+        # One event per submitted item, set when the batch has run
+        self.waiters = []
+        self.opened_at = time.monotonic()
+        self.closed = False
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+    def finish(self, results=None, error=None):
+        self.results = results
+        self.error = error
+        self.done.set()
+        for waiter in self.waiters:
+            waiter.set()
+
+
+class JobBatcher:
+    """
+    Collects compatible jobs for a short window and runs them together.
+
+    The first job of a batch waits for up to ``window_s`` (less once the batch
+    is full) and then starts the whole batch in a thread of its own; every job
+    waits for its result. A job whose deadline passes or that is cancelled
+    stops waiting on its own, while the batch keeps running for the others.
+
+    Args:
+        window_s (float): How long the first job waits for others to join.
+        max_size (int): Largest batch.
+        run (callable): Called with the list of items submitted to a batch;
+            returns one result per item (in order). Exceptions are raised in every job.
+    """
+
+    def __init__(self, window_s, max_size, run):
+        self.window_s = window_s
+        self.max_size = max(1, max_size)
+        self._run = run
+        self._cond = threading.Condition()
+        self._open = {}
+        self._batches = 0
+        self._jobs = 0
+        self._wait_s = 0.0
+        self._max_wait_s = 0.0
+
+    def submit(self, key, item, deadline=None, stage=None):
+        """
+        Add an item (e.g. a job's workflow) to the open batch for its key and wait
+        for its result.
+
+        Args:
+            key (str): Compatibility key (see batch_key()).
+            item: Passed to ``run`` with the other items of the batch.
+            deadline (JobDeadline, optional): The job's deadline; the job stops
+                waiting when it is exceeded or the job is cancelled.
+            stage (callable, optional): Returns the stage reported when the job
+                stops waiting (e.g. "wait_for_start" or "execution").
+
+        Returns:
+            The result ``run`` returned for this item.
+
+        Raises:
+            DeadlineExceeded: If the job's deadline passed or it was cancelled.
+        """
+        wake = threading.Event()
+        if deadline is not None:
+            deadline.on_cancel(wake.set)
+        with self._cond:
+            batch = self._open.get(key)
+            leader = batch is None
+            if leader:
+                batch = _Batch()
+                self._open[key] = batch
+            position = len(batch.items)
+            batch.items.append(item)
+            batch.waiters.append(wake)
+            if len(batch.items) >= self.max_size:
+                self._close(key, batch)
+                self._cond.notify_all()
+
+            if leader:
+                window_end = batch.opened_at + self.window_s
+                while not batch.closed:
+                    left = window_end - time.monotonic()
+                    if deadline is not None and deadline.remaining() is not None:
+                        # A job out of time runs the batch for the others at once
+                        left = min(left, deadline.remaining())
+                    if left <= 0:
+                        self._close(key, batch)
+                        break
+                    self._cond.wait(left)
+                self._record(batch)
+
+        if leader:
+            threading.Thread(
+                target=self._run_batch, args=(batch,), name="job-batch", daemon=True
+            ).start()
+
+        while not batch.done.is_set():
+            if deadline is not None and deadline.exceeded():
+                deadline.check(stage() if stage else "batch")
+            wake.wait(None if deadline is None else deadline.remaining())
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.results[position]
+
+    def _run_batch(self, batch):
+        try:
+            batch.finish(results=self._run(batch.items))
+        except BaseException as e:
+            batch.finish(error=e)
+
+    def _close(self, key, batch):
+        batch.closed = True
+        if self._open.get(key) is batch:
+            del self._open[key]
+
+    def _record(self, batch):
+        waited = time.monotonic() - batch.opened_at
+        self._batches += 1
+        self._jobs += len(batch.items)
+        self._wait_s += waited
+        self._max_wait_s = max(self._max_wait_s, waited)
+        print(
+            f"worker-comfyui - Running batch of {len(batch.items)} job(s) after waiting {waited * 1000:.0f} ms"
+        )
+
+    def stats(self):
+        """
+        Return batching counters.
+
+        Returns:
+            dict: Batches run, jobs batched, mean batch size and the mean / max
+                  time (ms) the first job of a batch waited for the window.
+        """
+        with self._cond:
+            batches = self._batches
+            return {
+                "batches": batches,
+                "jobs": self._jobs,
+                "mean_batch_size": round(self._jobs / batches, 2) if batches else 0,
+                "mean_wait_ms": round(self._wait_s / batches * 1000, 1) if batches else 0,
+                "max_wait_ms": round(self._max_wait_s * 1000, 1),
+            }
@@ -0,0 +1,148 @@
+"""
+Per-job deadlines and cancellation.
+
+A job may run for at most its deadline (the job's "deadline_ms" or the worker
+default) and can be cancelled at any time (RunPod stops the job's task when
+it is cancelled or timed out). The handler checks the deadline between stages
+and waits on ComfyUI with the remaining time as timeout; when it is exceeded
+the stage that ran out of time is reported and the job's prompt is removed
+from ComfyUI's queue or interrupted, so it does not keep the GPU busy.
+"""
+
+import threading
+import time
+
+# Reasons a job is stopped
+DEADLINE = "deadline"
+CANCELLED = "cancelled"
+
+
+class DeadlineExceeded(Exception):
+    """
+    The job ran out of time or was cancelled.
+
+    Args:
+        stage (str): Stage the job was in (see job_timings).
+        reason (str): DEADLINE or CANCELLED.
+    """
+
+    def __init__(self, stage, reason):
+        self.stage = stage
+        self.reason = reason
+        super().__init__(f"Job {'cancelled' if reason == CANCELLED else 'deadline exceeded'} during {stage}")
+
+
+class JobDeadline:
+    """
+    Deadline and cancellation flag of one job (thread-safe).
+
+    Args:
+        timeout_s (float, optional): Time the job may take from now (None = no limit).
+    """
+
+    def __init__(self, timeout_s=None):
+        self.started_at = time.monotonic()
+        self.timeout_s = None
+        self.expires_at = None
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self.set_timeout(timeout_s)
+
+    def set_timeout(self, timeout_s):
+        """Limit the job to ``timeout_s`` from its start (None = no limit)."""
+        self.timeout_s = timeout_s
+        self.expires_at = None if timeout_s is None else self.started_at + timeout_s
+
+    def cancel(self):
+        """Cancel the job; waiters registered with on_cancel() are woken."""
+        with self._lock:
+            if self._cancelled.is_set():
+                return
+            self._cancelled.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            callback()
+
+    def on_cancel(self, callback):
+        """Call ``callback`` when the job is cancelled (at once if it already is)."""
+        with self._lock:
+            if not self._cancelled.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def remaining(self):
+        """Seconds left (0 once exceeded), or None without a time limit."""
+        if self.cancelled:
+            return 0.0
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def exceeded(self):
+        """Return CANCELLED, DEADLINE or None."""
+        if self.cancelled:
+            return CANCELLED
+        if self.expires_at is not None and time.monotonic() >= self.expires_at:
+            return DEADLINE
+        return None
+
+    def check(self, stage):
+        """
+        Raise DeadlineExceeded if the job must stop.
+
+        Args:
+            stage (str): Stage reported if it must.
+        """
+        reason = self.exceeded()
+        if reason:
+            raise DeadlineExceeded(stage, reason)
+
+
+class SharedDeadline:
+    """
+    Deadline of a prompt shared by several jobs (a batch).
+
+    The prompt is stopped only once every job was cancelled or ran out of
+    time; until then the jobs that are still waiting need its results.
+
+    Args:
+        deadlines (list): JobDeadline of every job.
+    """
+
+    def __init__(self, deadlines):
+        self.deadlines = list(deadlines)
+
+    def on_cancel(self, callback):
+        remaining = [len(self.deadlines)]
+        lock = threading.Lock()
+
+        def one_cancelled():
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                callback()
+
+        for deadline in self.deadlines:
+            deadline.on_cancel(one_cancelled)
+
+    def remaining(self):
+        values = [deadline.remaining() for deadline in self.deadlines]
+        return None if None in values else max(values)
+
+    def exceeded(self):
+        reasons = [deadline.exceeded() for deadline in self.deadlines]
+        if None in reasons:
+            return None
+        return CANCELLED if all(reason == CANCELLED for reason in reasons) else DEADLINE
+
+    def check(self, stage):
+        reason = self.exceeded()
+        if reason:
+            raise DeadlineExceeded(stage, reason)
@@ -0,0 +1,73 @@
+"""
+Per-job stage timings.
+
+Every stage of a job (validation, upload, queueing, execution, output
+fetching / encoding / upload, ...) is timed with time.monotonic(). Stages
+that run once per image on the output pool are aggregated: their count, total
+and slowest run are kept. The report goes into one structured log record per
+job and, on request, into the job result.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+class JobTimings:
+    """Collects the stage timings of one job (thread-safe)."""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+        # Stage -> [count, total seconds, max seconds], in order of first use
+        self._stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        """Time the body of a ``with`` block as one run of a stage."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(name, time.monotonic() - start)
+
+    def add(self, name, seconds):
+        """Record one run of a stage that took ``seconds``."""
+        with self._lock:
+            entry = self._stages.setdefault(name, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    def merge(self, other):
+        """Add the stages of another JobTimings (e.g. of a shared batch prompt)."""
+        with other._lock:
+            stages = [(name, list(entry)) for name, entry in other._stages.items()]
+        with self._lock:
+            for name, (count, total, max_s) in stages:
+                entry = self._stages.setdefault(name, [0, 0.0, 0.0])
+                entry[0] += count
+                entry[1] += total
+                entry[2] = max(entry[2], max_s)
+
+    def report(self):
+        """
+        Return the timings.
+
+        Returns:
+            dict: "total_ms" since the job started and "stages": stage ->
+                  {"ms": total, "count": runs, "max_ms": slowest run}.
+        """
+        with self._lock:
+            stages = {
+                name: {
+                    "ms": round(total * 1000, 1),
+                    "count": count,
+                    "max_ms": round(max_s * 1000, 1),
+                }
+                for name, (count, total, max_s) in self._stages.items()
+            }
+        return {
+            "total_ms": round((time.monotonic() - self.started_at) * 1000, 1),
+            "stages": stages,
+        }
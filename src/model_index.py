@@ -0,0 +1,257 @@
+"""
+Inventory of the model files ComfyUI can see through extra_model_paths.yaml.
+
+Every folder mapped in extra_model_paths.yaml (checkpoints, loras,
+diffusion_models, text_encoders, ...) is indexed with ``os.scandir``: name,
+size, mtime and model type of every file. The index is kept on disk and
+updated incrementally: a directory whose mtime has not changed is not listed
+again, so refreshing the index of a volume with thousands of models costs one
+``stat`` per directory.
+
+Files that are replaced in place (same name, directory untouched) keep their
+old size / mtime until their directory changes.
+"""
+
+import json
+import os
+import threading
+import time
+
+import yaml
+
+# extra_model_paths.yaml ComfyUI is started with
+EXTRA_MODEL_PATHS_FILE = os.environ.get(
+    "EXTRA_MODEL_PATHS_FILE", "/comfyui/extra_model_paths.yaml"
+)
+# Where the index is persisted (worker-local by default; point it at the network
+# volume so new workers start from the index of previous ones). Empty disables persistence.
+MODEL_INDEX_PATH = os.environ.get("MODEL_INDEX_PATH", "/tmp/worker-comfyui/model_index.json")
+
+# Bump when the on-disk format changes
+INDEX_VERSION = 1
+# extra_model_paths.yaml keys that are settings, not model folders
+_CONFIG_KEYS = {"base_path", "is_default"}
+
+
+def load_model_folders(config_path=EXTRA_MODEL_PATHS_FILE):
+    """
+    Read the model folders from extra_model_paths.yaml.
+
+    Args:
+        config_path (str): Path to extra_model_paths.yaml.
+
+    Returns:
+        dict: Model type -> list of absolute folder paths (empty if the file is missing).
+    """
+    if not os.path.isfile(config_path):
+        return {}
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f) or {}
+
+    folders = {}
+    for section in config.values():
+        if not isinstance(section, dict):
+            continue
+        base_path = os.path.expanduser(str(section.get("base_path", "")))
+        for model_type, paths in section.items():
+            if model_type in _CONFIG_KEYS or paths is None:
+                continue
+            # Several folders may be given as a multi-line string
+            for path in str(paths).splitlines():
+                path = path.strip()
+                if not path:
+                    continue
+                path = os.path.normpath(os.path.join(base_path, path))
+                folders.setdefault(model_type, [])
+                if path not in folders[model_type]:
+                    folders[model_type].append(path)
+    return folders
+
+
+class ModelIndex:
+    """
+    Incrementally updated index of the files in every model folder.
+
+    Args:
+        folders (dict): Model type -> list of folders, see load_model_folders().
+        index_path (str): File the index is loaded from and saved to ("" to keep
+            it in memory only).
+    """
+
+    def __init__(self, folders, index_path=MODEL_INDEX_PATH):
+        self.folders = folders
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        # Absolute directory -> {"mtime_ns", "files": {name: [size, mtime_ns]}, "subdirs": [name]}
+        self._dirs = self._load()
+        self._by_type = {}
+        self.last_refresh = None
+
+    def _load(self):
+        if not self.index_path or not os.path.isfile(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"worker-comfyui - Ignoring unreadable model index {self.index_path}: {e}")
+            return {}
+        if data.get("version") != INDEX_VERSION:
+            return {}
+        return data.get("dirs", {})
+
+    def _save(self):
+        if not self.index_path:
+            return
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            with open(tmp_path, "w") as f:
+                json.dump({"version": INDEX_VERSION, "dirs": self._dirs}, f)
+            # Atomic, so workers sharing the volume never read a partial index
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"worker-comfyui - Could not save model index to {self.index_path}: {e}")
+
+    def _scan_dir(self, path, seen, stats):
+        """Update the entry of one directory (and its subdirectories) if it changed."""
+        if path in seen:
+            return
+        seen.add(path)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            if self._dirs.pop(path, None) is not None:
+                stats["changed"] = True
+            return
+
+        cached = self._dirs.get(path)
+        if cached is not None and cached["mtime_ns"] == mtime_ns:
+            stats["dirs_reused"] += 1
+        else:
+            files = {}
+            subdirs = []
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if entry.name.startswith("."):
+                            continue
+                        try:
+                            if entry.is_dir():
+                                subdirs.append(entry.name)
+                            elif entry.is_file():
+                                stat = entry.stat()
+                                files[entry.name] = [stat.st_size, stat.st_mtime_ns]
+                        except OSError:
+                            continue
+            except OSError as e:
+                print(f"worker-comfyui - Could not index {path}: {e}")
+            cached = {"mtime_ns": mtime_ns, "files": files, "subdirs": sorted(subdirs)}
+            self._dirs[path] = cached
+            stats["dirs_scanned"] += 1
+            stats["changed"] = True
+
+        for name in cached["subdirs"]:
+            self._scan_dir(os.path.join(path, name), seen, stats)
+
+    def _collect(self, root):
+        """Yield (relative name, size, mtime_ns) for every file below root."""
+        pending = [(root, "")]
+        while pending:
+            path, prefix = pending.pop()
+            entry = self._dirs.get(path)
+            if entry is None:
+                continue
+            for name, (size, mtime_ns) in entry["files"].items():
+                yield prefix + name, size, mtime_ns
+            for name in entry["subdirs"]:
+                pending.append((os.path.join(path, name), f"{prefix}{name}/"))
+
+    def refresh(self):
+        """
+        Bring the index up to date with the model folders.
+
+        Returns:
+            dict: "dirs_scanned" (listed again), "dirs_reused" (unchanged),
+                  "files" and "elapsed_ms".
+        """
+        start = time.monotonic()
+        stats = {"dirs_scanned": 0, "dirs_reused": 0, "changed": False}
+        with self._lock:
+            seen = set()
+            for paths in self.folders.values():
+                for path in paths:
+                    self._scan_dir(path, seen, stats)
+            # Forget directories that are gone or no longer configured
+            for path in set(self._dirs) - seen:
+                del self._dirs[path]
+                stats["changed"] = True
+
+            if stats["changed"] or not self._by_type:
+                self._by_type = self._build_by_type()
+            if stats.pop("changed"):
+                self._save()
+            files = sum(len(models) for models in self._by_type.values())
+
+        stats["files"] = files
+        stats["elapsed_ms"] = round((time.monotonic() - start) * 1000, 1)
+        self.last_refresh = time.time()
+        return stats
+
+    def _build_by_type(self):
+        """Group the indexed files by model type (lock held)."""
+        by_type = {}
+        for model_type, paths in self.folders.items():
+            models = {}
+            for path in paths:
+                for name, size, mtime_ns in self._collect(path):
+                    # The first folder wins, like ComfyUI's folder_paths
+                    models.setdefault(
+                        name,
+                        {
+                            "name": name,
+                            "size": size,
+                            "mtime": mtime_ns / 1e9,
+                            "type": model_type,
+                            "path": os.path.join(path, name),
+                        },
+                    )
+            by_type[model_type] = models
+        return by_type
+
+    def types(self):
+        """Return the model types in the index."""
+        return list(self._by_type)
+
+    def models(self, model_type):
+        """
+        Return the indexed models of a type.
+
+        Returns:
+            list: Entries {"name", "size", "mtime", "type", "path"}, sorted by
+                  name. "name" is relative to the model folder, as ComfyUI shows it.
+        """
+        return sorted(self._by_type.get(model_type, {}).values(), key=lambda m: m["name"])
+
+    def names(self, model_type):
+        """Return the names of the indexed models of a type."""
+        return sorted(self._by_type.get(model_type, {}))
+
+    def lookup(self, name, model_type=None):
+        """
+        Find a model by the name a workflow uses for it.
+
+        Args:
+            name (str): Model name relative to its folder ("/" or "\\" separated).
+            model_type (str, optional): Only look in this model type.
+
+        Returns:
+            dict: The index entry, or None if no such model is indexed.
+        """
+        name = name.replace("\\", "/")
+        types = [model_type] if model_type else list(self._by_type)
+        for candidate in types:
+            entry = self._by_type.get(candidate, {}).get(name)
+            if entry is not None:
+                return entry
+        return None
@@ -3,9 +3,17 @@ Network Volume diagnostics for worker-comfyui.
 
 This module provides tools to debug network volume model path issues.
 Enable diagnostics by setting NETWORK_VOLUME_DEBUG=true environment variable.
+
+Diagnostics walk the filesystem (slow on a network mount), so they run once
+when the worker starts and the structured report is cached. A job with
+"refresh_diagnostics": true or a SIGUSR1 to the worker collects it again.
 """
 
 import os
+import threading
+import time
+
+from model_index import EXTRA_MODEL_PATHS_FILE, ModelIndex, load_model_folders
 
 # Expected model types and their file extensions
 MODEL_TYPES = {
@@ -14,66 +22,180 @@ MODEL_TYPES = {
     "clip_vision": [".safetensors", ".pt", ".bin"],
     "configs": [".yaml", ".json"],
     "controlnet": [".safetensors", ".pt", ".pth", ".bin"],
+    "diffusion_models": [".safetensors", ".ckpt", ".pt", ".pth", ".bin", ".gguf"],
     "embeddings": [".safetensors", ".pt", ".bin"],
     "loras": [".safetensors", ".pt"],
+    "text_encoders": [".safetensors", ".pt", ".bin", ".gguf"],
     "upscale_models": [".safetensors", ".pt", ".pth"],
     "vae": [".safetensors", ".pt", ".bin"],
-    "unet": [".safetensors", ".pt", ".bin"],
+    "unet": [".safetensors", ".pt", ".bin", ".gguf"],
 }
+# Extensions for folders that are not in MODEL_TYPES (ComfyUI's supported_pt_extensions)
+DEFAULT_MODEL_EXTENSIONS = [".ckpt", ".pt", ".pt2", ".bin", ".pth", ".safetensors", ".pkl", ".sft"]
+
+# Where RunPod mounts the network volume on serverless workers
+RUNPOD_VOLUME = "/runpod-volume"
+# How deep the root directory listing goes
+ROOT_LISTING_DEPTH = 2
+
+# Last diagnostics report (see get_network_volume_diagnostics)
+_report = None
+_report_lock = threading.Lock()
 
 
 def is_network_volume_debug_enabled():
     """Check if network volume debug mode is enabled via environment variable."""
-    return os.environ.get("NETWORK_VOLUME_DEBUG", "true").lower() == "true"
+    return os.environ.get("NETWORK_VOLUME_DEBUG", "false").lower() == "true"
 
 
-def run_network_volume_diagnostics():
+def collect_network_volume_diagnostics(model_index=None):
     """
-    Run comprehensive network volume diagnostics and print helpful output.
-    Only runs when NETWORK_VOLUME_DEBUG=true environment variable is set.
+    Inspect the network volume and model paths without printing anything.
+
+    Args:
+        model_index (ModelIndex, optional): Index of the model folders to use
+            (refreshed here). Without one, the folders are scanned from scratch.
+
+    Returns:
+        dict: Structured report with the keys "checked_at", "root_dirs",
+              "extra_model_paths", "volume", "models_dir", "models",
+              "found_any_models" and "env". "models" maps every model type
+              in extra_model_paths.yaml (MODEL_TYPES if there is none) to
+              {"status": "ok" | "missing", "files": [{"name", "size", "valid"}]}.
     """
-    print("=" * 70)
-    print("NETWORK VOLUME DIAGNOSTICS (NETWORK_VOLUME_DEBUG=true)")
-    print("=" * 70)
+    report = {
+        "checked_at": time.time(),
+        "root_dirs": [],
+        "root_error": None,
+        "extra_model_paths": {"path": EXTRA_MODEL_PATHS_FILE, "found": False, "content": None},
+        "volume": {"path": RUNPOD_VOLUME, "mounted": False, "workspace_exists": False},
+        "models_dir": {"path": os.path.join(RUNPOD_VOLUME, "models"), "found": False},
+        "models": {},
+        "found_any_models": False,
+        "env": {},
+    }
 
-    # Root directory contents – all folders up to 3 layers deep (for debugging)
-    print("\n[0] Root directory (/) contents (folders, up to 3 layers deep):")
     try:
-        max_depth = 2
         for dirpath, dirnames, _ in os.walk("/", topdown=True):
             depth = len([p for p in dirpath.split(os.sep) if p])
-            if depth > max_depth:
+            if depth > ROOT_LISTING_DEPTH:
                 continue
-            print(f"      - {dirpath or '/'}")
-            if depth >= max_depth:
+            report["root_dirs"].append(dirpath or "/")
+            if depth >= ROOT_LISTING_DEPTH:
                 dirnames.clear()  # do not descend further
     except Exception as e:
-        print(f"      Could not walk /: {e}")
+        report["root_error"] = str(e)
+
+    if os.path.isfile(EXTRA_MODEL_PATHS_FILE):
+        report["extra_model_paths"]["found"] = True
+        with open(EXTRA_MODEL_PATHS_FILE, "r") as f:
+            report["extra_model_paths"]["content"] = f.read()
+
+    if not os.path.isdir(RUNPOD_VOLUME):
+        report["volume"]["workspace_exists"] = os.path.isdir("/workspace")
+        # RunPod-related env vars (may reveal alternate mount path)
+        report["env"] = {
+            k: v
+            for k, v in os.environ.items()
+            if "RUNPOD" in k or "VOLUME" in k or "MOUNT" in k
+        }
+        report["cwd"] = os.getcwd()
+        return report
+    report["volume"]["mounted"] = True
+
+    models_dir = report["models_dir"]["path"]
+    if not os.path.isdir(models_dir):
+        return report
+    report["models_dir"]["found"] = True
+
+    if model_index is None:
+        folders = load_model_folders() or {
+            model_type: [os.path.join(models_dir, model_type)] for model_type in MODEL_TYPES
+        }
+        model_index = ModelIndex(folders, index_path="")
+    model_index.refresh()
+
+    for model_type, folders in model_index.folders.items():
+        extensions = MODEL_TYPES.get(model_type, DEFAULT_MODEL_EXTENSIONS)
+        entry = {
+            "status": "ok" if any(os.path.isdir(f) for f in folders) else "missing",
+            "files": [],
+        }
+        report["models"][model_type] = entry
+        for model in model_index.models(model_type):
+            # Check if file has valid extension
+            valid = os.path.splitext(model["name"])[1].lower() in extensions
+            entry["files"].append({"name": model["name"], "size": model["size"], "valid": valid})
+            report["found_any_models"] |= valid
+
+    return report
+
+
+def get_network_volume_diagnostics(refresh=False, model_index=None):
+    """
+    Return the cached diagnostics report, collecting (and printing) it first if
+    there is none yet or a refresh is requested.
+
+    Args:
+        refresh (bool): Inspect the volume again even if a report is cached.
+        model_index (ModelIndex, optional): See collect_network_volume_diagnostics().
+
+    Returns:
+        dict: See collect_network_volume_diagnostics().
+    """
+    global _report
+    with _report_lock:
+        if _report is None or refresh:
+            _report = collect_network_volume_diagnostics(model_index)
+            print_network_volume_diagnostics(_report)
+        return _report
+
+
+def run_network_volume_diagnostics(model_index=None):
+    """
+    Run comprehensive network volume diagnostics and print helpful output.
+
+    Returns:
+        dict: The (fresh) diagnostics report.
+    """
+    return get_network_volume_diagnostics(refresh=True, model_index=model_index)
+
+
+def print_network_volume_diagnostics(report):
+    """Print a diagnostics report in a human-readable form."""
+    print("=" * 70)
+    print("NETWORK VOLUME DIAGNOSTICS (NETWORK_VOLUME_DEBUG=true)")
+    print("=" * 70)
+
+    # Root directory contents – all folders up to 3 layers deep (for debugging)
+    print("\n[0] Root directory (/) contents (folders, up to 3 layers deep):")
+    for dirpath in report["root_dirs"]:
+        print(f"      - {dirpath}")
+    if report["root_error"]:
+        print(f"      Could not walk /: {report['root_error']}")
 
     # Check extra_model_paths.yaml
-    extra_model_paths_file = "/comfyui/extra_model_paths.yaml"
+    extra_model_paths = report["extra_model_paths"]
     print("\n[1] Checking extra_model_paths.yaml configuration...")
-    if os.path.isfile(extra_model_paths_file):
-        print(f"    ✓ FOUND: {extra_model_paths_file}")
-        with open(extra_model_paths_file, "r") as f:
-            content = f.read()
-            print("\n    Configuration content:")
-            for line in content.split("\n"):
-                print(f"      {line}")
+    if extra_model_paths["found"]:
+        print(f"    ✓ FOUND: {extra_model_paths['path']}")
+        print("\n    Configuration content:")
+        for line in extra_model_paths["content"].split("\n"):
+            print(f"      {line}")
     else:
-        print(f"    ✗ NOT FOUND: {extra_model_paths_file}")
+        print(f"    ✗ NOT FOUND: {extra_model_paths['path']}")
         print(
             "    This file is required for ComfyUI to find models on the network volume."
         )
 
     # Check network volume mount
-    runpod_volume = "/runpod-volume"
+    runpod_volume = report["volume"]["path"]
     print(f"\n[2] Checking network volume mount at {runpod_volume}...")
-    if os.path.isdir(runpod_volume):
+    if report["volume"]["mounted"]:
         print(f"    ✓ MOUNTED: {runpod_volume}")
     else:
         print(f"    ✗ NOT MOUNTED: {runpod_volume}")
-        if os.path.isdir("/workspace"):
+        if report["volume"]["workspace_exists"]:
             print("    ℹ️  /workspace exists (Pods use this; serverless uses /runpod-volume).")
         print(
             "    If the volume is attached: save the endpoint and ensure a NEW worker runs"
@@ -82,14 +204,12 @@ def run_network_volume_diagnostics():
             "    (existing workers do not get the volume). Scale to zero, run a job, or wait"
         )
         print("    for cold start. See docs.runpod.io/serverless/storage/network-volumes")
-        # RunPod-related env vars (may reveal alternate mount path)
-        runpod_vars = [k for k in os.environ if "RUNPOD" in k or "VOLUME" in k or "MOUNT" in k]
-        if runpod_vars:
+        if report["env"]:
             print("    RunPod/volume-related env:")
-            for var in sorted(runpod_vars):
-                print(f"      - {var}={os.environ[var]}")
+            for var in sorted(report["env"]):
+                print(f"      - {var}={report['env'][var]}")
         print("    Additional Debug Info:")
-        print("      - Current working directory:", os.getcwd())
+        print("      - Current working directory:", report.get("cwd"))
         for var in ["RUNPOD_MOUNT_PATH", "WORKSPACE_DIR", "HOME"]:
             value = os.environ.get(var)
             if value:
@@ -101,8 +221,8 @@ def run_network_volume_diagnostics():
 
     # Check directory structure
     print("\n[3] Checking directory structure...")
-    models_dir = os.path.join(runpod_volume, "models")
-    if os.path.isdir(models_dir):
+    models_dir = report["models_dir"]["path"]
+    if report["models_dir"]["found"]:
         print(f"    ✓ FOUND: {models_dir}")
     else:
         print(f"    ✗ NOT FOUND: {models_dir}")
@@ -114,41 +234,23 @@ def run_network_volume_diagnostics():
 
     # List model directories and their contents
     print("\n[4] Scanning model directories...")
-    found_any_models = False
-
-    for model_type, extensions in MODEL_TYPES.items():
-        model_path = os.path.join(models_dir, model_type)
-        if os.path.isdir(model_path):
-            files = []
-            try:
-                for f in os.listdir(model_path):
-                    file_path = os.path.join(model_path, f)
-                    if os.path.isfile(file_path):
-                        # Check if file has valid extension
-                        ext = os.path.splitext(f)[1].lower()
-                        if ext in extensions:
-                            size = os.path.getsize(file_path)
-                            size_str = format_size(size)
-                            files.append(f"{f} ({size_str})")
-                            found_any_models = True
-                        else:
-                            files.append(f"{f} (⚠️ ignored - invalid extension)")
-            except Exception as e:
-                print(f"    {model_type}/: Error reading directory - {e}")
-                continue
-
-            if files:
-                print(f"\n    {model_type}/:")
-                for f in files:
-                    print(f"      - {f}")
-            else:
-                print(f"\n    {model_type}/: (empty)")
-        else:
+    for model_type, entry in report["models"].items():
+        if entry["status"] == "missing":
             print(f"\n    {model_type}/: (directory not found)")
+            continue
+        if not entry["files"]:
+            print(f"\n    {model_type}/: (empty)")
+            continue
+        print(f"\n    {model_type}/:")
+        for f in entry["files"]:
+            if f["valid"]:
+                print(f"      - {f['name']} ({format_size(f['size'])})")
+            else:
+                print(f"      - {f['name']} (⚠️ ignored - invalid extension)")
 
     # Summary
     print("\n[5] Summary")
-    if found_any_models:
+    if report["found_any_models"]:
         print("    ✓ Models found on network volume!")
         print("    ComfyUI should be able to load these models.")
     else:
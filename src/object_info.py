@@ -0,0 +1,273 @@
+"""
+Cached ComfyUI node schema (/object_info) and local workflow validation.
+
+/object_info describes every node class: its inputs (type, option lists,
+min / max) and its output types. The document is large, so it is fetched once
+and kept until it is invalidated. Workflows are checked against it before they
+are queued, so a wrong model name or value is rejected without a round trip
+to ComfyUI.
+
+Validation follows ComfyUI's own rules where they matter for rejecting a
+prompt: unknown node classes fail anywhere in the workflow, everything else
+is only checked for nodes that feed an output node. When in doubt a value is
+accepted and ComfyUI gets the final word.
+
+Custom nodes may define VALIDATE_INPUTS, in which case ComfyUI skips its
+option list and min / max checks for their inputs. /object_info does not say
+which nodes do, so for custom nodes those checks only produce warnings.
+"""
+
+import threading
+import time
+
+# Longest option list quoted in an error message
+MAX_LISTED_OPTIONS = 20
+
+
+class ObjectInfoCache:
+    """
+    Holds the last /object_info document.
+
+    Args:
+        fetch (callable): Returns the /object_info document (dict). May raise.
+        ttl_s (float): Refetch after this many seconds (0 keeps it until invalidated).
+    """
+
+    def __init__(self, fetch, ttl_s=0):
+        self._fetch = fetch
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._object_info = None
+        self.fetched_at = None
+        self.fetches = 0
+
+    def get(self):
+        """
+        Return the cached document, fetching it if there is none or it expired.
+
+        Returns:
+            dict: The /object_info document, or None if it could not be fetched.
+        """
+        with self._lock:
+            expired = (
+                self.ttl_s
+                and self.fetched_at is not None
+                and time.monotonic() - self.fetched_at > self.ttl_s
+            )
+            if self._object_info is None or expired:
+                try:
+                    object_info = self._fetch()
+                except Exception as e:
+                    print(f"worker-comfyui - Warning: Could not fetch /object_info: {e}")
+                    return self._object_info
+                # An empty schema means ComfyUI is not done loading nodes
+                if object_info:
+                    self._object_info = object_info
+                    self.fetched_at = time.monotonic()
+                    self.fetches += 1
+            return self._object_info
+
+    def invalidate(self):
+        """Drop the cached document (the next get() fetches it again)."""
+        with self._lock:
+            self._object_info = None
+            self.fetched_at = None
+
+    @property
+    def age_s(self):
+        """Seconds since the document was fetched (None if there is none)."""
+        if self.fetched_at is None:
+            return None
+        return time.monotonic() - self.fetched_at
+
+
+def input_options(spec):
+    """
+    Return the allowed values of a combo input, or None for other inputs.
+
+    Handles the old (``[[options...], {...}]``) and the new
+    (``["COMBO", {"options": [...]}]``) spelling.
+    """
+    if not spec:
+        return None
+    if isinstance(spec[0], list):
+        return spec[0]
+    if spec[0] == "COMBO" and len(spec) > 1 and isinstance(spec[1], dict):
+        return spec[1].get("options")
+    return None
+
+
+def _input_config(spec):
+    return spec[1] if len(spec) > 1 and isinstance(spec[1], dict) else {}
+
+
+def is_link(value):
+    """True if a workflow input value is a link to another node's output ([node_id, index])."""
+    return (
+        isinstance(value, list)
+        and len(value) == 2
+        and isinstance(value[0], str)
+        and isinstance(value[1], int)
+    )
+
+
+def _types_match(received, expected):
+    """ComfyUI-style type check: "*" matches anything, "A,B" is a union."""
+    if not isinstance(received, str) or not isinstance(expected, str):
+        return True
+    if "*" in (received, expected):
+        return True
+    return bool(set(received.split(",")) & set(expected.split(",")))
+
+
+def _format_options(options):
+    shown = ", ".join(repr(o) for o in options[:MAX_LISTED_OPTIONS])
+    if len(options) > MAX_LISTED_OPTIONS:
+        shown += f", ... ({len(options) - MAX_LISTED_OPTIONS} more)"
+    return f"[{shown}]"
+
+
+def _is_custom_node(node_info):
+    """True for nodes loaded from custom_nodes (they may define VALIDATE_INPUTS)."""
+    return str(node_info.get("python_module", "")).startswith("custom_nodes")
+
+
+def _validate_value(name, value, spec):
+    """Check a literal input value; return an error message or None."""
+    if not spec:
+        return None
+    options = input_options(spec)
+    config = _input_config(spec)
+    if options is not None:
+        # Upload widgets list ComfyUI's input directory, which changes per job
+        if any(config.get(f"{kind}_upload") for kind in ("image", "video", "audio")):
+            return None
+        if value not in options:
+            return f"Value not in list: {name}: '{value}' not in {_format_options(options)}"
+        return None
+
+    input_type = spec[0]
+    if input_type not in ("INT", "FLOAT"):
+        return None
+    try:
+        number = int(value) if input_type == "INT" else float(value)
+    except (TypeError, ValueError):
+        return f"Failed to convert an input value to a {input_type} value: {name}, {value!r}"
+    if "min" in config and number < config["min"]:
+        return f"Value {number} smaller than min of {config['min']}: {name}"
+    if "max" in config and number > config["max"]:
+        return f"Value {number} bigger than max of {config['max']}: {name}"
+    return None
+
+
+def validate_workflow(workflow, object_info, nodes=None, warnings=None):
+    """
+    Check a workflow against the node schema.
+
+    Args:
+        workflow (dict): API-format workflow.
+        object_info (dict): /object_info document.
+        nodes (set, optional): Only check the inputs of these nodes (e.g. the
+            nodes a template parameter wrote to). Node classes are always checked.
+        warnings (list, optional): Receives the value checks that failed on
+            custom nodes (same dicts as the errors); they do not fail the workflow.
+
+    Returns:
+        list: Error dicts {"node", "class_type", "input", "value", "message",
+              "options"} ("options" is True for values missing from an option list).
+              Empty if the workflow is valid as far as the schema can tell.
+    """
+    errors = []
+
+    def error(node_id, class_type, name, message, value=None, options=False, warning=False):
+        entry = {
+            "node": node_id,
+            "class_type": class_type,
+            "input": name,
+            "value": value,
+            "message": message,
+            "options": options,
+        }
+        if not warning:
+            errors.append(entry)
+        elif warnings is not None:
+            warnings.append(entry)
+
+    outputs = []
+    for node_id, node in workflow.items():
+        class_type = node.get("class_type") if isinstance(node, dict) else None
+        if class_type is None:
+            error(node_id, None, None, "Node has no class_type")
+        elif class_type not in object_info:
+            error(node_id, class_type, None, f"Node type '{class_type}' not found")
+        elif object_info[class_type].get("output_node"):
+            outputs.append(node_id)
+    if errors:
+        return errors
+    if not outputs:
+        error(None, None, None, "Workflow has no output nodes")
+        return errors
+
+    # Only nodes that feed an output are executed (and validated) by ComfyUI
+    pending = list(outputs)
+    visited = set()
+    while pending:
+        node_id = pending.pop()
+        if node_id in visited:
+            continue
+        visited.add(node_id)
+        node = workflow[node_id]
+        class_type = node["class_type"]
+        schema = object_info[class_type].get("input", {})
+        custom_node = _is_custom_node(object_info[class_type])
+        inputs = node.get("inputs", {})
+        if nodes is not None and node_id not in nodes:
+            pending.extend(v[0] for v in inputs.values() if is_link(v) and v[0] in workflow)
+            continue
+
+        for section in ("required", "optional"):
+            for name, spec in schema.get(section, {}).items():
+                if name not in inputs:
+                    if section == "required":
+                        error(node_id, class_type, name, f"Required input is missing: {name}")
+                    continue
+                value = inputs[name]
+                if is_link(value):
+                    source_id, index = value
+                    source = workflow.get(source_id)
+                    if source is None:
+                        message = f"Input {name} links to missing node {source_id}"
+                        error(node_id, class_type, name, message)
+                        continue
+                    pending.append(source_id)
+                    source_outputs = object_info[source["class_type"]].get("output", [])
+                    expected = spec[0] if spec else "*"
+                    if index >= len(source_outputs):
+                        message = f"Input {name} links to missing output {index} of node {source_id}"
+                        error(node_id, class_type, name, message)
+                    elif not _types_match(source_outputs[index], expected):
+                        message = (
+                            f"Return type mismatch between linked nodes: {name}, "
+                            f"received_type({source_outputs[index]}) mismatch input_type({expected})"
+                        )
+                        error(node_id, class_type, name, message)
+                    continue
+                message = _validate_value(name, value, spec)
+                if message:
+                    is_option = input_options(spec) is not None
+                    error(node_id, class_type, name, message, value, is_option, custom_node)
+
+    return errors
+
+
+def format_errors(errors):
+    """Render validation errors as the bullet list used in job error messages."""
+    lines = []
+    for e in errors:
+        if e["node"] is None:
+            lines.append(f"• {e['message']}")
+        elif e["class_type"]:
+            lines.append(f"• Node {e['node']} ({e['class_type']}): {e['message']}")
+        else:
+            lines.append(f"• Node {e['node']}: {e['message']}")
+    return "\n".join(lines)
@@ -0,0 +1,140 @@
+"""
+Worker-side re-encoding of output images.
+
+ComfyUI saves lossless PNGs. Jobs can ask for another format and quality,
+a smaller size and / or stripped metadata; the image is then decoded and
+encoded again on the output thread pool before it is base64-encoded or
+uploaded. Jobs that ask for nothing get ComfyUI's bytes unchanged.
+"""
+
+import io
+import time
+
+from PIL import Image, PngImagePlugin, features
+
+# output_format -> (Pillow format, file extension)
+OUTPUT_FORMATS = {
+    "png": ("PNG", "png"),
+    "jpeg": ("JPEG", "jpg"),
+    "webp": ("WEBP", "webp"),
+    "avif": ("AVIF", "avif"),
+}
+# Quality used for lossy formats when the job does not send one
+DEFAULT_QUALITY = 90
+# Largest accepted max_size
+MAX_OUTPUT_SIZE = 8192
+
+
+class OutputOptions:
+    """
+    Encoding requested by a job.
+
+    Args:
+        output_format (str, optional): Key of OUTPUT_FORMATS (None keeps the format).
+        quality (int, optional): 1-100 for lossy formats.
+        max_size (int, optional): Longest side in pixels (images are only shrunk).
+        strip_metadata (bool): Drop PNG text chunks (e.g. the workflow) and EXIF.
+    """
+
+    def __init__(self, output_format=None, quality=None, max_size=None, strip_metadata=False):
+        self.output_format = output_format
+        self.quality = quality
+        self.max_size = max_size
+        self.strip_metadata = strip_metadata
+
+    @property
+    def transcode(self):
+        """True if the image has to be decoded and encoded again."""
+        return bool(self.output_format or self.quality or self.max_size or self.strip_metadata)
+
+
+def _is_int_between(value, low, high):
+    return isinstance(value, int) and not isinstance(value, bool) and low <= value <= high
+
+
+def parse_output_options(job_input):
+    """
+    Read the output encoding options of a job.
+
+    Args:
+        job_input (dict): The job's input.
+
+    Returns:
+        tuple: (OutputOptions, None) or (None, error message).
+    """
+    output_format = job_input.get("output_format")
+    if output_format is not None:
+        output_format = str(output_format).lower()
+        if output_format == "jpg":
+            output_format = "jpeg"
+        if output_format not in OUTPUT_FORMATS:
+            return None, f"'output_format' must be one of {', '.join(OUTPUT_FORMATS)}"
+        # WebP / AVIF depend on how Pillow was built
+        if output_format in ("webp", "avif") and not features.check(output_format):
+            return None, f"'output_format' {output_format} is not supported by this worker"
+
+    quality = job_input.get("quality")
+    if quality is not None and not _is_int_between(quality, 1, 100):
+        return None, "'quality' must be an integer from 1 to 100"
+
+    max_size = job_input.get("max_size")
+    if max_size is not None and not _is_int_between(max_size, 1, MAX_OUTPUT_SIZE):
+        return None, f"'max_size' must be an integer from 1 to {MAX_OUTPUT_SIZE}"
+
+    strip_metadata = job_input.get("strip_metadata", False)
+    if not isinstance(strip_metadata, bool):
+        return None, "'strip_metadata' must be a boolean"
+
+    return OutputOptions(output_format, quality, max_size, strip_metadata), None
+
+
+def transcode(image_bytes, options):
+    """
+    Encode an image as requested.
+
+    Args:
+        image_bytes (bytes-like): Encoded image as saved by ComfyUI.
+        options (OutputOptions): Requested encoding (options.transcode must be True).
+
+    Returns:
+        tuple: (encoded bytes, file extension, stats) where stats is
+               {"format", "bytes_in", "bytes_out", "encode_ms"}.
+    """
+    start = time.monotonic()
+    image = Image.open(io.BytesIO(image_bytes))
+    source_format = (image.format or "PNG").upper()
+    output_format = options.output_format or next(
+        (key for key, (fmt, _) in OUTPUT_FORMATS.items() if fmt == source_format), "png"
+    )
+    pil_format, extension = OUTPUT_FORMATS[output_format]
+
+    metadata = {} if options.strip_metadata else dict(image.info)
+    if options.max_size and max(image.size) > options.max_size:
+        image.thumbnail((options.max_size, options.max_size), Image.Resampling.LANCZOS)
+
+    save_args = {}
+    if pil_format == "PNG":
+        save_args["compress_level"] = 4
+        text = {k: v for k, v in metadata.items() if isinstance(v, str)}
+        if text:
+            pnginfo = PngImagePlugin.PngInfo()
+            for key, value in text.items():
+                pnginfo.add_text(key, value)
+            save_args["pnginfo"] = pnginfo
+    else:
+        save_args["quality"] = options.quality or DEFAULT_QUALITY
+        if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+    if "exif" in metadata:
+        save_args["exif"] = metadata["exif"]
+
+    buffer = io.BytesIO()
+    image.save(buffer, format=pil_format, **save_args)
+    encoded = buffer.getvalue()
+    stats = {
+        "format": output_format,
+        "bytes_in": len(image_bytes),
+        "bytes_out": len(encoded),
+        "encode_ms": round((time.monotonic() - start) * 1000, 1),
+    }
+    return encoded, extension, stats
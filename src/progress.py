@@ -0,0 +1,130 @@
+"""
+Progress updates streamed to the caller while a prompt runs.
+
+The websocket events of a prompt (current node, sampler steps, latent
+previews in binary frames) are turned into small progress dictionaries that
+a generator handler can yield. Updates are throttled: at most one per
+interval is sent and intermediate states are dropped, so a 30-step sampler
+with previews cannot flood the transport.
+"""
+
+import base64
+import io
+import time
+
+from comfy_ws import EVENT_BINARY, decode_image_frame
+
+# JPEG quality of downscaled previews
+PREVIEW_QUALITY = 70
+
+
+def decode_preview(payload, max_size):
+    """
+    Decode a ComfyUI preview frame and downscale it to a small JPEG.
+
+    Args:
+        payload (bytes): Binary websocket frame.
+        max_size (int): Longest side of the returned preview in pixels.
+
+    Returns:
+        str: Base64-encoded JPEG, or None if the frame is not a preview image.
+    """
+    frame = decode_image_frame(payload)
+    if frame is None:
+        return None
+    image_bytes = frame[1]
+
+    from PIL import Image
+
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        image.thumbnail((max_size, max_size))
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, format="JPEG", quality=PREVIEW_QUALITY)
+    except (OSError, ValueError) as e:
+        print(f"worker-comfyui - Could not decode preview image: {e}")
+        return None
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+class ProgressReporter:
+    """
+    Turns the websocket events of one job's prompt into throttled progress updates.
+
+    Args:
+        workflow (dict): The job's API-format workflow (for node class names).
+        interval_s (float): Minimum time between two updates.
+        preview_max_size (int): Longest side of previews (0 = no previews).
+    """
+
+    def __init__(self, workflow, interval_s, preview_max_size=0):
+        self.workflow = workflow
+        self.interval_s = interval_s
+        self.preview_max_size = preview_max_size
+        self._sent_at = None
+        self._node = None
+        self._step = None
+        self._steps = None
+        self._preview = None
+        self.sent = 0
+        self.dropped = 0
+
+    def _node_id(self, node):
+        # Nodes of a batched prompt are prefixed with "<job index>:"
+        if node is not None and node not in self.workflow and ":" in node:
+            node = node.split(":", 1)[1]
+        return node
+
+    def update(self, message):
+        """
+        Feed one websocket event.
+
+        Args:
+            message (dict): Event as delivered by ComfyWebsocketManager.
+
+        Returns:
+            dict: Progress update to send, or None if nothing is due yet.
+        """
+        message_type = message.get("type")
+        data = message.get("data") or {}
+        if message_type == "executing" and data.get("node") is not None:
+            self._node = self._node_id(data["node"])
+            self._step = self._steps = None
+        elif message_type == "progress":
+            self._node = self._node_id(data.get("node")) or self._node
+            self._step = data.get("value")
+            self._steps = data.get("max")
+        elif message_type == EVENT_BINARY and self.preview_max_size:
+            if not self._due():
+                # Decoding is the expensive part: skip frames that would be dropped
+                self.dropped += 1
+                return None
+            self._preview = decode_preview(message["payload"], self.preview_max_size)
+        else:
+            return None
+
+        if not self._due():
+            self.dropped += 1
+            return None
+        return self._snapshot()
+
+    def _due(self):
+        return self._sent_at is None or time.monotonic() - self._sent_at >= self.interval_s
+
+    def _snapshot(self):
+        node = self.workflow.get(self._node, {})
+        update = {
+            "status": "running",
+            "node": self._node,
+            "class_type": node.get("class_type"),
+        }
+        if self._steps:
+            update["step"] = self._step
+            update["steps"] = self._steps
+            update["percent"] = round(100 * self._step / self._steps, 1)
+        if self._preview:
+            update["preview"] = self._preview
+            self._preview = None
+        self._sent_at = time.monotonic()
+        self.sent += 1
+        return update
@@ -0,0 +1,206 @@
+"""
+Gate that decides when a job may queue its prompt in ComfyUI.
+
+When the worker runs several jobs concurrently, every job would otherwise
+POST its prompt immediately and ComfyUI's queue would grow without bound.
+The gate keeps at most ``max_queued`` of this worker's prompts inside ComfyUI
+(running + pending) and also honours the ``queue_remaining`` value ComfyUI
+reports over the websocket. A job releases its slot as soon as ComfyUI has
+finished executing its prompt, so the next job is already queued while the
+previous one is still uploading / encoding its outputs.
+
+Waiting jobs are admitted in arrival order, except that a job whose model
+fingerprint (see model_fingerprint()) matches the models of the prompt queued
+last may go first: ComfyUI then runs it with the weights and LoRA patches
+that are already resident instead of swapping models twice. A job is passed
+over at most ``max_skips`` times, so no job starves.
+"""
+
+import hashlib
+import json
+import threading
+import time
+
+from object_info import is_link
+
+# How often waiting jobs re-check the gate when no status event arrives
+GATE_POLL_INTERVAL_S = 0.5
+
+
+def model_fingerprint(workflow):
+    """
+    Fingerprint the model-loading part of a workflow.
+
+    Loader nodes (every class with "Loader" in its name: checkpoints, UNETs,
+    CLIP, VAE, LoRAs with their strengths, ...) are hashed with their literal
+    inputs and the loaders they are chained to. Node ids, prompts, seeds and
+    sizes do not change the fingerprint.
+
+    Args:
+        workflow (dict): API-format workflow.
+
+    Returns:
+        str: Fingerprint, or None if the workflow has no loader nodes.
+    """
+    signatures = {}
+
+    def signature(node_id, trail=()):
+        if node_id in signatures:
+            return signatures[node_id]
+        node = workflow[node_id]
+        inputs = {}
+        for name, value in node.get("inputs", {}).items():
+            if is_link(value) and value[0] in workflow:
+                source = workflow[value[0]]
+                if "Loader" in str(source.get("class_type")) and value[0] not in trail:
+                    inputs[name] = [signature(value[0], trail + (node_id,)), value[1]]
+            else:
+                inputs[name] = value
+        signatures[node_id] = hashlib.sha256(
+            json.dumps([node.get("class_type"), inputs], sort_keys=True, default=str).encode()
+        ).hexdigest()
+        return signatures[node_id]
+
+    loaders = sorted(
+        signature(node_id)
+        for node_id, node in workflow.items()
+        if isinstance(node, dict) and "Loader" in str(node.get("class_type"))
+    )
+    if not loaders:
+        return None
+    return hashlib.sha256("".join(loaders).encode()).hexdigest()[:16]
+
+
+class _Waiter:
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.skipped = 0
+
+
+class ComfyQueueGate:
+    """
+    Args:
+        max_queued (int): Maximum number of prompts allowed in ComfyUI's queue.
+        queue_remaining (callable): Returns the latest ``queue_remaining`` value
+            reported by ComfyUI, or None if unknown.
+        max_skips (int): How often a waiting job may be passed over by jobs that
+            match the resident models (0 admits strictly in arrival order).
+    """
+
+    def __init__(self, max_queued, queue_remaining, max_skips=0):
+        self.max_queued = max(1, max_queued)
+        self._queue_remaining = queue_remaining
+        self.max_skips = max(0, max_skips)
+        self._cond = threading.Condition()
+        self._in_comfy = 0
+        self._waiting = []
+        # Fingerprint of the prompt queued last (its models are resident once it ran)
+        self.resident = None
+        self._admitted = 0
+        self._swaps = 0
+        self._swaps_avoided = 0
+
+    @property
+    def in_comfy(self):
+        return self._in_comfy
+
+    def _has_room(self):
+        if self._in_comfy >= self.max_queued:
+            return False
+        remaining = self._queue_remaining()
+        return remaining is None or remaining < self.max_queued
+
+    def _next(self):
+        """The waiter admitted next (lock held)."""
+        first = self._waiting[0]
+        if self.resident is None or first.skipped >= self.max_skips:
+            return first
+        for waiter in self._waiting:
+            if waiter.fingerprint == self.resident:
+                return waiter
+        return first
+
+    def _admit(self, waiter):
+        """Take a slot for a waiter and update the counters (lock held)."""
+        position = self._waiting.index(waiter)
+        first = self._waiting[0]
+        for passed in self._waiting[:position]:
+            passed.skipped += 1
+        if first.fingerprint not in (None, self.resident) and waiter.fingerprint == self.resident:
+            self._swaps_avoided += 1
+        if None not in (self.resident, waiter.fingerprint) and waiter.fingerprint != self.resident:
+            self._swaps += 1
+        self._waiting.remove(waiter)
+        if waiter.fingerprint is not None:
+            self.resident = waiter.fingerprint
+        self._admitted += 1
+        self._in_comfy += 1
+        return position
+
+    def acquire(self, timeout=None, fingerprint=None, abort=None):
+        """
+        Block until a prompt may be queued.
+
+        Args:
+            timeout (float, optional): Seconds to wait at most.
+            fingerprint (str, optional): model_fingerprint() of the prompt.
+            abort (callable, optional): Stop waiting once it returns True
+                (checked whenever the waiters are woken, see notify()).
+
+        Returns:
+            bool: True once a slot was taken, False if the timeout expired or
+                  the wait was aborted.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waiter = _Waiter(fingerprint)
+        with self._cond:
+            self._waiting.append(waiter)
+            try:
+                while not (self._has_room() and self._next() is waiter):
+                    if abort is not None and abort():
+                        return False
+                    wait_s = GATE_POLL_INTERVAL_S
+                    if deadline is not None:
+                        left = deadline - time.monotonic()
+                        if left <= 0:
+                            return False
+                        wait_s = min(wait_s, left)
+                    self._cond.wait(wait_s)
+                position = self._admit(waiter)
+            finally:
+                if waiter in self._waiting:
+                    self._waiting.remove(waiter)
+                # Another waiter may be next now (or there may be room for more)
+                self._cond.notify_all()
+        if position:
+            print(
+                f"worker-comfyui - Queued ahead of {position} waiting job(s): same models as the previous prompt"
+            )
+        return True
+
+    def release(self):
+        """Give the slot back once ComfyUI is done executing the prompt."""
+        with self._cond:
+            self._in_comfy = max(self._in_comfy - 1, 0)
+            self._cond.notify_all()
+
+    def notify(self):
+        """Wake waiting jobs, e.g. after ComfyUI reported a new queue size."""
+        with self._cond:
+            self._cond.notify_all()
+
+    def stats(self):
+        """
+        Return admission counters.
+
+        Returns:
+            dict: Prompts admitted, model swaps between consecutive prompts, swaps
+                  avoided by letting a matching job go first, and jobs waiting.
+        """
+        with self._cond:
+            return {
+                "admitted": self._admitted,
+                "swaps": self._swaps,
+                "swaps_avoided": self._swaps_avoided,
+                "waiting": len(self._waiting),
+            }
@@ -0,0 +1,157 @@
+"""
+Upload output images to S3-compatible storage without temporary files.
+
+Images are streamed either from memory or straight from ComfyUI's output file.
+Files above S3_MULTIPART_THRESHOLD_MB are sent as multipart uploads whose parts
+are transferred concurrently. Bucket, key layout and presigned URLs follow
+runpod's ``rp_upload.upload_image``, so the returned URLs look the same as
+before.
+"""
+
+import io
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from runpod.serverless.utils import rp_upload
+
+# Files larger than this are uploaded as multipart uploads
+S3_MULTIPART_THRESHOLD_MB = int(os.environ.get("S3_MULTIPART_THRESHOLD_MB", 8))
+# Size of each multipart part
+S3_MULTIPART_CHUNK_MB = int(os.environ.get("S3_MULTIPART_CHUNK_MB", 8))
+# Number of parts of one file uploaded at the same time
+S3_MULTIPART_CONCURRENCY = int(os.environ.get("S3_MULTIPART_CONCURRENCY", 4))
+# Lifetime of the returned presigned URLs (same as rp_upload: 7 days)
+PRESIGNED_URL_EXPIRY_S = 604800
+# Where images end up when no bucket credentials are configured (same as rp_upload)
+SIMULATED_UPLOAD_DIR = "simulated_uploaded"
+
+_client_lock = threading.Lock()
+_client = None
+_transfer_config = None
+
+
+def _get_client():
+    """Create the boto3 client once per worker; boto3 clients are thread-safe."""
+    global _client, _transfer_config
+    with _client_lock:
+        if _client is None:
+            client, _ = rp_upload.get_boto_client()
+            if client is None:
+                return None, None
+            from boto3.s3.transfer import TransferConfig
+
+            _transfer_config = TransferConfig(
+                multipart_threshold=S3_MULTIPART_THRESHOLD_MB * 1024 * 1024,
+                multipart_chunksize=S3_MULTIPART_CHUNK_MB * 1024 * 1024,
+                max_concurrency=S3_MULTIPART_CONCURRENCY,
+                use_threads=True,
+            )
+            _client = client
+        return _client, _transfer_config
+
+
+def reset_client():
+    """Forget the cached client (e.g. after the bucket environment variables changed)."""
+    global _client, _transfer_config
+    with _client_lock:
+        _client = None
+        _transfer_config = None
+
+
+class BufferReader(io.RawIOBase):
+    """
+    Seekable, read-only file object over a bytes-like object.
+
+    Unlike io.BytesIO it does not copy a memoryview up front; only the chunks
+    boto3 asks for are materialised.
+    """
+
+    def __init__(self, data):
+        self._view = memoryview(data).cast("B")
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, offset)
+        return self._pos
+
+    def readinto(self, buffer):
+        chunk = self._view[self._pos : self._pos + len(buffer)]
+        buffer[: len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+    def read(self, size=-1):
+        end = len(self._view) if size is None or size < 0 else self._pos + size
+        chunk = self._view[self._pos : end].tobytes()
+        self._pos += len(chunk)
+        return chunk
+
+
+def upload_image(job_id, filename, data=None, path=None):
+    """
+    Upload one image and return its presigned URL.
+
+    Args:
+        job_id (str): The RunPod job ID, used as key prefix.
+        filename (str): Original filename (only its extension is used).
+        data (bytes-like, optional): Image bytes to upload from memory (a
+            memoryview is uploaded without being copied first).
+        path (str, optional): File to stream from instead of ``data``.
+
+    Returns:
+        str: Presigned URL, or the local path under ``simulated_uploaded/``
+             when no bucket credentials are configured.
+    """
+    file_extension = os.path.splitext(filename)[1] or ".png"
+    object_name = f"{str(uuid.uuid4())[:8]}{file_extension}"
+
+    client, transfer_config = _get_client()
+    if client is None:
+        return _save_simulated_upload(object_name, data, path)
+
+    bucket = time.strftime("%m-%y")
+    key = f"{job_id}/{object_name}"
+    extra_args = {"ContentType": "image/" + file_extension.lstrip(".")}
+
+    if path is not None:
+        with open(path, "rb") as f:
+            client.upload_fileobj(
+                f, bucket, key, ExtraArgs=extra_args, Config=transfer_config
+            )
+    else:
+        client.upload_fileobj(
+            BufferReader(data), bucket, key, ExtraArgs=extra_args, Config=transfer_config
+        )
+
+    return client.generate_presigned_url(
+        "get_object",
+        Params={"Bucket": bucket, "Key": key},
+        ExpiresIn=PRESIGNED_URL_EXPIRY_S,
+    )
+
+
+def _save_simulated_upload(object_name, data, path):
+    os.makedirs(SIMULATED_UPLOAD_DIR, exist_ok=True)
+    target = os.path.join(SIMULATED_UPLOAD_DIR, object_name)
+    if path is not None:
+        shutil.copyfile(path, target)
+    else:
+        with open(target, "wb") as f:
+            f.write(data)
+    return target
@@ -76,12 +76,16 @@ echo "worker-comfyui: Starting ComfyUI"
 : "${COMFY_LOG_LEVEL:=DEBUG}"
 
 EXTRA_PATHS="--extra-model-paths-config /comfyui/extra_model_paths.yaml"
-COMFY_LOG="/var/log/comfyui.log"
+COMFY_LOG="${COMFY_LOG_PATH:-/var/log/comfyui.log}"
 
 COMFY_CMD="python -u /comfyui/main.py --disable-auto-launch --disable-metadata ${EXTRA_PATHS} --verbose ${COMFY_LOG_LEVEL} --log-stdout"
 if [ "$SERVE_API_LOCALLY" == "true" ]; then
     COMFY_CMD="${COMFY_CMD} --listen"
 fi
+# Latent previews for streamed progress (e.g. COMFY_PREVIEW_METHOD=latent2rgb)
+if [ -n "$COMFY_PREVIEW_METHOD" ]; then
+    COMFY_CMD="${COMFY_CMD} --preview-method ${COMFY_PREVIEW_METHOD}"
+fi
 
 # Automatic restart settings (override via environment variables)
 : "${COMFY_RESTART_DELAY:=5}"
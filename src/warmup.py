@@ -0,0 +1,106 @@
+"""
+Warm-up run of a workflow template before the worker accepts jobs.
+
+ComfyUI loads models lazily: the first prompt that uses the UNET, text
+encoder, VAE and LoRAs pays for reading them from disk and moving them to the
+GPU. A tiny version of a template (small latent, one step) is run once at
+worker start so that cost is paid by the worker, not by the first job.
+
+The start-up timeline is recorded per phase, measured from the start of the
+handler process (ComfyUI is launched just before it):
+  • server_up     – ComfyUI answers HTTP
+  • object_info   – the node schema is loaded (custom nodes imported)
+  • models_loaded – every node upstream of the sampler has executed
+  • first_sample  – the sampler reported its first step (weights are on the GPU)
+  • done          – the warm-up prompt finished
+"""
+
+import time
+
+# Output node classes that write files, and the class that only previews
+_SAVE_NODES = {"SaveImage"}
+_PREVIEW_NODE = "PreviewImage"
+
+
+def warmup_workflow(template, params):
+    """
+    Bind a template for the warm-up run.
+
+    SaveImage nodes are turned into PreviewImage nodes, so the warm-up image
+    goes to ComfyUI's temp directory instead of the output directory.
+
+    Args:
+        template (WorkflowTemplate): Template to warm up.
+        params (dict): Parameters of the tiny run (e.g. small width / height, 1 step).
+            Parameters the template does not have are ignored.
+
+    Returns:
+        dict: API-format workflow.
+    """
+    known = {name: value for name, value in params.items() if name in template.params}
+    workflow = template.bind(known)
+    for node in workflow.values():
+        if node.get("class_type") in _SAVE_NODES:
+            node["class_type"] = _PREVIEW_NODE
+            node["inputs"] = {"images": node["inputs"]["images"]}
+    return workflow
+
+
+class WarmupTimeline:
+    """
+    Start-up phases and the time at which each one was reached.
+
+    Args:
+        started_at (float): time.monotonic() value the phases are measured from.
+    """
+
+    def __init__(self, started_at):
+        self.started_at = started_at
+        self._last = started_at
+        self.phases = []
+        self._samplers = set()
+
+    def mark(self, phase):
+        """Record that a phase was reached (only the first time)."""
+        if self.reached(phase):
+            return
+        now = time.monotonic()
+        self.phases.append(
+            {
+                "phase": phase,
+                "at_ms": round((now - self.started_at) * 1000, 1),
+                "took_ms": round((now - self._last) * 1000, 1),
+            }
+        )
+        self._last = now
+        print(f"worker-comfyui - Warm-up: {phase} after {self.phases[-1]['at_ms']:.0f} ms")
+
+    def reached(self, phase):
+        return any(p["phase"] == phase for p in self.phases)
+
+    def watch(self, workflow):
+        """Remember which nodes of the warm-up workflow sample (have a "steps" input)."""
+        self._samplers = {
+            node_id for node_id, node in workflow.items() if "steps" in node.get("inputs", {})
+        }
+
+    def on_event(self, message):
+        """Websocket event of the warm-up prompt (see handler.run_prompt)."""
+        data = message.get("data", {})
+        if message.get("type") == "executing" and data.get("node") in self._samplers:
+            self.mark("models_loaded")
+        elif message.get("type") == "progress":
+            self.mark("models_loaded")
+            self.mark("first_sample")
+
+    def report(self):
+        """
+        Return the timeline.
+
+        Returns:
+            dict: "phases" (list of {"phase", "at_ms", "took_ms"}) and "total_ms".
+        """
+        return {
+            "phases": list(self.phases),
+            "total_ms": self.phases[-1]["at_ms"] if self.phases else 0,
+        }
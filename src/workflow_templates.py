@@ -0,0 +1,168 @@
+"""
+Named workflow templates stored in the worker.
+
+A template is an API-format workflow plus a description of its parameters.
+Jobs send ``{"template": "<name>", "params": {...}}`` instead of the whole
+graph; the worker binds the parameters into a copy of the template's graph.
+
+Template files (``<name>.json`` in COMFY_TEMPLATES_DIR) look like::
+
+    {
+      "description": "...",
+      "params": {
+        "seed":   {"type": "int", "default": "random",
+                   "targets": [{"node": "21", "input": "value"}]},
+        "prompt": {"type": "string",
+                   "targets": [{"node": "29", "input": "value",
+                                "format": "fixed preamble\\n\\n{value}"}]}
+      },
+      "workflow": { ...API-format graph... }
+    }
+
+Every target names a node input the parameter is written to; "format"
+wraps a string parameter in fixed text. A parameter that is not sent keeps
+its "default", or the value already in the graph if there is no default.
+"""
+
+import json
+import os
+import random
+
+# Parameter types and the Python types they accept
+PARAM_TYPES = {
+    "int": (int,),
+    "float": (int, float),
+    "string": (str,),
+    "bool": (bool,),
+}
+# Largest seed generated for "default": "random"
+MAX_RANDOM_SEED = 2**53 - 1
+
+
+class TemplateError(ValueError):
+    """Raised for invalid template files and for invalid job parameters."""
+
+
+class WorkflowTemplate:
+    """
+    A compiled workflow template.
+
+    Args:
+        name (str): Template name (the file name without ".json").
+        definition (dict): Parsed template file.
+
+    Raises:
+        TemplateError: If the template is malformed.
+    """
+
+    def __init__(self, name, definition):
+        self.name = name
+        self.description = definition.get("description", "")
+        self.workflow = definition.get("workflow")
+        if not isinstance(self.workflow, dict) or not self.workflow:
+            raise TemplateError(f"Template '{name}' has no workflow")
+        self.params = definition.get("params", {})
+        for param, spec in self.params.items():
+            if spec.get("type") not in PARAM_TYPES:
+                raise TemplateError(
+                    f"Template '{name}': parameter '{param}' has unknown type {spec.get('type')!r}"
+                )
+            if not spec.get("targets"):
+                raise TemplateError(f"Template '{name}': parameter '{param}' has no targets")
+            for target in spec["targets"]:
+                node = self.workflow.get(target.get("node"))
+                if node is None or target.get("input") not in node.get("inputs", {}):
+                    raise TemplateError(
+                        f"Template '{name}': parameter '{param}' targets missing input {target}"
+                    )
+        # Nodes written by parameters (the rest of the graph never changes)
+        self.param_nodes = {
+            target["node"] for spec in self.params.values() for target in spec["targets"]
+        }
+        # ObjectInfoCache.fetches count of the schema the fixed graph passed with
+        self.validated_with = None
+
+    def _check(self, param, value):
+        spec = self.params[param]
+        allowed = PARAM_TYPES[spec["type"]]
+        # bool is an int subclass, but true is not a valid seed
+        if not isinstance(value, allowed) or (isinstance(value, bool) and bool not in allowed):
+            raise TemplateError(f"Parameter '{param}' must be of type {spec['type']}")
+        if "choices" in spec and value not in spec["choices"]:
+            raise TemplateError(f"Parameter '{param}' must be one of {spec['choices']}")
+        if "min" in spec and value < spec["min"]:
+            raise TemplateError(f"Parameter '{param}' must be >= {spec['min']}")
+        if "max" in spec and value > spec["max"]:
+            raise TemplateError(f"Parameter '{param}' must be <= {spec['max']}")
+
+    def bind(self, params):
+        """
+        Build the workflow for one job.
+
+        Args:
+            params (dict): Parameter values sent with the job.
+
+        Returns:
+            dict: A new API-format workflow. Nodes are copied one level deep, so
+                  the job may change their inputs without touching the template.
+
+        Raises:
+            TemplateError: If a parameter is unknown or invalid.
+        """
+        params = params or {}
+        if not isinstance(params, dict):
+            raise TemplateError("'params' must be an object")
+        unknown = sorted(set(params) - set(self.params))
+        if unknown:
+            raise TemplateError(
+                f"Unknown parameter(s) for template '{self.name}': {', '.join(unknown)}. "
+                f"Available: {', '.join(sorted(self.params))}"
+            )
+
+        workflow = {
+            node_id: {**node, "inputs": dict(node.get("inputs", {}))}
+            for node_id, node in self.workflow.items()
+        }
+        for param, spec in self.params.items():
+            if param in params:
+                value = params[param]
+                self._check(param, value)
+            elif spec.get("default") == "random":
+                value = random.randint(0, MAX_RANDOM_SEED)
+            elif "default" in spec:
+                value = spec["default"]
+            else:
+                continue
+            for target in spec["targets"]:
+                bound = value
+                if "format" in target:
+                    bound = target["format"].replace("{value}", str(value))
+                workflow[target["node"]]["inputs"][target["input"]] = bound
+        return workflow
+
+
+def load_templates(directory):
+    """
+    Load and compile every ``*.json`` template in a directory.
+
+    Broken templates are reported and skipped.
+
+    Args:
+        directory (str): Template directory (may not exist).
+
+    Returns:
+        dict: Template name -> WorkflowTemplate.
+    """
+    templates = {}
+    if not os.path.isdir(directory):
+        return templates
+    for filename in sorted(os.listdir(directory)):
+        name, ext = os.path.splitext(filename)
+        if ext != ".json":
+            continue
+        try:
+            with open(os.path.join(directory, filename), "r") as f:
+                templates[name] = WorkflowTemplate(name, json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"worker-comfyui - Skipping workflow template {filename}: {e}")
+    return templates
@@ -0,0 +1,91 @@
+"""
+Throughput and added latency of cross-job batching against the stand-in ComfyUI.
+
+Jobs use the test_input.json graph with different seeds and prompts. Every
+prompt costs PROMPT_OVERHEAD_S of fixed "GPU" time (queueing, model / LoRA
+patching, ...) and every image IMAGE_S. The merged sub-graphs still run every
+sampler one after another, so batching can only save the per-prompt overhead,
+never the per-image work: the gain reported with the synthetic overhead is an
+upper bound for that overhead, and the run without it shows what batching
+costs when there is nothing to save. Real gains depend on how much per-prompt
+overhead ComfyUI has on the target GPU.
+
+Usage: python tests/benchmark_batching.py
+"""
+
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "src"), os.path.dirname(__file__)]
+os.environ.setdefault("NETWORK_VOLUME_DEBUG", "false")
+
+import handler
+from comfy_client import ComfyClient
+from comfy_ws import ComfyWebsocketManager
+from fake_comfyui import FakeComfyUI
+from job_batcher import JobBatcher
+from queue_gate import ComfyQueueGate
+
+JOBS = 12
+CONCURRENCY = 4
+PROMPT_OVERHEAD_S = 0.3
+IMAGE_S = 0.2
+WINDOW_MS = 50
+
+
+def run(window_ms, prompt_overhead_s):
+    fake = FakeComfyUI(execution_time=prompt_overhead_s, image_time=IMAGE_S).start()
+    handler.COMFY_HOST = fake.host
+    handler.comfy_client = ComfyClient(fake.host)
+    handler.ws_manager = ComfyWebsocketManager(
+        fake.host,
+        reconnect=lambda url, err: handler._attempt_websocket_reconnect(url, 3, 1, err),
+        on_status=lambda status: handler.queue_gate.notify(),
+    )
+    handler.queue_gate = ComfyQueueGate(
+        handler.COMFY_MAX_QUEUED_PROMPTS, lambda: handler.ws_manager.queue_remaining
+    )
+    handler.job_batcher = (
+        JobBatcher(window_ms / 1000, CONCURRENCY, handler.run_batch) if window_ms else None
+    )
+    with open(os.path.join(ROOT, "test_input.json")) as f:
+        template = json.load(f)
+
+    def job(i):
+        workflow = json.loads(json.dumps(template))
+        workflow["21"]["inputs"]["value"] = i
+        workflow["29"]["inputs"]["value"] = f"prompt {i}"
+        start = time.monotonic()
+        result = handler.handler({"id": f"job-{i}", "input": {"workflow": workflow}})
+        return result, time.monotonic() - start
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        results = list(pool.map(job, range(JOBS)))
+    elapsed = time.monotonic() - start
+    handler.ws_manager.close()
+    fake.stop()
+
+    failed = [r for r, _ in results if "error" in r or len(r["images"]) != 1]
+    assert not failed, failed
+    latencies = sorted(latency for _, latency in results)
+    stats = handler.job_batcher.stats() if handler.job_batcher else {}
+    return JOBS / elapsed, latencies[len(latencies) // 2], stats
+
+
+if __name__ == "__main__":
+    import contextlib
+    import io
+
+    for prompt_overhead_s in (PROMPT_OVERHEAD_S, 0):
+        for window_ms in (0, WINDOW_MS):
+            with contextlib.redirect_stdout(io.StringIO()):
+                throughput, p50, stats = run(window_ms, prompt_overhead_s)
+            print(
+                f"prompt overhead={prompt_overhead_s} s, batch window={window_ms} ms: "
+                f"{throughput:.2f} jobs/s, p50 latency {p50:.2f} s {stats}"
+            )
@@ -0,0 +1,72 @@
+"""
+Throughput of the handler against the stand-in ComfyUI for different
+COMFY_MAX_CONCURRENCY values.
+
+Each prompt keeps the fake "GPU" busy for EXECUTION_S and every output costs
+VIEW_DELAY_S of post-processing, so a strictly sequential worker leaves the
+GPU idle while it fetches outputs.
+
+Usage: python tests/benchmark_concurrency.py
+"""
+
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "src"), os.path.dirname(__file__)]
+os.environ.setdefault("NETWORK_VOLUME_DEBUG", "false")
+
+import handler
+from comfy_client import ComfyClient
+from comfy_ws import ComfyWebsocketManager
+from fake_comfyui import FakeComfyUI
+from queue_gate import ComfyQueueGate
+
+JOBS = 12
+EXECUTION_S = 0.3
+VIEW_DELAY_S = 0.2
+
+
+def run(concurrency):
+    fake = FakeComfyUI(execution_time=EXECUTION_S, view_delay=VIEW_DELAY_S).start()
+    handler.COMFY_HOST = fake.host
+    handler.comfy_client = ComfyClient(fake.host)
+    handler.ws_manager = ComfyWebsocketManager(
+        fake.host,
+        reconnect=lambda url, err: handler._attempt_websocket_reconnect(url, 3, 1, err),
+        on_status=lambda status: handler.queue_gate.notify(),
+    )
+    handler.queue_gate = ComfyQueueGate(
+        handler.COMFY_MAX_QUEUED_PROMPTS, lambda: handler.ws_manager.queue_remaining
+    )
+    with open(os.path.join(ROOT, "test_input.json")) as f:
+        workflow = json.load(f)
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(
+            pool.map(
+                lambda i: handler.handler({"id": f"job-{i}", "input": {"workflow": workflow}}),
+                range(JOBS),
+            )
+        )
+    elapsed = time.monotonic() - start
+    handler.ws_manager.close()
+    fake.stop()
+
+    failed = [r for r in results if "error" in r]
+    assert not failed, failed
+    return JOBS / elapsed
+
+
+if __name__ == "__main__":
+    import contextlib
+    import io
+
+    for concurrency in (1, 2, 3):
+        with contextlib.redirect_stdout(io.StringIO()):
+            throughput = run(concurrency)
+        print(f"concurrency={concurrency}: {throughput:.2f} jobs/s")
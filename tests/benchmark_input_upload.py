@@ -0,0 +1,84 @@
+"""
+Peak Python memory used to upload one base64 input image to ComfyUI,
+before (full decode + requests ``files=``) and after (streamed MultipartImageBody).
+
+The receiving server discards the body into a fixed buffer so only the
+client side is measured. The base64 string itself (part of the job input)
+is allocated before measuring and is not counted.
+
+Usage: python tests/benchmark_input_upload.py
+"""
+
+import base64
+import os
+import socket
+import sys
+import threading
+import tracemalloc
+
+import requests
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+from input_images import MultipartImageBody
+
+IMAGE_MB = 8
+
+
+def _sink_server():
+    """HTTP server that reads and discards request bodies, then answers 200."""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+
+    def serve():
+        buffer = bytearray(65536)
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                head = b""
+                while b"\r\n\r\n" not in head:
+                    head += conn.recv(1024)
+                header, _, rest = head.partition(b"\r\n\r\n")
+                length = int(
+                    [l for l in header.split(b"\r\n") if l.lower().startswith(b"content-length")][0]
+                    .split(b":")[1]
+                )
+                remaining = length - len(rest)
+                while remaining > 0:
+                    remaining -= conn.recv_into(buffer)
+                conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+
+    threading.Thread(target=serve, daemon=True).start()
+    return f"http://127.0.0.1:{server.getsockname()[1]}/upload/image"
+
+
+def upload_before(url, image_data_uri):
+    base64_data = image_data_uri.split(",", 1)[1] if "," in image_data_uri else image_data_uri
+    blob = base64.b64decode(base64_data)
+    files = {"image": ("a.png", blob, "image/png"), "overwrite": (None, "true")}
+    requests.post(url, files=files, timeout=30).raise_for_status()
+
+
+def upload_after(url, image_data_uri):
+    body = MultipartImageBody("a.png", image_data_uri, fields={"overwrite": "true"})
+    requests.post(
+        url, data=body, headers={"Content-Type": body.content_type}, timeout=30
+    ).raise_for_status()
+
+
+def peak_mb(upload, url, image_data_uri):
+    tracemalloc.start()
+    upload(url, image_data_uri)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+if __name__ == "__main__":
+    url = _sink_server()
+    image_data_uri = "data:image/png;base64," + base64.b64encode(
+        os.urandom(IMAGE_MB * 1024 * 1024)
+    ).decode()
+    print(f"input image: {IMAGE_MB} MB decoded, {len(image_data_uri) / 1024 / 1024:.1f} MB base64")
+    print(f"before: peak {peak_mb(upload_before, url, image_data_uri):.1f} MB")
+    print(f"after:  peak {peak_mb(upload_after, url, image_data_uri):.1f} MB")
@@ -0,0 +1,96 @@
+"""
+Latency and bytes moved for the three ways output images reach the handler.
+
+  • SaveImage + /view:       ComfyUI writes the PNG, the handler fetches it over HTTP
+  • SaveImage + local file:  ComfyUI writes the PNG, the handler reads it from disk
+  • SaveImageWebsocket:      ComfyUI sends the PNG as a binary websocket frame
+
+Every job produces IMAGES images of IMAGE_MB each (base64 output).
+
+Usage: python tests/benchmark_ws_outputs.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "src"), os.path.dirname(__file__)]
+os.environ.setdefault("NETWORK_VOLUME_DEBUG", "false")
+
+import handler
+from comfy_client import ComfyClient
+from comfy_ws import ComfyWebsocketManager
+from fake_comfyui import FakeComfyUI
+from queue_gate import ComfyQueueGate
+
+JOBS = 10
+IMAGES = 4
+IMAGE_MB = 3
+
+
+def run(save_node, local_outputs):
+    image_bytes = os.urandom(IMAGE_MB * 1024 * 1024)
+    output_dir = tempfile.mkdtemp()
+    fake = FakeComfyUI(execution_time=0.05, image_bytes=image_bytes, output_dir=output_dir).start()
+    handler.COMFY_HOST = fake.host
+    handler.comfy_client = ComfyClient(fake.host)
+    handler.ws_manager = ComfyWebsocketManager(
+        fake.host,
+        reconnect=lambda url, err: handler._attempt_websocket_reconnect(url, 3, 1, err),
+        on_status=lambda status: handler.queue_gate.notify(),
+    )
+    handler.queue_gate = ComfyQueueGate(1, lambda: handler.ws_manager.queue_remaining)
+
+    moved = {"disk_write": 0, "disk_read": 0, "http": 0, "websocket": 0}
+    get_image_data = handler.get_image_data
+    decode_image_frame = handler.decode_image_frame
+
+    def counted_get_image_data(filename, subfolder, image_type):
+        data = get_image_data(filename, subfolder, image_type)
+        moved["disk_read" if local_outputs else "http"] += len(data or b"")
+        return data
+
+    def counted_decode_image_frame(payload):
+        moved["websocket"] += len(payload)
+        return decode_image_frame(payload)
+
+    workflow = {
+        "1": {"class_type": "EmptySD3LatentImage", "inputs": {"batch_size": IMAGES}},
+        "2": {"class_type": save_node, "inputs": {"images": ["1", 0]}},
+    }
+    latencies = []
+    with patch.object(handler, "get_image_data", counted_get_image_data), patch.object(
+        handler, "decode_image_frame", counted_decode_image_frame
+    ), patch.object(handler, "COMFY_LOCAL_OUTPUTS", local_outputs), patch.dict(
+        handler.COMFY_IMAGE_DIRS, {"output": output_dir}
+    ):
+        for i in range(JOBS):
+            start = time.monotonic()
+            result = handler.handler({"id": f"job-{i}", "input": {"workflow": workflow}})
+            latencies.append(time.monotonic() - start)
+            assert len(result["images"]) == IMAGES, result.get("error")
+    if save_node == "SaveImage":
+        moved["disk_write"] = JOBS * IMAGES * len(image_bytes)
+    handler.ws_manager.close()
+    fake.stop()
+
+    latencies.sort()
+    per_job_mb = {k: round(v / JOBS / 1024 / 1024, 1) for k, v in moved.items() if v}
+    return latencies[len(latencies) // 2], per_job_mb
+
+
+if __name__ == "__main__":
+    import contextlib
+    import io
+
+    for label, save_node, local_outputs in (
+        ("SaveImage + /view", "SaveImage", False),
+        ("SaveImage + local file", "SaveImage", True),
+        ("SaveImageWebsocket", "SaveImageWebsocket", False),
+    ):
+        with contextlib.redirect_stdout(io.StringIO()):
+            p50, per_job_mb = run(save_node, local_outputs)
+        print(f"{label:24s} p50 latency {p50 * 1000:.0f} ms, MB moved per job {per_job_mb}")
@@ -0,0 +1,373 @@
+"""
+Minimal stand-in for a ComfyUI server, used by the tests and benchmarks.
+
+It speaks just enough of the ComfyUI HTTP and websocket API for the handler:
+  • GET /, /history/<id>, /view, /queue, /object_info
+  • POST /prompt, /upload/image, /interrupt, /queue
+  • GET /ws?clientId=... (websocket; status / executing / progress / executed events)
+
+Prompts are "executed" one at a time on a single worker thread, like a GPU,
+and every output node (class_type starting with "Save") produces one image per
+latent in the batch.
+"""
+
+import base64
+import email.parser
+import email.policy
+import hashlib
+import json
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+import urllib.parse
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 1x1 transparent PNG
+TINY_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+)
+
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def _ws_frame(payload, opcode):
+    header = bytes([0x80 | opcode])
+    length = len(payload)
+    if length < 126:
+        header += bytes([length])
+    elif length < 65536:
+        header += bytes([126]) + struct.pack(">H", length)
+    else:
+        header += bytes([127]) + struct.pack(">Q", length)
+    return header + payload
+
+
+class FakeComfyUI:
+    """
+    Args:
+        execution_time (float): Seconds the "GPU" spends on each prompt.
+        image_bytes (bytes): Content returned for every output image.
+        output_dir (str): If set, output images are also written there.
+        view_delay (float): Seconds every /view request takes.
+        image_time (float): Extra "GPU" seconds for every image an output node saves.
+        preview_bytes (bytes): If set, sent as a PNG preview frame after every sampler step.
+    """
+
+    def __init__(
+        self,
+        execution_time=0.05,
+        image_bytes=TINY_PNG,
+        output_dir=None,
+        view_delay=0.0,
+        image_time=0.0,
+        preview_bytes=None,
+    ):
+        self.execution_time = execution_time
+        self.image_time = image_time
+        self.preview_bytes = preview_bytes
+        self.view_delay = view_delay
+        self.image_bytes = image_bytes
+        self.output_dir = output_dir
+        self.history = {}
+        self.requests = []
+        self.uploads = {}
+        self.object_info = {}
+        self.interrupted = 0
+        self.deleted = []
+        self.websockets_refused_until = 0.0
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._running = None
+        self._counter = 0
+        self._stop = threading.Event()
+
+        fake = self
+
+        class Handler(_Handler):
+            server_fake = fake
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def host(self):
+        return f"127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        threading.Thread(target=self._execute_loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._queue.put(None)
+        self.drop_websockets()
+        self.server.shutdown()
+        self.server.server_close()
+
+    # ------------------------------------------------------------------
+    # Websocket helpers
+    # ------------------------------------------------------------------
+
+    def send(self, client_id, message):
+        self._send_frame(client_id, _ws_frame(json.dumps(message).encode(), 0x1))
+
+    def send_binary(self, client_id, payload):
+        self._send_frame(client_id, _ws_frame(payload, 0x2))
+
+    def broadcast_status(self):
+        with self._pending_lock:
+            remaining = len(self._pending) + (1 if self._running else 0)
+        message = {
+            "type": "status",
+            "data": {"status": {"exec_info": {"queue_remaining": remaining}}},
+        }
+        with self._clients_lock:
+            client_ids = list(self._clients)
+        for client_id in client_ids:
+            self.send(client_id, message)
+
+    def drop_websockets(self):
+        """Close every websocket connection (simulates a network glitch)."""
+        with self._clients_lock:
+            clients, self._clients = self._clients, {}
+        for conns in clients.values():
+            for conn in conns:
+                try:
+                    conn.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def refuse_websockets(self, seconds):
+        """Drop every websocket and refuse new ones for a while (a longer outage)."""
+        self.websockets_refused_until = time.monotonic() + seconds
+        self.drop_websockets()
+
+    def _send_frame(self, client_id, frame):
+        with self._clients_lock:
+            conns = list(self._clients.get(client_id, []))
+        for conn in conns:
+            try:
+                conn.sendall(frame)
+            except OSError:
+                pass
+
+    def _register(self, client_id, conn):
+        with self._clients_lock:
+            self._clients.setdefault(client_id, []).append(conn)
+
+    def _unregister(self, client_id, conn):
+        with self._clients_lock:
+            conns = self._clients.get(client_id, [])
+            if conn in conns:
+                conns.remove(conn)
+
+    # ------------------------------------------------------------------
+    # Prompt execution
+    # ------------------------------------------------------------------
+
+    def queue_prompt(self, payload):
+        prompt_id = payload.get("prompt_id") or str(uuid.uuid4())
+        with self._pending_lock:
+            self._pending.append(prompt_id)
+        self._queue.put((prompt_id, payload))
+        self.broadcast_status()
+        return prompt_id
+
+    def _execute_loop(self):
+        while not self._stop.is_set():
+            item = self._queue.get()
+            if item is None:
+                return
+            prompt_id, payload = item
+            with self._pending_lock:
+                if prompt_id not in self._pending:
+                    continue  # deleted from the queue
+                self._pending.remove(prompt_id)
+                self._running = prompt_id
+            self._execute(prompt_id, payload)
+            with self._pending_lock:
+                self._running = None
+            self.broadcast_status()
+
+    def _execute(self, prompt_id, payload):
+        client_id = payload.get("client_id")
+        workflow = payload.get("prompt", {})
+        self.send(client_id, {"type": "execution_start", "data": {"prompt_id": prompt_id}})
+
+        batch_size = 1
+        for node in workflow.values():
+            inputs = node.get("inputs", {}) if isinstance(node, dict) else {}
+            if isinstance(inputs.get("batch_size"), int):
+                batch_size = max(batch_size, inputs["batch_size"])
+
+        node_ids = list(workflow)
+        step = self.execution_time / max(len(node_ids), 1)
+        outputs = {}
+        self.interrupt_event = threading.Event()
+        for node_id in node_ids:
+            if self.interrupt_event.wait(step):
+                self.send(
+                    client_id,
+                    {"type": "execution_interrupted", "data": {"prompt_id": prompt_id, "node_id": node_id}},
+                )
+                self.history[prompt_id] = {"outputs": outputs, "status": {"status_str": "error", "completed": False}}
+                return
+            self.send(client_id, {"type": "executing", "data": {"node": node_id, "prompt_id": prompt_id}})
+            class_type = workflow[node_id].get("class_type", "")
+            steps = workflow[node_id].get("inputs", {}).get("steps")
+            if isinstance(steps, int):
+                for value in range(1, steps + 1):
+                    self.send(
+                        client_id,
+                        {"type": "progress", "data": {"value": value, "max": steps, "prompt_id": prompt_id, "node": node_id}},
+                    )
+                    if self.preview_bytes:
+                        # PREVIEW_IMAGE event, PNG format
+                        self.send_binary(client_id, struct.pack(">II", 1, 2) + self.preview_bytes)
+            if class_type == "SaveImageWebsocket":
+                # Images go out as binary frames only (nothing on disk, nothing in history)
+                for _ in range(batch_size):
+                    time.sleep(self.image_time)
+                    self.send_binary(client_id, struct.pack(">II", 1, 2) + self.image_bytes)
+            elif class_type.startswith("Save"):
+                images = []
+                for _ in range(batch_size):
+                    time.sleep(self.image_time)
+                    images.append(self._save_image())
+                outputs[node_id] = {"images": images}
+                self.send(
+                    client_id,
+                    {"type": "executed", "data": {"node": node_id, "output": outputs[node_id], "prompt_id": prompt_id}},
+                )
+
+        self.history[prompt_id] = {"outputs": outputs, "status": {"status_str": "success", "completed": True}}
+        self.send(client_id, {"type": "executing", "data": {"node": None, "prompt_id": prompt_id}})
+
+    def _save_image(self):
+        self._counter += 1
+        filename = f"ComfyUI_{self._counter:05d}_.png"
+        if self.output_dir:
+            with open(os.path.join(self.output_dir, filename), "wb") as f:
+                f.write(self.image_bytes)
+        return {"filename": filename, "subfolder": "", "type": "output"}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; avoid Nagle + delayed ACK stalls
+    disable_nagle_algorithm = True
+    server_fake = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status=200, body=b"", content_type="application/json"):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def do_GET(self):
+        fake = self.server_fake
+        parsed = urllib.parse.urlparse(self.path)
+        fake.requests.append(("GET", parsed.path))
+        if parsed.path == "/ws":
+            if time.monotonic() < fake.websockets_refused_until:
+                return self._reply(503, {"error": "websocket unavailable"})
+            return self._websocket(urllib.parse.parse_qs(parsed.query))
+        if parsed.path == "/":
+            return self._reply(200, b"ok", "text/html")
+        if parsed.path.startswith("/history/"):
+            prompt_id = parsed.path.rsplit("/", 1)[1]
+            entry = fake.history.get(prompt_id)
+            return self._reply(200, {prompt_id: entry} if entry else {})
+        if parsed.path == "/view":
+            time.sleep(fake.view_delay)
+            return self._reply(200, fake.image_bytes, "image/png")
+        if parsed.path == "/queue":
+            with fake._pending_lock:
+                pending = [[0, p, {}, {}, []] for p in fake._pending]
+                running = [[0, fake._running, {}, {}, []]] if fake._running else []
+            return self._reply(200, {"queue_running": running, "queue_pending": pending})
+        if parsed.path == "/object_info":
+            return self._reply(200, fake.object_info)
+        return self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        fake = self.server_fake
+        parsed = urllib.parse.urlparse(self.path)
+        fake.requests.append(("POST", parsed.path))
+        body = self._body()
+        if parsed.path == "/prompt":
+            prompt_id = fake.queue_prompt(json.loads(body))
+            return self._reply(200, {"prompt_id": prompt_id, "number": 0, "node_errors": {}})
+        if parsed.path == "/upload/image":
+            message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+                b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + body
+            )
+            for part in message.iter_parts():
+                if part.get_param("name", header="content-disposition") == "image":
+                    name = part.get_filename()
+                    fake.uploads[name] = part.get_payload(decode=True)
+            return self._reply(200, {"name": name, "subfolder": "", "type": "input"})
+        if parsed.path == "/interrupt":
+            fake.interrupted += 1
+            if getattr(fake, "interrupt_event", None):
+                fake.interrupt_event.set()
+            return self._reply(200, b"", "text/plain")
+        if parsed.path == "/queue":
+            payload = json.loads(body or b"{}")
+            with fake._pending_lock:
+                for prompt_id in payload.get("delete", []):
+                    if prompt_id in fake._pending:
+                        fake._pending.remove(prompt_id)
+                        fake.deleted.append(prompt_id)
+            return self._reply(200, b"", "text/plain")
+        return self._reply(404, {"error": "not found"})
+
+    def _websocket(self, query):
+        fake = self.server_fake
+        client_id = query.get("clientId", [str(uuid.uuid4())])[0]
+        key = self.headers.get("Sec-WebSocket-Key", "")
+        accept = base64.b64encode(
+            hashlib.sha1((key + _WS_GUID).encode()).digest()
+        ).decode()
+        self.send_response(101)
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        self.wfile.flush()
+
+        conn = self.connection
+        fake._register(client_id, conn)
+        fake.send(client_id, {"type": "status", "data": {"status": {"exec_info": {"queue_remaining": 0}}, "sid": client_id}})
+        try:
+            # Drain client frames until the client closes the connection
+            while True:
+                data = conn.recv(4096)
+                if not data:
+                    break
+                if data[0] & 0x0F == 0x8:
+                    conn.sendall(_ws_frame(b"", 0x8))
+                    break
+        except OSError:
+            pass
+        finally:
+            fake._unregister(client_id, conn)
+            self.close_connection = True
@@ -0,0 +1,142 @@
+"""
+Minimal local stand-in for S3, used by the upload tests.
+
+Supports the calls boto3's ``upload_fileobj`` makes with path-style addressing:
+PutObject, CreateMultipartUpload, UploadPart and CompleteMultipartUpload.
+"""
+
+import hashlib
+import threading
+import time
+import urllib.parse
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Time each UploadPart request is held open
+PART_DELAY_S = 0.05
+
+
+def _decode_aws_chunked(body):
+    """Strip the aws-chunked framing (size;signature CRLF data CRLF ... trailers)."""
+    data = b""
+    while body:
+        header, _, body = body.partition(b"\r\n")
+        size = int(header.split(b";", 1)[0], 16)
+        if size == 0:
+            break
+        data += body[:size]
+        body = body[size + 2 :]
+    return data
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+        self.multipart_uploads = 0
+        self.max_parallel_parts = 0
+        self._parts = {}
+        self._active_parts = 0
+        self._lock = threading.Lock()
+
+        fake = self
+
+        class Handler(_Handler):
+            server_fake = fake
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def endpoint_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_fake = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status=200, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        if "aws-chunked" in self.headers.get("Content-Encoding", "") or self.headers.get(
+            "x-amz-content-sha256", ""
+        ).startswith("STREAMING-"):
+            body = _decode_aws_chunked(body)
+        return body
+
+    def _target(self):
+        parsed = urllib.parse.urlparse(self.path)
+        bucket, _, key = parsed.path.lstrip("/").partition("/")
+        return bucket, urllib.parse.unquote(key), urllib.parse.parse_qs(
+            parsed.query, keep_blank_values=True
+        )
+
+    def do_PUT(self):
+        fake = self.server_fake
+        bucket, key, query = self._target()
+        if "uploadId" in query:
+            with fake._lock:
+                fake._active_parts += 1
+                fake.max_parallel_parts = max(fake.max_parallel_parts, fake._active_parts)
+            try:
+                body = self._body()
+                # Hold the part briefly so overlapping uploads are observable
+                time.sleep(PART_DELAY_S)
+                upload_id = query["uploadId"][0]
+                part = int(query["partNumber"][0])
+                with fake._lock:
+                    fake._parts.setdefault(upload_id, {})[part] = body
+            finally:
+                with fake._lock:
+                    fake._active_parts -= 1
+        else:
+            body = self._body()
+            fake.objects[(bucket, key)] = body
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        self._reply(200, headers={"ETag": etag})
+
+    def do_POST(self):
+        fake = self.server_fake
+        bucket, key, query = self._target()
+        self._body()
+        if "uploads" in query:
+            upload_id = uuid.uuid4().hex
+            with fake._lock:
+                fake._parts[upload_id] = {}
+                fake.multipart_uploads += 1
+            xml = (
+                "<InitiateMultipartUploadResult>"
+                f"<Bucket>{bucket}</Bucket><Key>{key}</Key><UploadId>{upload_id}</UploadId>"
+                "</InitiateMultipartUploadResult>"
+            )
+            return self._reply(200, xml.encode())
+        if "uploadId" in query:
+            with fake._lock:
+                parts = fake._parts.pop(query["uploadId"][0])
+            fake.objects[(bucket, key)] = b"".join(parts[n] for n in sorted(parts))
+            xml = (
+                "<CompleteMultipartUploadResult>"
+                f"<Bucket>{bucket}</Bucket><Key>{key}</Key><ETag>\"done\"</ETag>"
+                "</CompleteMultipartUploadResult>"
+            )
+            return self._reply(200, xml.encode())
+        self._reply(400)
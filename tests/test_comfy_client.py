@@ -0,0 +1,71 @@
+import unittest
+import sys
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+import comfy_client
+from comfy_client import ComfyClient
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Status codes to answer with before falling back to 200
+    pending_statuses = []
+
+    def do_GET(self):
+        status = self.pending_statuses.pop(0) if self.pending_statuses else 200
+        body = b"ok"
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestComfyClient(unittest.TestCase):
+    def setUp(self):
+        _KeepAliveHandler.pending_statuses = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = ComfyClient(f"127.0.0.1:{self.server.server_address[1]}")
+
+    def tearDown(self):
+        self.client.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connections_are_reused(self):
+        for _ in range(5):
+            self.assertEqual(self.client.get("/history/1", "history").status_code, 200)
+
+        stats = self.client.stats()
+        self.assertEqual(stats["requests"], 5)
+        self.assertEqual(stats["connections_opened"], 1)
+        self.assertEqual(stats["connections_reused"], 4)
+
+    def test_retries_on_unavailable(self):
+        _KeepAliveHandler.pending_statuses = [503]
+        response = self.client.get("/history/1", "history")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.stats()["retries"], 1)
+
+    def test_prompt_is_not_retried(self):
+        _KeepAliveHandler.pending_statuses = [503]
+        response = self.client.get("/prompt", "prompt")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.client.stats()["retries"], 0)
+
+    def test_absolute_url_is_kept(self):
+        self.assertEqual(
+            self.client.url("http://example.com/x"), "http://example.com/x"
+        )
+        self.assertEqual(self.client.url("/view"), f"{self.client.base_url}/view")
+
+    def test_every_endpoint_has_a_policy(self):
+        for policy in comfy_client.ENDPOINT_POLICIES.values():
+            self.assertIn("timeout", policy)
+            self.assertIn("retries", policy)
@@ -0,0 +1,80 @@
+import unittest
+import sys
+import os
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+from comfy_health import ComfyHealth, READY, STARTING, UNHEALTHY
+
+
+class TestComfyHealth(unittest.TestCase):
+    def setUp(self):
+        self.gate_calls = 0
+        self.probe_calls = 0
+        self.server_up = True
+
+    def wait_ready(self):
+        self.gate_calls += 1
+        time.sleep(0.05)
+        return self.server_up
+
+    def probe(self):
+        self.probe_calls += 1
+        return self.server_up
+
+    def health(self):
+        return ComfyHealth(self.wait_ready, self.probe)
+
+    def test_readiness_gate_runs_once_for_concurrent_jobs(self):
+        health = self.health()
+        self.assertEqual(health.state, STARTING)
+        results = []
+
+        threads = [threading.Thread(target=lambda: results.append(health.ensure_ready())) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [None] * 5)
+        self.assertEqual(self.gate_calls, 1)
+        self.assertEqual(health.state, READY)
+
+    def test_ready_state_costs_no_probe(self):
+        health = self.health()
+        health.mark_ready()
+
+        for _ in range(10):
+            self.assertIsNone(health.ensure_ready())
+
+        self.assertEqual((self.gate_calls, self.probe_calls), (0, 0))
+
+    def test_unhealthy_fails_fast_with_the_reason(self):
+        health = self.health()
+        health.mark_ready()
+        self.server_up = False
+        health.mark_unhealthy("ComfyUI was OOM-killed")
+
+        self.assertEqual(health.ensure_ready(), "ComfyUI was OOM-killed")
+        self.assertEqual(self.probe_calls, 1)
+        self.assertEqual(health.stats()["failures"], 1)
+
+    def test_unhealthy_recovers_when_the_probe_answers(self):
+        health = self.health()
+        health.mark_unhealthy("HTTP connection to ComfyUI failed")
+
+        self.assertIsNone(health.ensure_ready())
+        self.assertEqual(health.state, READY)
+        self.assertIsNone(health.reason)
+
+    def test_failed_gate_marks_unhealthy(self):
+        self.server_up = False
+        health = self.health()
+
+        self.assertEqual(health.ensure_ready(), "ComfyUI did not become reachable")
+        self.assertEqual(health.state, UNHEALTHY)
+
+
+if __name__ == "__main__":
+    unittest.main()
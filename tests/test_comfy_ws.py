@@ -0,0 +1,132 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+import websocket
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+import comfy_ws
+from comfy_ws import ComfyWebsocketManager, reconnect_delay
+from fake_comfyui import FakeComfyUI
+
+
+def _reconnect(ws_url, error):
+    ws = websocket.WebSocket()
+    ws.connect(ws_url, timeout=5)
+    return ws
+
+
+def _next(events, message_type, timeout=5):
+    while True:
+        message = events.get(timeout=timeout)
+        if message["type"] == message_type:
+            return message
+
+
+class TestComfyWebsocketManager(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeComfyUI(execution_time=0.05).start()
+        self.manager = ComfyWebsocketManager(self.fake.host, reconnect=_reconnect)
+        self.manager.ensure_connected()
+
+    def tearDown(self):
+        self.manager.close()
+        self.fake.stop()
+
+    def _queue(self, prompt_id):
+        return self.fake.queue_prompt(
+            {
+                "prompt_id": prompt_id,
+                "client_id": self.manager.client_id,
+                "prompt": {"9": {"class_type": "SaveImage", "inputs": {}}},
+            }
+        )
+
+    def test_connects_once(self):
+        self.manager.ensure_connected()
+        self.manager.ensure_connected()
+        ws_connects = [r for r in self.fake.requests if r == ("GET", "/ws")]
+        self.assertEqual(len(ws_connects), 1)
+
+    def test_events_are_routed_per_prompt(self):
+        events_a = self.manager.subscribe("a")
+        events_b = self.manager.subscribe("b")
+        self._queue("a")
+        self._queue("b")
+
+        done_a = _next(events_a, "executed")
+        done_b = _next(events_b, "executed")
+        self.assertEqual(done_a["data"]["prompt_id"], "a")
+        self.assertEqual(done_b["data"]["prompt_id"], "b")
+
+    def test_events_before_subscribe_are_replayed(self):
+        self._queue("early")
+        # Wait until the prompt has finished before subscribing
+        probe = self.manager.subscribe("probe")
+        self._queue("probe")
+        _next(probe, "executed")
+
+        events = self.manager.subscribe("early")
+        message = _next(events, "executing")
+        self.assertEqual(message["data"]["prompt_id"], "early")
+
+    def test_unsubscribed_prompt_events_are_dropped(self):
+        events = self.manager.subscribe("a")
+        self._queue("a")
+        _next(events, "executed")
+        self.manager.unsubscribe("a")
+
+        self.manager._deliver("a", {"type": "executing", "data": {"prompt_id": "a", "node": None}})
+
+        self.assertEqual(self.manager._buffered, {})
+
+    def test_binary_frames_are_not_buffered(self):
+        self.manager._deliver("x", {"type": comfy_ws.EVENT_BINARY, "data": {}, "payload": b"\0" * 1024})
+        self.manager._deliver("x", {"type": "executing", "data": {"prompt_id": "x"}})
+
+        self.assertEqual([m["type"] for m in self.manager.subscribe("x").queue], ["executing"])
+
+    def test_buffer_is_bounded_by_message_count(self):
+        with patch.object(comfy_ws, "MAX_BUFFERED_MESSAGES", 5):
+            for prompt_id in ("old", "new"):
+                for _ in range(3):
+                    self.manager._deliver(prompt_id, {"type": "progress", "data": {"prompt_id": prompt_id}})
+
+        self.assertEqual(list(self.manager._buffered), ["new"])
+        self.assertEqual(self.manager._buffered_count, 3)
+
+    def test_status_is_broadcast(self):
+        events = self.manager.subscribe("a")
+        self.fake.broadcast_status()
+        message = _next(events, "status")
+        self.assertIn("exec_info", message["data"]["status"])
+        self.assertIn("exec_info", self.manager.last_status)
+
+    def test_reconnects_in_background(self):
+        events = self.manager.subscribe("a")
+        self.fake.drop_websockets()
+        _next(events, comfy_ws.EVENT_RECONNECTED)
+        self._queue("a")
+        _next(events, "executed")
+
+    def test_failed_reconnect_is_reported(self):
+        def give_up(ws_url, error):
+            raise websocket.WebSocketConnectionClosedException("ComfyUI crashed")
+
+        self.manager._reconnect = give_up
+        events = self.manager.subscribe("a")
+        self.fake.drop_websockets()
+        message = _next(events, comfy_ws.EVENT_DISCONNECTED)
+        self.assertEqual(message["data"]["error"], "ComfyUI crashed")
+
+
+class TestReconnectDelay(unittest.TestCase):
+    def test_delay_doubles_with_jitter_up_to_the_cap(self):
+        for attempt, (low, high) in enumerate([(0.5, 1), (1, 2), (2, 4), (4, 8), (5, 10), (5, 10)]):
+            delays = [reconnect_delay(attempt, 1, 10) for _ in range(200)]
+            self.assertGreaterEqual(min(delays), low)
+            self.assertLessEqual(max(delays), high)
+            # Jittered: workers that lost ComfyUI together do not retry in lockstep
+            self.assertGreater(len(set(delays)), 1)
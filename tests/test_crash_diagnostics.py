@@ -0,0 +1,175 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+from crash_diagnostics import (
+    collect,
+    find_processes,
+    oom_kill_count,
+    read_meminfo,
+    read_memory_cgroup,
+    tail_file,
+)
+
+
+class CrashDiagnosticsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.proc = os.path.join(self.root, "proc")
+        self.cgroup = os.path.join(self.root, "cgroup")
+        os.makedirs(self.proc)
+        os.makedirs(self.cgroup)
+        self.write(
+            "proc/meminfo",
+            "MemTotal:       16384000 kB\nMemFree:          100000 kB\n"
+            "MemAvailable:     204800 kB\nSwapFree:              0 kB\n",
+        )
+
+    def write(self, path, content):
+        path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def add_process(self, pid, cmdline, state="S"):
+        self.write(f"proc/{pid}/cmdline", "\0".join(cmdline) + "\0")
+        self.write(f"proc/{pid}/stat", f"{pid} (python (main)) {state} 1 1 1 0 -1")
+
+
+class TestCollectors(CrashDiagnosticsTestCase):
+    def test_process_scan_skips_zombies_and_other_commands(self):
+        self.add_process(10, ["python", "-u", "/comfyui/main.py", "--port", "8188"])
+        self.add_process(11, ["python", "-u", "/comfyui/main.py"], state="Z")
+        self.add_process(12, ["python", "handler.py"])
+        self.write("proc/self/cmdline", "")
+
+        self.assertEqual(find_processes("comfyui/main.py", self.proc), [10])
+
+    def test_meminfo_in_mb(self):
+        self.assertEqual(
+            read_meminfo(self.proc), {"total_mb": 16000, "available_mb": 200, "swap_free_mb": 0}
+        )
+
+    def test_cgroup_v2(self):
+        self.write("cgroup/memory.events", "low 0\nhigh 0\nmax 4\noom 2\noom_kill 1\n")
+        self.write("cgroup/memory.current", str(3 * 1024 * 1024 * 1024))
+        self.write("cgroup/memory.max", "max\n")
+
+        self.assertEqual(
+            read_memory_cgroup(self.cgroup),
+            {"oom_kill": 1, "oom": 2, "current_mb": 3072, "max_mb": None},
+        )
+
+    def test_cgroup_v1(self):
+        self.write("cgroup/memory/memory.oom_control", "oom_kill_disable 0\nunder_oom 0\noom_kill 3\n")
+        self.write("cgroup/memory/memory.usage_in_bytes", str(512 * 1024 * 1024))
+        self.write("cgroup/memory/memory.limit_in_bytes", str(1024 * 1024 * 1024))
+
+        self.assertEqual(
+            read_memory_cgroup(self.cgroup), {"oom_kill": 3, "current_mb": 512, "max_mb": 1024}
+        )
+        self.assertEqual(oom_kill_count(self.cgroup), 3)
+
+    def test_no_memory_cgroup(self):
+        self.assertIsNone(read_memory_cgroup(self.cgroup))
+        self.assertEqual(oom_kill_count(self.cgroup), 0)
+
+    def test_tail_reads_only_the_end(self):
+        path = self.write("comfyui.log", "".join(f"line {i}\n" for i in range(10000)))
+
+        self.assertEqual(tail_file(path, max_lines=3), ["line 9997", "line 9998", "line 9999"])
+        self.assertLessEqual(len(tail_file(path, max_bytes=64)), 64 // len("line 9999\n") + 1)
+
+
+class TestCollect(CrashDiagnosticsTestCase):
+    def test_oom_kill_since_worker_start(self):
+        self.write("cgroup/memory.events", "oom 1\noom_kill 2\n")
+        log = self.write("comfyui.log", "loading model\nKilled\n")
+
+        diag = collect("comfyui/main.py", log, 1.0, oom_kills_at_start=1, proc_root=self.proc, cgroup_root=self.cgroup)
+
+        self.assertIs(diag["comfyui_process_alive"], False)
+        self.assertIs(diag["oom_kill_detected"], True)
+        self.assertIs(diag["cuda_oom_in_log"], False)
+        self.assertEqual(diag["comfyui_log_tail"], ["loading model", "Killed"])
+        self.assertEqual(diag["system_memory"]["available_mb"], 200)
+        self.assertEqual((diag["errors"], diag["timed_out"]), ({}, []))
+
+    def test_old_oom_kills_are_not_blamed(self):
+        self.write("cgroup/memory.events", "oom 1\noom_kill 2\n")
+        self.add_process(10, ["python", "/comfyui/main.py"])
+
+        diag = collect(
+            "comfyui/main.py", os.path.join(self.root, "missing.log"), 1.0,
+            oom_kills_at_start=2, proc_root=self.proc, cgroup_root=self.cgroup,
+        )
+
+        self.assertIs(diag["oom_kill_detected"], False)
+        self.assertIs(diag["comfyui_process_alive"], True)
+        self.assertNotIn("comfyui_log_tail", diag)
+
+    def test_cuda_oom_in_log(self):
+        log = self.write(
+            "comfyui.log",
+            "Requested to load Lumina2\ntorch.OutOfMemoryError: CUDA out of memory. Tried to allocate 2.00 GiB\n",
+        )
+
+        diag = collect("comfyui/main.py", log, 1.0, proc_root=self.proc, cgroup_root=self.cgroup)
+
+        self.assertIs(diag["cuda_oom_in_log"], True)
+        self.assertIsNone(diag["memory_cgroup"])
+        self.assertNotIn("oom_kill_detected", diag)
+
+    def test_failing_collector_is_reported(self):
+        os.remove(os.path.join(self.proc, "meminfo"))
+
+        diag = collect("comfyui/main.py", "/nonexistent.log", 1.0, proc_root=self.proc, cgroup_root=self.cgroup)
+
+        self.assertIn("system_memory", diag["errors"])
+        self.assertNotIn("system_memory", diag)
+        self.assertIn("comfyui_process_alive", diag)
+
+    @unittest.skipUnless(hasattr(os, "mkfifo"), "needs named pipes")
+    def test_stuck_collector_does_not_exceed_the_budget(self):
+        # Opening a FIFO without a writer blocks, like a read from a hung filesystem
+        log = os.path.join(self.root, "comfyui.log")
+        os.mkfifo(log)
+        # Open the writing end once the test is done, so the stuck thread finishes
+        self.addCleanup(lambda: os.close(os.open(log, os.O_RDWR)))
+
+        start = time.monotonic()
+        diag = collect("comfyui/main.py", log, 0.1, proc_root=self.proc, cgroup_root=self.cgroup)
+        elapsed = time.monotonic() - start
+
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(diag["timed_out"], ["log_tail"])
+        self.assertIn("system_memory", diag)
+        self.assertNotIn("comfyui_log_tail", diag)
+
+    @unittest.skipUnless(hasattr(os, "mkfifo"), "needs named pipes")
+    def test_collector_finishing_late_does_not_change_the_result(self):
+        log = os.path.join(self.root, "comfyui.log")
+        os.mkfifo(log)
+
+        diag = collect("comfyui/main.py", log, 0.1, proc_root=self.proc, cgroup_root=self.cgroup)
+        snapshot = dict(diag)
+
+        # Let the stuck collector finish after collect() returned
+        os.close(os.open(log, os.O_RDWR))
+        for thread in threading.enumerate():
+            if thread.name == "crash-diag-log_tail":
+                thread.join(1.0)
+
+        self.assertEqual(diag, snapshot)
+        self.assertEqual((diag["errors"], diag["timed_out"]), ({}, ["log_tail"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,797 @@
+import unittest
+import asyncio
+from unittest.mock import patch
+import sys
+import os
+import base64
+import io
+import json
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "src"), os.path.dirname(__file__)]
+os.environ.setdefault("NETWORK_VOLUME_DEBUG", "false")
+
+import handler
+from comfy_client import ComfyClient
+from comfy_health import ComfyHealth, READY, UNHEALTHY
+from comfy_ws import ComfyWebsocketManager
+from fake_comfyui import FakeComfyUI
+from fake_s3 import FakeS3
+from input_cache import InputImageCache
+from job_batcher import JobBatcher
+from object_info import ObjectInfoCache
+from workflow_templates import WorkflowTemplate
+from queue_gate import ComfyQueueGate
+import s3_upload
+
+
+def _batch_workflow(batch_size, save_nodes=1):
+    workflow = {
+        "1": {"class_type": "EmptySD3LatentImage", "inputs": {"batch_size": batch_size}},
+    }
+    for i in range(save_nodes):
+        workflow[f"save{i}"] = {"class_type": "SaveImage", "inputs": {"images": ["1", 0]}}
+    return workflow
+
+
+class HandlerTestCase(unittest.TestCase):
+    """Runs handler() against the stand-in ComfyUI from fake_comfyui.py."""
+
+    fake_options = {}
+
+    def setUp(self):
+        self.fake = FakeComfyUI(**self.fake_options).start()
+        patches = {
+            "COMFY_HOST": self.fake.host,
+            "comfy_client": ComfyClient(self.fake.host),
+            "object_info_cache": ObjectInfoCache(lambda: handler.fetch_object_info()),
+            "comfy_health": ComfyHealth(
+                wait_ready=lambda: handler.check_server(f"http://{self.fake.host}/", 20, 50),
+                probe=lambda: handler._comfy_server_status()["reachable"],
+            ),
+            "WEBSOCKET_RECONNECT_ATTEMPTS": 2,
+            "WEBSOCKET_RECONNECT_DELAY_S": 0,
+        }
+        patches["ws_manager"] = ComfyWebsocketManager(
+            self.fake.host,
+            reconnect=lambda url, err: handler._reconnect_websocket(url, err),
+            on_status=lambda status: handler._on_comfy_status(),
+        )
+        patches["queue_gate"] = ComfyQueueGate(
+            2, lambda: patches["ws_manager"].queue_remaining
+        )
+        for name, value in patches.items():
+            patcher = patch.object(handler, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.fake.stop)
+        self.addCleanup(patches["ws_manager"].close)
+
+    def run_job(self, job_input, job_id="job-1"):
+        return handler.handler({"id": job_id, "input": job_input})
+
+
+class TestOutputPipeline(HandlerTestCase):
+    fake_options = {"view_delay": 0.2}
+
+    def test_batch_outputs_are_fetched_in_parallel_and_in_order(self):
+        start = time.monotonic()
+        result = self.run_job({"workflow": _batch_workflow(4, save_nodes=2)})
+        elapsed = time.monotonic() - start
+
+        filenames = [image["filename"] for image in result["images"]]
+        self.assertEqual(filenames, [f"ComfyUI_{i:05d}_.png" for i in range(1, 9)])
+        # 8 images at 0.2 s each would take 1.6 s serially
+        self.assertLess(elapsed, 1.2)
+
+    def test_per_image_errors_are_collected(self):
+        original = handler.get_image_data
+
+        def flaky(filename, subfolder, image_type):
+            if filename == "ComfyUI_00002_.png":
+                return None
+            return original(filename, subfolder, image_type)
+
+        with patch.object(handler, "get_image_data", flaky):
+            result = self.run_job({"workflow": _batch_workflow(3)})
+
+        self.assertEqual(len(result["images"]), 2)
+        self.assertEqual(
+            result["errors"],
+            ["Failed to fetch image data for ComfyUI_00002_.png from /view endpoint."],
+        )
+
+
+class TestEarlyOutputs(HandlerTestCase):
+    fake_options = {"execution_time": 1.0}
+
+    def workflow(self):
+        workflow = _batch_workflow(1)
+        # Slow nodes that run after the SaveImage node
+        for i in range(8):
+            workflow[f"slow{i}"] = {"class_type": "KSampler", "inputs": {"latent_image": ["1", 0]}}
+        return workflow
+
+    def test_images_are_processed_while_the_prompt_runs(self):
+        processed_at = []
+        original = handler.process_output_image
+
+        def record(*args):
+            processed_at.append(time.monotonic())
+            return original(*args)
+
+        start = time.monotonic()
+        with patch.object(handler, "process_output_image", record):
+            result = self.run_job({"workflow": self.workflow()})
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(len(result["images"]), 1)
+        self.assertGreaterEqual(elapsed, 1.0)
+        self.assertLess(processed_at[0] - start, 0.6)
+        # The executed events are enough, /history is not fetched
+        self.assertFalse([r for r in self.fake.requests if r[1].startswith("/history/")])
+
+    def test_history_is_an_optional_cross_check(self):
+        with patch.object(handler, "COMFY_VERIFY_HISTORY", True):
+            result = self.run_job({"workflow": _batch_workflow(2, save_nodes=2)})
+
+        self.assertEqual(len(result["images"]), 4)
+        self.assertEqual(len([r for r in self.fake.requests if r[1].startswith("/history/")]), 1)
+
+
+class TestJobTimings(HandlerTestCase):
+    fake_options = {"execution_time": 0.3}
+
+    def test_stage_timings_are_returned_on_request(self):
+        result = self.run_job({"workflow": _batch_workflow(2), "return_timings": True})
+
+        stages = result["timings"]["stages"]
+        for stage in ("check_server", "websocket_connect", "queue_gate", "queue", "execution"):
+            self.assertEqual(stages[stage]["count"], 1, stage)
+        # Input validation plus the local workflow check
+        self.assertGreaterEqual(stages["validation"]["count"], 1)
+        self.assertGreaterEqual(stages["wait_for_start"]["ms"] + stages["execution"]["ms"], 300)
+        self.assertEqual(stages["output_fetch"]["count"], 2)
+        self.assertEqual(stages["encode"]["count"], 2)
+        self.assertGreaterEqual(result["timings"]["total_ms"], stages["execution"]["ms"])
+
+    def test_timings_are_not_returned_by_default(self):
+        result = self.run_job({"workflow": _batch_workflow(1)})
+
+        self.assertEqual(len(result["images"]), 1)
+        self.assertNotIn("timings", result)
+
+
+class TestComfyHealth(HandlerTestCase):
+    def test_healthy_worker_does_not_probe_per_job(self):
+        for i in range(3):
+            result = self.run_job({"workflow": _batch_workflow(1)}, job_id=f"job-{i}")
+            self.assertEqual(len(result["images"]), 1)
+
+        # Only the readiness gate of the first job asked for "/"
+        self.assertEqual(self.fake.requests.count(("GET", "/")), 1)
+        self.assertEqual(handler.comfy_health.state, READY)
+
+    def test_job_fails_fast_when_comfyui_is_gone(self):
+        self.assertEqual(len(self.run_job({"workflow": _batch_workflow(1)})["images"]), 1)
+        self.fake.stop()
+        # A dead process also drops the keep-alive HTTP connections the fake still serves
+        handler.comfy_client.session.close()
+        # The websocket notices first: its reconnect gives up and records why
+        deadline = time.monotonic() + 10
+        while handler.comfy_health.state != UNHEALTHY and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(handler.comfy_health.state, UNHEALTHY)
+
+        start = time.monotonic()
+        result = self.run_job({"workflow": _batch_workflow(1)}, job_id="job-2")
+
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertIn(handler.comfy_health.reason, result["error"])
+
+    def test_unhealthy_state_recovers_when_comfyui_answers(self):
+        handler.comfy_health.mark_unhealthy("HTTP connection to ComfyUI failed")
+
+        result = self.run_job({"workflow": _batch_workflow(1)})
+
+        self.assertEqual(len(result["images"]), 1)
+        self.assertEqual(handler.comfy_health.stats()["failures"], 1)
+        self.assertEqual(handler.comfy_health.state, READY)
+
+
+class TestWebsocketRecovery(HandlerTestCase):
+    fake_options = {"execution_time": 0.3}
+
+    def setUp(self):
+        super().setUp()
+        for name, value in {"WEBSOCKET_RECONNECT_ATTEMPTS": 6, "WEBSOCKET_RECONNECT_DELAY_S": 0.2}.items():
+            patcher = patch.object(handler, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_with_outage(self, seconds, workflow):
+        def outage():
+            time.sleep(0.1)
+            self.fake.refuse_websockets(seconds)
+
+        threading.Thread(target=outage, daemon=True).start()
+        start = time.monotonic()
+        result = self.run_job({"workflow": workflow})
+        return result, time.monotonic() - start
+
+    def test_completion_during_the_gap_is_read_from_history(self):
+        # The prompt finishes (and its events are lost) while the websocket is down
+        result, elapsed = self.run_with_outage(0.6, _batch_workflow(2, save_nodes=2))
+
+        self.assertEqual(len(result["images"]), 4)
+        self.assertNotIn("errors", result)
+        self.assertLess(elapsed, 5)
+        self.assertTrue([r for r in self.fake.requests if r[1].startswith("/history/")])
+
+    def test_prompt_still_running_keeps_waiting_for_events(self):
+        self.fake.execution_time = 1.5
+
+        result, elapsed = self.run_with_outage(0.2, _batch_workflow(1))
+
+        self.assertEqual(len(result["images"]), 1)
+        self.assertIn(("GET", "/queue"), self.fake.requests)
+        self.assertGreaterEqual(elapsed, 1.5)
+
+
+class TestDeadlines(HandlerTestCase):
+    fake_options = {"execution_time": 3.0}
+
+    def test_running_prompt_is_interrupted_at_the_deadline(self):
+        start = time.monotonic()
+        result = self.run_job({"workflow": _batch_workflow(1), "deadline_ms": 500})
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(result["stage"], "execution")
+        self.assertEqual(result["reason"], "deadline")
+        self.assertEqual(result["error"], "Job deadline exceeded during execution")
+        self.assertEqual(self.fake.interrupted, 1)
+        self.assertLess(elapsed, 2.0)
+
+    def test_queued_prompt_is_deleted_without_interrupting_the_running_one(self):
+        self.fake.execution_time = 1.0
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            first = pool.submit(self.run_job, {"workflow": _batch_workflow(1)}, "job-1")
+            time.sleep(0.2)
+            second = pool.submit(
+                self.run_job, {"workflow": _batch_workflow(1), "deadline_ms": 300}, "job-2"
+            )
+            stopped = second.result()
+            finished = first.result()
+
+        self.assertEqual(stopped["stage"], "wait_for_start")
+        self.assertEqual(len(self.fake.deleted), 1)
+        self.assertEqual(self.fake.interrupted, 0)
+        self.assertEqual(len(finished["images"]), 1)
+
+    def test_worker_default_applies_and_invalid_values_are_rejected(self):
+        with patch.object(handler, "COMFY_JOB_DEADLINE_MS", 300):
+            result = self.run_job({"workflow": _batch_workflow(1)})
+        self.assertEqual(result["stage"], "execution")
+
+        result = self.run_job({"workflow": _batch_workflow(1), "deadline_ms": "soon"})
+        self.assertEqual(result["error"], "'deadline_ms' must be a positive integer")
+
+    def run_batched(self, stopped_input, stop=None):
+        """Run two jobs in one batch; the second one gets ``stopped_input``."""
+        self.fake.execution_time = 1.5
+        batcher = JobBatcher(0.3, 2, handler.run_batch)
+
+        def job(i, extra):
+            workflow = _batch_workflow(1)
+            workflow["1"]["inputs"]["seed"] = i
+            start = time.monotonic()
+            result = self.run_job({"workflow": workflow, **extra}, job_id=f"job-{i}")
+            return result, time.monotonic() - start
+
+        with patch.object(handler, "job_batcher", batcher):
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                kept = pool.submit(job, 0, {})
+                stopped = pool.submit(job, 1, stopped_input)
+                if stop:
+                    stop()
+                return kept.result(), stopped.result()
+
+    def test_batched_job_stops_at_its_deadline(self):
+        (kept, _), (stopped, elapsed) = self.run_batched({"deadline_ms": 500})
+
+        self.assertEqual(stopped["reason"], "deadline")
+        self.assertIn(stopped["stage"], ("wait_for_start", "execution"))
+        self.assertLess(elapsed, 1.0)
+        # The shared prompt kept running for the other job
+        self.assertEqual(len(kept["images"]), 1)
+        self.assertEqual((self.fake.interrupted, self.fake.deleted), (0, []))
+
+    def test_cancelled_batched_job_stops_waiting(self):
+        def cancel():
+            time.sleep(0.6)
+            handler.cancel_job("job-1")
+
+        (kept, _), (stopped, elapsed) = self.run_batched({}, stop=cancel)
+
+        self.assertEqual(stopped["reason"], "cancelled")
+        self.assertIn(stopped["stage"], ("wait_for_start", "execution"))
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(len(kept["images"]), 1)
+        self.assertEqual(self.fake.interrupted, 0)
+
+    def test_cancelled_job_interrupts_its_prompt(self):
+        async def cancel_after(seconds):
+            task = asyncio.ensure_future(
+                handler.async_handler({"id": "job-1", "input": {"workflow": _batch_workflow(1)}})
+            )
+            await asyncio.sleep(seconds)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        start = time.monotonic()
+        asyncio.run(cancel_after(0.5))
+        # The job's thread stops the prompt after the coroutine was cancelled
+        while handler.running_jobs and time.monotonic() - start < 5:
+            time.sleep(0.05)
+
+        self.assertEqual(handler.running_jobs, {})
+        self.assertEqual(self.fake.interrupted, 1)
+        self.assertLess(time.monotonic() - start, 2.0)
+
+
+class TestMetrics(HandlerTestCase):
+    def test_job_updates_the_metrics(self):
+        workflow = _batch_workflow(2)
+        label = handler._workflow_label({"template": None, "workflow": workflow})
+        view_bytes = handler.transfer_bytes.value(direction="download", peer="comfyui")
+        jobs = handler.job_duration.count(workflow=label, status="ok")
+
+        with patch.object(handler, "COMFY_LOCAL_OUTPUTS", False):
+            result = self.run_job({"workflow": workflow})
+
+        self.assertEqual(len(result["images"]), 2)
+        self.assertEqual(handler.job_duration.count(workflow=label, status="ok"), jobs + 1)
+        self.assertEqual(
+            handler.job_stage_duration.count(stage="execution", workflow=label), jobs + 1
+        )
+        self.assertGreater(
+            handler.transfer_bytes.value(direction="download", peer="comfyui"), view_bytes
+        )
+        self.assertIn("worker_comfyui_queue_remaining 0\n", handler.metrics.render())
+
+    def test_client_workflows_share_one_label(self):
+        labels = {
+            handler._workflow_label({"template": None, "workflow": _batch_workflow(1, save_nodes=n)})
+            for n in (1, 2, 3)
+        }
+
+        self.assertEqual(labels, {"custom"})
+
+
+class TestOutputEncoding(HandlerTestCase):
+    def setUp(self):
+        buffer = io.BytesIO()
+        Image.linear_gradient("L").resize((512, 512)).convert("RGB").save(buffer, format="PNG")
+        self.fake_options = {"image_bytes": buffer.getvalue()}
+        super().setUp()
+
+    def test_outputs_are_reencoded_on_request(self):
+        result = self.run_job(
+            {"workflow": _batch_workflow(2), "output_format": "webp", "quality": 75, "max_size": 256}
+        )
+
+        self.assertEqual(
+            [image["filename"] for image in result["images"]],
+            ["ComfyUI_00001_.webp", "ComfyUI_00002_.webp"],
+        )
+        image = Image.open(io.BytesIO(base64.b64decode(result["images"][0]["data"])))
+        self.assertEqual((image.format, image.size), ("WEBP", (256, 256)))
+        encoding = result["images"][0]["encoding"]
+        self.assertEqual(encoding["bytes_in"], len(self.fake.image_bytes))
+        self.assertLess(encoding["bytes_out"], encoding["bytes_in"])
+
+    def test_outputs_are_untouched_by_default(self):
+        result = self.run_job({"workflow": _batch_workflow(1)})
+
+        self.assertEqual(base64.b64decode(result["images"][0]["data"]), self.fake.image_bytes)
+        self.assertNotIn("encoding", result["images"][0])
+
+    def test_invalid_options_are_rejected(self):
+        result = self.run_job({"workflow": _batch_workflow(1), "output_format": "bmp"})
+
+        self.assertEqual(result["error"], "'output_format' must be one of png, jpeg, webp, avif")
+        self.assertNotIn(("POST", "/prompt"), self.fake.requests)
+
+
+class TestWebsocketOutputs(HandlerTestCase):
+    fake_options = {"image_bytes": b"png-over-websocket"}
+
+    def test_images_arrive_without_disk_or_view(self):
+        workflow = _batch_workflow(3)
+        workflow["save0"]["class_type"] = "SaveImageWebsocket"
+
+        result = self.run_job({"workflow": workflow})
+
+        self.assertEqual(
+            [image["filename"] for image in result["images"]],
+            ["save0_00001.png", "save0_00002.png", "save0_00003.png"],
+        )
+        self.assertEqual(base64.b64decode(result["images"][0]["data"]), b"png-over-websocket")
+        self.assertNotIn(("GET", "/view"), self.fake.requests)
+        self.assertNotIn("errors", result)
+
+    def test_batched_jobs_get_their_own_frames(self):
+        batcher = JobBatcher(0.5, 2, handler.run_batch)
+
+        def job(seed):
+            workflow = _batch_workflow(1)
+            workflow["1"]["inputs"]["seed"] = seed
+            workflow["save0"]["class_type"] = "SaveImageWebsocket"
+            return self.run_job({"workflow": workflow}, job_id=f"job-{seed}")
+
+        with patch.object(handler, "job_batcher", batcher):
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                results = list(pool.map(job, [1, 2]))
+
+        self.assertEqual(self.fake.requests.count(("POST", "/prompt")), 1)
+        self.assertEqual([len(r["images"]) for r in results], [1, 1])
+
+
+class TestLocalOutputs(HandlerTestCase):
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.fake_options = {"output_dir": self.output_dir, "image_bytes": b"local-png"}
+        super().setUp()
+        patcher = patch.dict(handler.COMFY_IMAGE_DIRS, {"output": self.output_dir})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_outputs_are_read_from_disk(self):
+        result = self.run_job({"workflow": _batch_workflow(2)})
+
+        self.assertEqual(len(result["images"]), 2)
+        self.assertNotIn(("GET", "/view"), self.fake.requests)
+
+    def test_falls_back_to_view_when_file_is_missing(self):
+        data = handler.get_image_data("missing.png", "", "output")
+
+        self.assertEqual(data, b"local-png")
+        self.assertIn(("GET", "/view"), self.fake.requests)
+
+    def test_path_traversal_is_rejected(self):
+        secret = os.path.join(os.path.dirname(self.output_dir), "secret.png")
+        with open(secret, "wb") as f:
+            f.write(b"secret")
+        self.addCleanup(os.remove, secret)
+
+        self.assertIsNone(handler.resolve_local_image_path("../secret.png", "", "output"))
+        self.assertIsNone(handler.resolve_local_image_path("secret.png", "..", "output"))
+        self.assertIsNone(handler.resolve_local_image_path(secret, "", "output"))
+        self.assertIsNone(handler.resolve_local_image_path("x.png", "", "unknown"))
+
+    def test_s3_upload_streams_from_output_file(self):
+        s3 = FakeS3().start()
+        self.addCleanup(s3.stop)
+        env = {
+            "BUCKET_ENDPOINT_URL": s3.endpoint_url,
+            "BUCKET_ACCESS_KEY_ID": "test",
+            "BUCKET_SECRET_ACCESS_KEY": "test",
+        }
+        with patch.dict(os.environ, env):
+            s3_upload.reset_client()
+            self.addCleanup(s3_upload.reset_client)
+            result = self.run_job({"workflow": _batch_workflow(2)})
+
+        self.assertEqual([image["type"] for image in result["images"]], ["s3_url"] * 2)
+        self.assertEqual(list(s3.objects.values()), [b"local-png"] * 2)
+        self.assertNotIn(("GET", "/view"), self.fake.requests)
+
+
+class TestInputUpload(HandlerTestCase):
+    def test_images_are_uploaded_with_original_bytes(self):
+        images = [
+            {"name": f"input_{i}.png", "image": base64.b64encode(os.urandom(5000 + i)).decode()}
+            for i in range(3)
+        ]
+        images[1]["image"] = "data:image/png;base64," + images[1]["image"]
+
+        result = handler.upload_images(images)
+
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(
+            result["details"], [f"Successfully uploaded input_{i}.png" for i in range(3)]
+        )
+        self.assertEqual(
+            base64.b64encode(self.fake.uploads["input_0.png"]).decode(), images[0]["image"]
+        )
+        self.assertEqual(len(self.fake.uploads["input_2.png"]), 5002)
+
+    def test_errors_are_reported_per_image(self):
+        images = [
+            {"name": "good.png", "image": base64.b64encode(b"ok").decode()},
+            {"name": "bad.png", "image": "abc"},
+        ]
+
+        result = handler.upload_images(images)
+
+        self.assertEqual(result["status"], "error")
+        self.assertEqual(len(result["details"]), 1)
+        self.assertTrue(result["details"][0].startswith("Error decoding base64 for bad.png"))
+
+    def test_repeated_input_image_is_uploaded_once(self):
+        image = {"name": "ref.png", "image": base64.b64encode(b"reference").decode()}
+        workflow = _batch_workflow(1)
+        workflow["2"] = {"class_type": "LoadImage", "inputs": {"image": "ref.png"}}
+        # The fake does not write uploads to disk: use an in-memory index
+        cache = InputImageCache(os.path.join(tempfile.mkdtemp(), "missing"), 1024 * 1024)
+
+        with patch.object(handler, "input_cache", cache):
+            for job_id in ("job-1", "job-2"):
+                result = self.run_job(
+                    {"workflow": json.loads(json.dumps(workflow)), "images": [dict(image)]},
+                    job_id=job_id,
+                )
+                self.assertEqual(len(result["images"]), 1)
+
+        uploads = [r for r in self.fake.requests if r == ("POST", "/upload/image")]
+        self.assertEqual(len(uploads), 1)
+        self.assertEqual(list(self.fake.uploads.values()), [b"reference"])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_custom_loader_keeps_the_original_name(self):
+        image = {"name": "ref.png", "image": base64.b64encode(b"reference").decode()}
+        workflow = _batch_workflow(1)
+        workflow["2"] = {"class_type": "LoadImage", "inputs": {"image": "ref.png"}}
+        workflow["3"] = {"class_type": "CustomImageLoader", "inputs": {"filename": "ref.png"}}
+        cache = InputImageCache(os.path.join(tempfile.mkdtemp(), "missing"), 1024 * 1024)
+
+        with patch.object(handler, "input_cache", cache):
+            result = self.run_job({"workflow": workflow, "images": [image]})
+
+        self.assertEqual(len(result["images"]), 1)
+        cached_name = workflow["2"]["inputs"]["image"]
+        self.assertNotEqual(cached_name, "ref.png")
+        self.assertEqual(workflow["3"]["inputs"]["filename"], "ref.png")
+        self.assertEqual(sorted(self.fake.uploads), sorted([cached_name, "ref.png"]))
+        self.assertEqual(self.fake.uploads["ref.png"], b"reference")
+
+    def test_malformed_image_entries_are_rejected(self):
+        for image in ({"name": "a.png", "image": None}, {"name": 5, "image": "abc"}, "a.png"):
+            result = self.run_job({"workflow": _batch_workflow(1), "images": [image]})
+            self.assertEqual(
+                result, {"error": "'images' must be a list of objects with 'name' and 'image' keys"}
+            )
+
+
+class TestNetworkVolumeDiagnostics(HandlerTestCase):
+    def test_refresh_is_ignored_without_debug(self):
+        with patch.dict(os.environ, {"NETWORK_VOLUME_DEBUG": "false"}), patch.object(
+            handler, "run_network_volume_diagnostics"
+        ) as run:
+            result = self.run_job({"workflow": _batch_workflow(1), "refresh_diagnostics": True})
+
+        self.assertEqual(len(result["images"]), 1)
+        run.assert_not_called()
+
+    def test_refresh_runs_off_the_job_path(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow_diagnostics(model_index):
+            started.set()
+            release.wait(5)
+
+        with patch.dict(os.environ, {"NETWORK_VOLUME_DEBUG": "true"}), patch.object(
+            handler, "run_network_volume_diagnostics", side_effect=slow_diagnostics
+        ) as run:
+            try:
+                for job_id in ("job-1", "job-2"):
+                    result = self.run_job(
+                        {"workflow": _batch_workflow(1), "refresh_diagnostics": True}, job_id=job_id
+                    )
+                    self.assertEqual(len(result["images"]), 1)
+                self.assertTrue(started.wait(5))
+            finally:
+                release.set()
+
+        # The second job found the first refresh still running
+        self.assertEqual(run.call_count, 1)
+
+
+class TestBatching(HandlerTestCase):
+    def test_compatible_jobs_run_as_one_prompt(self):
+        batcher = JobBatcher(0.5, 3, handler.run_batch)
+
+        def job(i):
+            workflow = _batch_workflow(1)
+            workflow["1"]["inputs"]["seed"] = i
+            return self.run_job({"workflow": workflow}, job_id=f"job-{i}")
+
+        with patch.object(handler, "job_batcher", batcher):
+            with ThreadPoolExecutor(max_workers=3) as pool:
+                results = list(pool.map(job, range(3)))
+
+        self.assertEqual(self.fake.requests.count(("POST", "/prompt")), 1)
+        filenames = [r["images"][0]["filename"] for r in results]
+        self.assertEqual(len(set(filenames)), 3)
+        self.assertEqual(batcher.stats()["mean_batch_size"], 3)
+
+
+class TestStreaming(HandlerTestCase):
+    def setUp(self):
+        buffer = io.BytesIO()
+        Image.new("RGB", (512, 512), "orange").save(buffer, format="PNG")
+        self.fake_options = {"preview_bytes": buffer.getvalue()}
+        super().setUp()
+        patcher = patch.object(handler, "COMFY_PROGRESS_INTERVAL_MS", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def stream(self, job_input):
+        workflow = _batch_workflow(1)
+        workflow["2"] = {"class_type": "KSampler", "inputs": {"latent_image": ["1", 0], "steps": 3}}
+        return list(handler.stream_handler({"id": "job-1", "input": {"workflow": workflow, **job_input}}))
+
+    def test_progress_is_yielded_before_the_result(self):
+        *updates, result = self.stream({})
+
+        self.assertEqual(len(result["images"]), 1)
+        running = [u for u in updates if u["status"] == "running"]
+        steps = [u["step"] for u in running if u["class_type"] == "KSampler" and "step" in u]
+        self.assertEqual(steps, [1, 2, 3])
+        self.assertTrue(all("preview" not in u for u in running))
+        # The image is announced as soon as its node finished; its base64 data is only in the result
+        self.assertEqual(
+            [u for u in updates if u["status"] == "output"],
+            [
+                {
+                    "status": "output",
+                    "node": "save0",
+                    "images": [{"filename": result["images"][0]["filename"], "type": "base64"}],
+                }
+            ],
+        )
+        self.assertTrue(result["images"][0]["data"])
+
+    def test_previews_are_opt_in(self):
+        *updates, result = self.stream({"stream_previews": True})
+
+        previews = [u["preview"] for u in updates if "preview" in u]
+        self.assertEqual(len(previews), 3)
+        image = Image.open(io.BytesIO(base64.b64decode(previews[0])))
+        self.assertEqual(image.size, (handler.COMFY_PREVIEW_MAX_SIZE, handler.COMFY_PREVIEW_MAX_SIZE))
+
+    def test_invalid_job_yields_only_the_error(self):
+        self.assertEqual(
+            list(handler.stream_handler({"id": "job-1", "input": {}})),
+            [{"error": "Missing 'workflow' parameter"}],
+        )
+
+
+class TestWorkflowValidation(HandlerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fake.object_info = {
+            "EmptySD3LatentImage": {
+                "input": {"required": {"batch_size": ["INT", {"min": 1, "max": 4096}]}},
+                "output": ["LATENT"],
+            },
+            "SaveImage": {
+                "input": {"required": {"images": ["*", {}]}},
+                "output": [],
+                "output_node": True,
+            },
+        }
+
+    def test_workflow_that_is_not_a_graph_is_rejected(self):
+        for workflow in ("not a graph", [1, 2], {"1": "SaveImage"}):
+            self.assertEqual(
+                self.run_job({"workflow": workflow}),
+                {"error": "'workflow' must be an object mapping node ids to nodes (API format)"},
+            )
+
+    def test_errors_before_queueing_are_returned(self):
+        with patch.object(handler, "validate_workflow_locally", side_effect=RuntimeError("boom")):
+            result = self.run_job({"workflow": _batch_workflow(1)})
+
+        self.assertEqual(result, {"error": "An unexpected error occurred: boom"})
+
+    def test_invalid_workflow_is_rejected_before_queueing(self):
+        result = self.run_job({"workflow": _batch_workflow(5000)})
+
+        self.assertEqual(
+            result["error"],
+            "Workflow validation failed:\n"
+            "• Node 1 (EmptySD3LatentImage): Value 5000 bigger than max of 4096: batch_size",
+        )
+        self.assertNotIn(("POST", "/prompt"), self.fake.requests)
+
+    def test_schema_is_fetched_once(self):
+        for job_id in ("job-1", "job-2"):
+            result = self.run_job({"workflow": _batch_workflow(1)}, job_id=job_id)
+            self.assertEqual(len(result["images"]), 1)
+
+        self.assertEqual(self.fake.requests.count(("GET", "/object_info")), 1)
+
+    def test_template_jobs_send_only_params(self):
+        template = WorkflowTemplate(
+            "batch",
+            {
+                "params": {
+                    "batch_size": {
+                        "type": "int",
+                        "targets": [{"node": "1", "input": "batch_size"}],
+                    }
+                },
+                "workflow": _batch_workflow(1),
+            },
+        )
+        with patch.dict(handler.workflow_templates, {"batch": template}):
+            result = self.run_job({"template": "batch", "params": {"batch_size": 3}})
+            self.assertEqual(len(result["images"]), 3)
+            self.assertEqual(template.validated_with, handler.object_info_cache.fetches)
+
+            # Only the parameter nodes are checked again, and still rejected
+            result = self.run_job({"template": "batch", "params": {"batch_size": 5000}})
+            self.assertIn("bigger than max of 4096: batch_size", result["error"])
+
+            result = self.run_job({"template": "other"})
+            self.assertEqual(result["error"], "Unknown template 'other'. Available templates: batch")
+
+
+class TestWarmup(HandlerTestCase):
+    def test_warmup_runs_a_tiny_prompt_and_records_phases(self):
+        workflow = _batch_workflow(1)
+        workflow["2"] = {"class_type": "KSampler", "inputs": {"latent_image": ["1", 0], "steps": 20}}
+        workflow["save0"]["inputs"]["images"] = ["2", 0]
+        template = WorkflowTemplate(
+            "sampler",
+            {
+                "params": {
+                    "steps": {"type": "int", "targets": [{"node": "2", "input": "steps"}]}
+                },
+                "workflow": workflow,
+            },
+        )
+        with patch.dict(handler.workflow_templates, {"sampler": template}), patch.object(
+            handler, "COMFY_WARMUP_TEMPLATE", "sampler"
+        ), patch.object(handler, "COMFY_WARMUP_PARAMS", {"steps": 1, "width": 64}):
+            report = handler.run_warmup()
+
+        self.assertIsNone(report["error"])
+        self.assertEqual(
+            [p["phase"] for p in report["phases"]],
+            ["server_up", "models_loaded", "first_sample", "done"],
+        )
+        self.assertEqual(report["total_ms"], report["phases"][-1]["at_ms"])
+        self.assertEqual(self.fake.requests.count(("POST", "/prompt")), 1)
+        # The warm-up image is only previewed, nothing lands in the output directory
+        self.assertEqual(list(self.fake.history.values())[0]["outputs"], {})
+
+    def test_warmup_that_hangs_is_interrupted(self):
+        self.fake.execution_time = 5.0
+        template = WorkflowTemplate("slow", {"params": {}, "workflow": _batch_workflow(1)})
+        with patch.dict(handler.workflow_templates, {"slow": template}), patch.object(
+            handler, "COMFY_WARMUP_TEMPLATE", "slow"
+        ), patch.object(handler, "COMFY_WARMUP_TIMEOUT_S", 0.5):
+            start = time.monotonic()
+            report = handler.run_warmup()
+            elapsed = time.monotonic() - start
+
+        self.assertEqual(report["error"], "Warm-up timed out after 0.5 s during execution")
+        self.assertEqual(self.fake.interrupted, 1)
+        self.assertLess(elapsed, 3.0)
+
+    def test_failed_warmup_is_reported(self):
+        with patch.object(handler, "COMFY_WARMUP_TEMPLATE", "missing"):
+            report = handler.run_warmup()
+
+        self.assertEqual(report["error"], "Unknown workflow template 'missing'")
+        self.assertEqual(report["phases"], [])
+        self.assertNotIn(("POST", "/prompt"), self.fake.requests)
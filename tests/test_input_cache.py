@@ -0,0 +1,117 @@
+import unittest
+import sys
+import os
+import base64
+import shutil
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+from input_cache import InputImageCache, payload_digest, rewrite_image_names, unrewritten_names
+
+
+def _image(name, data):
+    return {"name": name, "image": base64.b64encode(data).decode()}
+
+
+class TestInputImageCache(unittest.TestCase):
+    def setUp(self):
+        self.input_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.input_dir)
+
+    def _store(self, cache, name, size):
+        with open(os.path.join(self.input_dir, name), "wb") as f:
+            f.write(b"x" * size)
+        cache.add(name, size)
+
+    def test_digest_ignores_data_uri_prefix(self):
+        raw = base64.b64encode(b"same image").decode()
+
+        self.assertEqual(payload_digest(raw), payload_digest("data:image/png;base64," + raw))
+        self.assertNotEqual(payload_digest(raw), payload_digest(raw[:-4]))
+
+    def test_prepare_renames_and_rewrites_workflow(self):
+        cache = InputImageCache(self.input_dir, 1024)
+        workflow = {"1": {"class_type": "LoadImage", "inputs": {"image": "ref.png"}}}
+
+        prepared, renamed = cache.prepare([_image("ref.png", b"abc")])
+        rewrite_image_names(workflow, renamed)
+
+        self.assertEqual(prepared[0]["original_name"], "ref.png")
+        self.assertRegex(prepared[0]["name"], r"^[0-9a-f]{32}\.png$")
+        self.assertEqual(workflow["1"]["inputs"]["image"], prepared[0]["name"])
+
+    def test_only_image_loader_inputs_are_rewritten(self):
+        workflow = {
+            "1": {"class_type": "LoadImageMask", "inputs": {"image": "ref.png", "channel": "alpha"}},
+            "2": {"class_type": "CLIPTextEncode", "inputs": {"text": "ref.png"}},
+            "3": {"class_type": "SaveImage", "inputs": {"filename_prefix": "ref.png"}},
+        }
+
+        rewrite_image_names(workflow, {"ref.png": "0" * 32 + ".png"})
+
+        self.assertEqual(workflow["1"]["inputs"]["image"], "0" * 32 + ".png")
+        self.assertEqual(workflow["2"]["inputs"]["text"], "ref.png")
+        self.assertEqual(workflow["3"]["inputs"]["filename_prefix"], "ref.png")
+
+    def test_image_upload_inputs_from_object_info_are_rewritten(self):
+        object_info = {
+            "LoadImageFromUpload": {
+                "input": {
+                    "required": {"picture": ["COMBO", {"options": [], "image_upload": True}]},
+                    "optional": {"caption": ["STRING", {}]},
+                }
+            }
+        }
+        workflow = {
+            "1": {"class_type": "LoadImageFromUpload", "inputs": {"picture": "ref.png", "caption": "ref.png"}},
+        }
+
+        rewrite_image_names(workflow, {"ref.png": "0" * 32 + ".png"}, object_info)
+
+        self.assertEqual(workflow["1"]["inputs"], {"picture": "0" * 32 + ".png", "caption": "ref.png"})
+
+    def test_unrewritten_names(self):
+        renamed = {"ref.png": "0" * 32 + ".png", "mask.png": "1" * 32 + ".png"}
+        workflow = {
+            "1": {"class_type": "LoadImage", "inputs": {"image": "mask.png"}},
+            "2": {"class_type": "CustomImageLoader", "inputs": {"path": "ref.png"}},
+        }
+
+        rewrite_image_names(workflow, renamed)
+
+        self.assertEqual(unrewritten_names(workflow, renamed), {"ref.png"})
+
+    def test_least_recently_used_unpinned_images_are_evicted(self):
+        cache = InputImageCache(self.input_dir, 250)
+        names = [f"{c * 32}.png" for c in "abc"]
+        cache.pin([names[0]])
+        for name in names:
+            self._store(cache, name, 100)
+
+        # a is pinned, so b is evicted instead
+        self.assertTrue(cache.contains(names[0]))
+        self.assertFalse(cache.contains(names[1]))
+        self.assertFalse(os.path.exists(os.path.join(self.input_dir, names[1])))
+        self.assertEqual(cache.total_bytes, 200)
+
+        cache.unpin([names[0]])
+        self._store(cache, "d" * 32 + ".png", 100)
+        # a was used more recently than c, so c goes next
+        self.assertTrue(cache.contains(names[0]))
+        self.assertFalse(cache.contains(names[2]))
+
+    def test_index_is_rebuilt_from_input_dir(self):
+        cache = InputImageCache(self.input_dir, 1024)
+        self._store(cache, "e" * 32 + ".png", 10)
+        with open(os.path.join(self.input_dir, "user_upload.png"), "wb") as f:
+            f.write(b"not cached")
+
+        reloaded = InputImageCache(self.input_dir, 1024)
+
+        self.assertTrue(reloaded.contains("e" * 32 + ".png"))
+        self.assertFalse(reloaded.contains("user_upload.png"))
+        self.assertEqual(reloaded.total_bytes, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
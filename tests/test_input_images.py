@@ -0,0 +1,57 @@
+import unittest
+import sys
+import os
+import base64
+import binascii
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+import input_images
+from input_images import MultipartImageBody
+
+
+def _read_all(body, block=1000):
+    chunks = []
+    while True:
+        chunk = body.read(block)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+
+
+class TestMultipartImageBody(unittest.TestCase):
+    def setUp(self):
+        self.image = os.urandom(200_001)
+        self.encoded = base64.b64encode(self.image).decode()
+
+    def test_streams_decoded_image(self):
+        body = MultipartImageBody("a.png", self.encoded, fields={"overwrite": "true"})
+        data = _read_all(body)
+
+        self.assertEqual(len(data), len(body))
+        self.assertIn(self.image, data)
+        self.assertIn(b'name="overwrite"\r\n\r\ntrue\r\n', data)
+        self.assertTrue(data.endswith(b"--\r\n"))
+
+    def test_decodes_lazily_in_chunks(self):
+        body = MultipartImageBody("a.png", "data:image/png;base64," + self.encoded)
+        self.assertIsNone(body._decoded)
+        self.assertEqual(body.image_size, len(self.image))
+        self.assertIn(self.image, _read_all(body, block=input_images.DECODE_CHUNK_CHARS // 3))
+
+    def test_rewind_resends_the_same_body(self):
+        body = MultipartImageBody("a.png", self.encoded)
+        first = _read_all(body)
+        body.seek(0)
+        self.assertEqual(_read_all(body), first)
+
+    def test_non_canonical_base64_falls_back_to_full_decode(self):
+        wrapped = "\n".join(
+            self.encoded[i : i + 76] for i in range(0, len(self.encoded), 76)
+        )
+        body = MultipartImageBody("a.png", wrapped)
+        self.assertIsNotNone(body._decoded)
+        self.assertIn(self.image, _read_all(body))
+
+    def test_invalid_base64_raises(self):
+        with self.assertRaises(binascii.Error):
+            MultipartImageBody("a.png", "abc")
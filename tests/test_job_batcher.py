@@ -0,0 +1,121 @@
+import unittest
+import sys
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+from job_batcher import JobBatcher, batch_key, merge_workflows, split_outputs
+from job_deadline import CANCELLED, DEADLINE, DeadlineExceeded, JobDeadline
+
+VARYING = ["seed", "text"]
+
+
+def _workflow(seed, text="a cat"):
+    return {
+        "1": {"class_type": "UNETLoader", "inputs": {"unet_name": "z_image.safetensors"}},
+        "2": {"class_type": "CLIPTextEncode", "inputs": {"text": text}},
+        "3": {"class_type": "KSampler", "inputs": {"model": ["1", 0], "positive": ["2", 0], "seed": seed}},
+        "4": {"class_type": "SaveImage", "inputs": {"images": ["3", 0]}},
+    }
+
+
+def _is_output(class_type):
+    return class_type == "SaveImage"
+
+
+class TestMerge(unittest.TestCase):
+    def test_key_ignores_varying_inputs_only(self):
+        self.assertEqual(batch_key(_workflow(1, "a cat"), VARYING), batch_key(_workflow(2, "a dog"), VARYING))
+
+        other_model = _workflow(1)
+        other_model["1"]["inputs"]["unet_name"] = "other.safetensors"
+        self.assertNotEqual(batch_key(_workflow(1), VARYING), batch_key(other_model, VARYING))
+
+    def test_identical_upstream_nodes_are_shared(self):
+        merged, owners = merge_workflows([_workflow(1), _workflow(2), _workflow(2)], _is_output)
+
+        # One loader and one text encoder; a sampler per distinct seed; a SaveImage per job
+        classes = sorted(node["class_type"] for node in merged.values())
+        self.assertEqual(
+            classes, ["CLIPTextEncode", "KSampler", "KSampler", "SaveImage", "SaveImage", "SaveImage", "UNETLoader"]
+        )
+        self.assertEqual(merged["1:3"]["inputs"]["model"], ["0:1", 0])
+        self.assertEqual(merged["2:4"]["inputs"]["images"], ["1:3", 0])
+        self.assertEqual(owners, {"0:4": (0, "4"), "1:4": (1, "4"), "2:4": (2, "4")})
+
+    def test_outputs_are_split_by_job(self):
+        _, owners = merge_workflows([_workflow(1), _workflow(2)], _is_output)
+        outputs = {"0:4": {"images": ["a"]}, "1:4": {"images": ["b"]}, "0:1": {"text": ["x"]}}
+
+        self.assertEqual(
+            split_outputs(outputs, owners, 2), [{"4": {"images": ["a"]}}, {"4": {"images": ["b"]}}]
+        )
+        self.assertEqual(split_outputs(None, owners, 2), [None, None])
+
+
+class TestJobBatcher(unittest.TestCase):
+    def test_concurrent_jobs_share_one_run(self):
+        runs = []
+        batcher = JobBatcher(0.5, 3, lambda items: runs.append(list(items)) or [i * 10 for i in items])
+
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            results = list(pool.map(lambda i: batcher.submit("key", i), [1, 2, 3]))
+
+        self.assertEqual(results, [10, 20, 30])
+        self.assertEqual(len(runs), 1)
+        stats = batcher.stats()
+        self.assertEqual((stats["batches"], stats["jobs"]), (1, 3))
+        # The batch was full before the window ended
+        self.assertLess(stats["max_wait_ms"], 500)
+
+    def test_errors_reach_every_job(self):
+        release = threading.Event()
+
+        def run(items):
+            release.wait(1)
+            raise RuntimeError("ComfyUI lost")
+
+        batcher = JobBatcher(0.1, 2, run)
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            futures = [pool.submit(batcher.submit, "key", i) for i in range(2)]
+            release.set()
+            for future in futures:
+                with self.assertRaises(RuntimeError):
+                    future.result()
+
+    def test_job_out_of_time_stops_waiting_while_the_batch_runs_on(self):
+        release, finished = threading.Event(), []
+
+        def run(items):
+            release.wait(2)
+            finished.append(list(items))
+            return items
+
+        batcher = JobBatcher(0.05, 2, run)
+        late, cancelled = JobDeadline(60), JobDeadline(0.2)
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            waiting = pool.submit(batcher.submit, "key", "a", late, lambda: "execution")
+            stopped = pool.submit(batcher.submit, "key", "b", cancelled, lambda: "execution")
+            with self.assertRaises(DeadlineExceeded) as raised:
+                stopped.result(timeout=1)
+            self.assertEqual((raised.exception.reason, raised.exception.stage), (DEADLINE, "execution"))
+
+            late.cancel()
+            with self.assertRaises(DeadlineExceeded) as raised:
+                waiting.result(timeout=1)
+            self.assertEqual(raised.exception.reason, CANCELLED)
+            self.assertFalse(release.is_set())
+
+        # The batch itself is not stopped by jobs that gave up on it
+        release.set()
+        for _ in range(100):
+            if finished:
+                break
+            time.sleep(0.01)
+        self.assertEqual(finished, [["a", "b"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import sys
+import os
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+from job_deadline import CANCELLED, DEADLINE, DeadlineExceeded, JobDeadline, SharedDeadline
+
+
+class TestJobDeadline(unittest.TestCase):
+    def test_no_limit_never_expires(self):
+        deadline = JobDeadline()
+
+        self.assertIsNone(deadline.remaining())
+        self.assertIsNone(deadline.exceeded())
+        deadline.check("queue")
+
+    def test_expired_deadline_names_the_stage(self):
+        deadline = JobDeadline(0.05)
+        self.assertGreater(deadline.remaining(), 0)
+        time.sleep(0.06)
+
+        with self.assertRaises(DeadlineExceeded) as raised:
+            deadline.check("execution")
+
+        self.assertEqual((raised.exception.stage, raised.exception.reason), ("execution", DEADLINE))
+        self.assertEqual(str(raised.exception), "Job deadline exceeded during execution")
+        self.assertEqual(deadline.remaining(), 0)
+
+    def test_timeout_counts_from_the_job_start(self):
+        deadline = JobDeadline()
+        time.sleep(0.05)
+        deadline.set_timeout(0.04)
+
+        self.assertEqual(deadline.exceeded(), DEADLINE)
+
+    def test_cancel_wakes_callbacks_once(self):
+        deadline = JobDeadline(60)
+        calls = []
+        deadline.on_cancel(lambda: calls.append("waiter"))
+
+        deadline.cancel()
+        deadline.cancel()
+        deadline.on_cancel(lambda: calls.append("late"))
+
+        self.assertEqual(calls, ["waiter", "late"])
+        self.assertEqual(deadline.exceeded(), CANCELLED)
+        self.assertEqual(deadline.remaining(), 0)
+
+
+class TestSharedDeadline(unittest.TestCase):
+    def test_prompt_stops_only_when_every_job_stopped(self):
+        first, second = JobDeadline(), JobDeadline(0.01)
+        shared = SharedDeadline([first, second])
+        calls = []
+        shared.on_cancel(lambda: calls.append("stop"))
+        time.sleep(0.02)
+
+        second.cancel()
+        self.assertIsNone(shared.remaining())
+        self.assertIsNone(shared.exceeded())
+        self.assertEqual(calls, [])
+
+        first.cancel()
+        self.assertEqual(calls, ["stop"])
+        self.assertEqual(shared.exceeded(), CANCELLED)
+
+    def test_mixed_reasons_report_the_deadline(self):
+        first, second = JobDeadline(0.01), JobDeadline(0.01)
+        time.sleep(0.02)
+        first.cancel()
+
+        with self.assertRaises(DeadlineExceeded) as raised:
+            SharedDeadline([first, second]).check("execution")
+
+        self.assertEqual(raised.exception.reason, DEADLINE)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import sys
+import os
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+from job_timings import JobTimings
+
+
+class TestJobTimings(unittest.TestCase):
+    def test_stages_are_aggregated_in_order_of_first_use(self):
+        timings = JobTimings()
+        with timings.stage("queue"):
+            time.sleep(0.02)
+        timings.add("output_fetch", 0.010)
+        timings.add("output_fetch", 0.030)
+
+        report = timings.report()
+
+        self.assertEqual(list(report["stages"]), ["queue", "output_fetch"])
+        self.assertGreaterEqual(report["stages"]["queue"]["ms"], 20)
+        self.assertEqual(report["stages"]["output_fetch"], {"ms": 40.0, "count": 2, "max_ms": 30.0})
+        self.assertGreaterEqual(report["total_ms"], report["stages"]["queue"]["ms"])
+
+    def test_failed_stage_is_still_recorded(self):
+        timings = JobTimings()
+        with self.assertRaises(ValueError):
+            with timings.stage("history"):
+                raise ValueError("boom")
+
+        self.assertEqual(timings.report()["stages"]["history"]["count"], 1)
+
+    def test_merge_adds_a_shared_prompt(self):
+        prompt = JobTimings()
+        prompt.add("execution", 2.0)
+        job = JobTimings()
+        job.add("execution", 0.5)
+        job.add("encode", 0.1)
+
+        job.merge(prompt)
+
+        stages = job.report()["stages"]
+        self.assertEqual(stages["execution"], {"ms": 2500.0, "count": 2, "max_ms": 2000.0})
+        self.assertEqual(stages["encode"]["count"], 1)
+
+    def test_concurrent_stages_are_all_counted(self):
+        timings = JobTimings()
+
+        def work():
+            for _ in range(100):
+                timings.add("encode", 0.001)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(timings.report()["stages"]["encode"]["count"], 800)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+import sys
+import os
+import tempfile
+import urllib.request
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+from metrics import MetricsRegistry, TextfileExporter, start_http_server
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def test_counters_and_gauges_render_in_text_format(self):
+        registry = MetricsRegistry()
+        reconnects = registry.counter("reconnects_total", "Reconnects.", ("result",))
+        registry.gauge("queue_remaining", "Queue.", callback=lambda: 3)
+        registry.gauge("unknown", "Not reported yet.", callback=lambda: None)
+        reconnects.inc(result="reconnected")
+        reconnects.inc(2, result="failed")
+
+        text = registry.render()
+
+        self.assertIn("# TYPE reconnects_total counter\n", text)
+        self.assertIn('reconnects_total{result="reconnected"} 1\n', text)
+        self.assertIn('reconnects_total{result="failed"} 2\n', text)
+        self.assertIn("queue_remaining 3\n", text)
+        self.assertNotIn("\nunknown ", text)
+        self.assertTrue(text.endswith("\n"))
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = MetricsRegistry()
+        latency = registry.histogram("stage_seconds", "Stage.", ("stage",), buckets=(0.1, 1))
+        for value in (0.05, 0.5, 0.7, 5):
+            latency.observe(value, stage="execution")
+
+        text = registry.render()
+
+        self.assertIn('stage_seconds_bucket{stage="execution",le="0.1"} 1\n', text)
+        self.assertIn('stage_seconds_bucket{stage="execution",le="1"} 3\n', text)
+        self.assertIn('stage_seconds_bucket{stage="execution",le="+Inf"} 4\n', text)
+        self.assertIn('stage_seconds_sum{stage="execution"} 6.25\n', text)
+        self.assertIn('stage_seconds_count{stage="execution"} 4\n', text)
+        self.assertEqual(latency.count(stage="execution"), 4)
+
+    def test_label_values_are_escaped_and_names_checked(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("jobs_total", "Jobs.", ("workflow",))
+        counter.inc(workflow='a "b"\\c')
+
+        self.assertIn('jobs_total{workflow="a \\"b\\"\\\\c"} 1', registry.render())
+        with self.assertRaises(ValueError):
+            counter.inc(template="x")
+
+
+class TestExporters(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.registry.counter("jobs_total", "Jobs.").inc()
+
+    def test_http_server_serves_metrics(self):
+        # Local only unless a wider interface is asked for
+        server = start_http_server(self.registry, 0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.assertEqual(server.server_address[0], "127.0.0.1")
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+
+        with urllib.request.urlopen(url, timeout=5) as response:
+            body = response.read().decode()
+            content_type = response.headers["Content-Type"]
+
+        self.assertIn("jobs_total 1\n", body)
+        self.assertTrue(content_type.startswith("text/plain; version=0.0.4"))
+
+    def test_textfile_is_replaced_atomically(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "textfile", "worker.prom")
+            exporter = TextfileExporter(self.registry, path, 60).start()
+            exporter.stop()
+
+            with open(path) as f:
+                self.assertIn("jobs_total 1\n", f.read())
+            self.assertEqual(os.listdir(os.path.dirname(path)), ["worker.prom"])
+
+
+if __name__ == "__main__":
+    unittest.main()
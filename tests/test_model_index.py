@@ -0,0 +1,93 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+from model_index import ModelIndex, load_model_folders
+
+
+class TestModelIndex(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.index_path = os.path.join(self.root, "index", "model_index.json")
+        self.folders = {
+            "loras": [self._dir("models/loras")],
+            "diffusion_models": [self._dir("models/diffusion_models")],
+        }
+
+    def _dir(self, path):
+        path = os.path.join(self.root, path)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _file(self, path, size=1):
+        with open(os.path.join(self.root, path), "wb") as f:
+            f.write(b"x" * size)
+
+    def test_folders_are_read_from_extra_model_paths(self):
+        config = os.path.join(self.root, "extra_model_paths.yaml")
+        with open(config, "w") as f:
+            f.write(
+                "runpod_worker_comfy:\n"
+                "  base_path: /runpod-volume\n"
+                "  is_default: true\n"
+                "  loras: models/loras/\n"
+                "  text_encoders: |\n"
+                "    models/text_encoders/\n"
+                "    models/clip/\n"
+                "  hunyuan: models/\n"
+            )
+
+        self.assertEqual(
+            load_model_folders(config),
+            {
+                "loras": ["/runpod-volume/models/loras"],
+                "text_encoders": ["/runpod-volume/models/text_encoders", "/runpod-volume/models/clip"],
+                "hunyuan": ["/runpod-volume/models"],
+            },
+        )
+
+    def test_models_are_indexed_with_subfolders(self):
+        self._dir("models/loras/styles")
+        self._file("models/loras/a.safetensors", 3)
+        self._file("models/loras/styles/b.safetensors", 5)
+        self._file("models/diffusion_models/z_image.safetensors")
+
+        index = ModelIndex(self.folders, self.index_path)
+        index.refresh()
+
+        self.assertEqual(index.names("loras"), ["a.safetensors", "styles/b.safetensors"])
+        entry = index.lookup("styles\\b.safetensors")
+        self.assertEqual((entry["type"], entry["size"]), ("loras", 5))
+        self.assertEqual(index.lookup("z_image.safetensors")["type"], "diffusion_models")
+        self.assertIsNone(index.lookup("a.safetensors", "diffusion_models"))
+
+    def test_unchanged_folders_are_not_listed_again(self):
+        for i in range(2000):
+            self._file(f"models/loras/lora_{i}.safetensors")
+        index = ModelIndex(self.folders, self.index_path)
+        self.assertEqual(index.refresh()["dirs_scanned"], 2)
+
+        stats = index.refresh()
+        self.assertEqual((stats["dirs_scanned"], stats["files"]), (0, 2000))
+
+        self._file("models/loras/new.safetensors")
+        stats = index.refresh()
+        self.assertEqual((stats["dirs_scanned"], stats["files"]), (1, 2001))
+
+    def test_index_is_persisted(self):
+        self._file("models/loras/a.safetensors")
+        ModelIndex(self.folders, self.index_path).refresh()
+
+        index = ModelIndex(self.folders, self.index_path)
+        stats = index.refresh()
+
+        self.assertEqual(stats["dirs_scanned"], 0)
+        self.assertEqual(index.names("loras"), ["a.safetensors"])
+
+
+if __name__ == "__main__":
+    unittest.main()
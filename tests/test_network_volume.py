@@ -0,0 +1,66 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+import io
+import shutil
+import tempfile
+from contextlib import redirect_stdout
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+import network_volume
+
+
+class TestNetworkVolumeDiagnostics(unittest.TestCase):
+    def setUp(self):
+        self.volume = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.volume)
+        loras = os.path.join(self.volume, "models", "loras")
+        os.makedirs(loras)
+        with open(os.path.join(loras, "style.safetensors"), "wb") as f:
+            f.write(b"x" * 10)
+        with open(os.path.join(loras, "notes.txt"), "w") as f:
+            f.write("not a model")
+
+        patches = [
+            patch.object(network_volume, "RUNPOD_VOLUME", self.volume),
+            patch.object(network_volume, "ROOT_LISTING_DEPTH", 0),
+            patch.object(network_volume, "_report", None),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_report_is_structured(self):
+        report = network_volume.collect_network_volume_diagnostics()
+
+        self.assertTrue(report["volume"]["mounted"])
+        self.assertTrue(report["found_any_models"])
+        self.assertEqual(report["models"]["checkpoints"]["status"], "missing")
+        self.assertEqual(
+            sorted(report["models"]["loras"]["files"], key=lambda f: f["name"]),
+            [
+                {"name": "notes.txt", "size": 11, "valid": False},
+                {"name": "style.safetensors", "size": 10, "valid": True},
+            ],
+        )
+
+    def test_report_is_cached_until_refreshed(self):
+        with redirect_stdout(io.StringIO()) as out, patch.object(
+            network_volume,
+            "collect_network_volume_diagnostics",
+            wraps=network_volume.collect_network_volume_diagnostics,
+        ) as collect:
+            first = network_volume.get_network_volume_diagnostics()
+            self.assertIs(network_volume.get_network_volume_diagnostics(), first)
+            self.assertEqual(collect.call_count, 1)
+
+            refreshed = network_volume.get_network_volume_diagnostics(refresh=True)
+
+        self.assertEqual(collect.call_count, 2)
+        self.assertIsNot(refreshed, first)
+        self.assertIn("style.safetensors (10.0 B)", out.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
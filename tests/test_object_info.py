@@ -0,0 +1,157 @@
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+from object_info import ObjectInfoCache, format_errors, is_link, validate_workflow
+
+OBJECT_INFO = {
+    "UNETLoader": {
+        "input": {
+            "required": {
+                "unet_name": [["z_image_turbo.safetensors"], {}],
+                "weight_dtype": ["COMBO", {"options": ["default", "fp8_e4m3fn"]}],
+            }
+        },
+        "output": ["MODEL"],
+    },
+    "KSampler": {
+        "input": {
+            "required": {
+                "model": ["MODEL", {}],
+                "steps": ["INT", {"default": 20, "min": 1, "max": 10000}],
+                "cfg": ["FLOAT", {"min": 0.0, "max": 100.0}],
+            }
+        },
+        "output": ["LATENT"],
+    },
+    "VAEDecode": {
+        "input": {"required": {"samples": ["LATENT", {}]}},
+        "output": ["IMAGE"],
+    },
+    "LoadImage": {
+        "input": {"required": {"image": [["existing.png"], {"image_upload": True}]}},
+        "output": ["IMAGE", "MASK"],
+    },
+    "SaveImage": {
+        "input": {"required": {"images": ["IMAGE", {}]}},
+        "output": [],
+        "output_node": True,
+    },
+}
+
+
+def _workflow(**overrides):
+    workflow = {
+        "1": {
+            "class_type": "UNETLoader",
+            "inputs": {"unet_name": "z_image_turbo.safetensors", "weight_dtype": "default"},
+        },
+        "2": {"class_type": "KSampler", "inputs": {"model": ["1", 0], "steps": 8, "cfg": 1.0}},
+        "3": {"class_type": "VAEDecode", "inputs": {"samples": ["2", 0]}},
+        "4": {"class_type": "SaveImage", "inputs": {"images": ["3", 0]}},
+        "5": {"class_type": "LoadImage", "inputs": {"image": "uploaded_by_job.png"}},
+        "6": {"class_type": "SaveImage", "inputs": {"images": ["5", 0]}},
+        # Feeds no output node, so ComfyUI never validates it
+        "7": {"class_type": "KSampler", "inputs": {"model": ["1", 0], "steps": -1}},
+    }
+    for path, value in overrides.items():
+        node, name = path.split("__")
+        workflow[node]["inputs"][name] = value
+    return workflow
+
+
+class TestValidateWorkflow(unittest.TestCase):
+    def test_valid_workflow(self):
+        self.assertEqual(validate_workflow(_workflow(), OBJECT_INFO), [])
+
+    def test_loader_option_lists_are_checked(self):
+        errors = validate_workflow(
+            _workflow(**{"1__unet_name": "missing.safetensors", "1__weight_dtype": "fp4"}),
+            OBJECT_INFO,
+        )
+
+        self.assertEqual(len(errors), 2)
+        self.assertTrue(all(e["options"] for e in errors))
+        self.assertEqual(errors[0]["value"], "missing.safetensors")
+        self.assertIn(
+            "• Node 1 (UNETLoader): Value not in list: unet_name: 'missing.safetensors' not in ['z_image_turbo.safetensors']",
+            format_errors(errors),
+        )
+
+    def test_numbers_and_links_are_checked(self):
+        workflow = _workflow(**{"2__steps": 0, "2__cfg": "high"})
+        workflow["6"]["inputs"]["images"] = ["1", 0]
+
+        messages = [e["message"] for e in validate_workflow(workflow, OBJECT_INFO)]
+
+        self.assertIn("Value 0 smaller than min of 1: steps", messages)
+        self.assertIn("Failed to convert an input value to a FLOAT value: cfg, 'high'", messages)
+        self.assertIn(
+            "Return type mismatch between linked nodes: images, received_type(MODEL) mismatch input_type(IMAGE)",
+            messages,
+        )
+
+    def test_unknown_nodes_and_missing_inputs(self):
+        workflow = _workflow()
+        del workflow["2"]["inputs"]["steps"]
+        self.assertEqual(
+            [e["message"] for e in validate_workflow(workflow, OBJECT_INFO)],
+            ["Required input is missing: steps"],
+        )
+
+        workflow["8"] = {"class_type": "NotInstalled", "inputs": {}}
+        self.assertEqual(
+            [e["message"] for e in validate_workflow(workflow, OBJECT_INFO)],
+            ["Node type 'NotInstalled' not found"],
+        )
+
+    def test_custom_node_values_only_warn(self):
+        # Custom nodes may accept any value through VALIDATE_INPUTS
+        object_info = dict(OBJECT_INFO)
+        object_info["UNETLoader"] = {**OBJECT_INFO["UNETLoader"], "python_module": "custom_nodes.gguf"}
+        workflow = _workflow(**{"1__unet_name": "remote/model.gguf", "2__steps": 0})
+        warnings = []
+
+        errors = validate_workflow(workflow, object_info, warnings=warnings)
+
+        self.assertEqual([e["message"] for e in errors], ["Value 0 smaller than min of 1: steps"])
+        self.assertEqual([(w["node"], w["value"]) for w in warnings], [("1", "remote/model.gguf")])
+
+    def test_links(self):
+        self.assertTrue(is_link(["12", 0]))
+        self.assertFalse(is_link([12, 0]))
+        self.assertFalse(is_link(["a", "b"]))
+        self.assertFalse(is_link(["12", 0, 1]))
+
+
+class TestObjectInfoCache(unittest.TestCase):
+    def test_fetched_once_until_invalidated(self):
+        fetches = []
+        cache = ObjectInfoCache(lambda: fetches.append(1) or OBJECT_INFO)
+
+        self.assertIs(cache.get(), OBJECT_INFO)
+        cache.get()
+        self.assertEqual(len(fetches), 1)
+
+        cache.invalidate()
+        cache.get()
+        self.assertEqual(len(fetches), 2)
+
+    def test_empty_or_failed_fetch_is_not_cached(self):
+        results = [{}, RuntimeError("down"), OBJECT_INFO]
+
+        def fetch():
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        cache = ObjectInfoCache(fetch)
+        self.assertFalse(cache.get())
+        self.assertIsNone(cache.get())
+        self.assertIs(cache.get(), OBJECT_INFO)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+import sys
+import os
+import io
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+from PIL import Image, PngImagePlugin
+
+from output_encoding import OutputOptions, parse_output_options, transcode
+
+
+def _png(size=(512, 384), mode="RGB", text=None):
+    image = Image.linear_gradient("L").resize(size).convert(mode)
+    pnginfo = PngImagePlugin.PngInfo()
+    for key, value in (text or {}).items():
+        pnginfo.add_text(key, value)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", pnginfo=pnginfo)
+    return buffer.getvalue()
+
+
+class TestParseOutputOptions(unittest.TestCase):
+    def test_defaults_keep_comfyui_bytes(self):
+        options, error = parse_output_options({})
+        self.assertIsNone(error)
+        self.assertFalse(options.transcode)
+
+    def test_valid_options(self):
+        options, error = parse_output_options(
+            {"output_format": "JPG", "quality": 80, "max_size": 512, "strip_metadata": True}
+        )
+        self.assertIsNone(error)
+        self.assertEqual(
+            (options.output_format, options.quality, options.max_size, options.strip_metadata),
+            ("jpeg", 80, 512, True),
+        )
+
+    def test_invalid_options(self):
+        for job_input, message in (
+            ({"output_format": "gif"}, "'output_format' must be one of png, jpeg, webp, avif"),
+            ({"quality": 0}, "'quality' must be an integer from 1 to 100"),
+            ({"quality": True}, "'quality' must be an integer from 1 to 100"),
+            ({"max_size": "1024"}, "'max_size' must be an integer from 1 to 8192"),
+            ({"strip_metadata": "yes"}, "'strip_metadata' must be a boolean"),
+        ):
+            self.assertEqual(parse_output_options(job_input), (None, message))
+
+
+class TestTranscode(unittest.TestCase):
+    def test_lossy_format_is_smaller(self):
+        png = _png()
+        encoded, extension, stats = transcode(png, OutputOptions("webp", quality=80))
+
+        self.assertEqual(extension, "webp")
+        self.assertEqual(Image.open(io.BytesIO(encoded)).format, "WEBP")
+        self.assertEqual((stats["format"], stats["bytes_in"]), ("webp", len(png)))
+        self.assertLess(stats["bytes_out"], stats["bytes_in"])
+        self.assertGreaterEqual(stats["encode_ms"], 0)
+
+    def test_resize_keeps_aspect_ratio_and_never_enlarges(self):
+        encoded, extension, _ = transcode(_png(), OutputOptions(max_size=256))
+        self.assertEqual(extension, "png")
+        self.assertEqual(Image.open(io.BytesIO(encoded)).size, (256, 192))
+
+        encoded, _, _ = transcode(_png(), OutputOptions(max_size=4096))
+        self.assertEqual(Image.open(io.BytesIO(encoded)).size, (512, 384))
+
+    def test_metadata_is_kept_unless_stripped(self):
+        png = _png(text={"workflow": "{}"})
+
+        kept, _, _ = transcode(png, OutputOptions(max_size=128))
+        self.assertEqual(Image.open(io.BytesIO(kept)).info.get("workflow"), "{}")
+        stripped, _, _ = transcode(png, OutputOptions(strip_metadata=True))
+        self.assertNotIn("workflow", Image.open(io.BytesIO(stripped)).info)
+
+    def test_jpeg_drops_alpha(self):
+        encoded, extension, _ = transcode(_png(mode="RGBA"), OutputOptions("jpeg"))
+        self.assertEqual(extension, "jpg")
+        self.assertEqual(Image.open(io.BytesIO(encoded)).mode, "RGB")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+import sys
+import os
+import base64
+import io
+import struct
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+from PIL import Image
+
+from progress import ProgressReporter, decode_preview
+
+WORKFLOW = {
+    "1": {"class_type": "EmptySD3LatentImage", "inputs": {}},
+    "28:3": {"class_type": "KSampler", "inputs": {"steps": 30}},
+}
+
+
+def _png(width, height):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "orange").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _progress(value, node="28:3"):
+    return {"type": "progress", "data": {"value": value, "max": 30, "node": node}}
+
+
+class TestDecodePreview(unittest.TestCase):
+    def test_preview_is_downscaled_to_jpeg(self):
+        frame = struct.pack(">II", 1, 2) + _png(512, 256)
+
+        image = Image.open(io.BytesIO(base64.b64decode(decode_preview(frame, 128))))
+        self.assertEqual((image.format, image.size), ("JPEG", (128, 64)))
+
+    def test_other_frames_are_ignored(self):
+        self.assertIsNone(decode_preview(struct.pack(">II", 3, 0) + b"text", 128))
+        self.assertIsNone(decode_preview(b"\x00", 128))
+
+
+class TestProgressReporter(unittest.TestCase):
+    def test_updates_are_throttled(self):
+        reporter = ProgressReporter(WORKFLOW, interval_s=60)
+
+        first = reporter.update(_progress(1))
+        self.assertEqual(
+            first,
+            {"status": "running", "node": "28:3", "class_type": "KSampler", "step": 1, "steps": 30, "percent": 3.3},
+        )
+        for step in range(2, 31):
+            self.assertIsNone(reporter.update(_progress(step)))
+        self.assertEqual((reporter.sent, reporter.dropped), (1, 29))
+
+    def test_batched_node_ids_are_mapped_back(self):
+        reporter = ProgressReporter(WORKFLOW, interval_s=0)
+
+        update = reporter.update({"type": "executing", "data": {"node": "2:28:3"}})
+        self.assertEqual((update["node"], update["class_type"]), ("28:3", "KSampler"))
+        self.assertNotIn("step", update)
+
+    def test_previews_only_when_enabled(self):
+        frame = {"type": "binary", "data": {}, "payload": struct.pack(">II", 1, 2) + _png(64, 64)}
+
+        self.assertIsNone(ProgressReporter(WORKFLOW, interval_s=0).update(frame))
+        update = ProgressReporter(WORKFLOW, interval_s=0, preview_max_size=32).update(frame)
+        self.assertIn("preview", update)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import unittest
+import sys
+import os
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+from queue_gate import ComfyQueueGate, model_fingerprint
+
+
+class TestComfyQueueGate(unittest.TestCase):
+    def test_limits_prompts_in_comfy(self):
+        gate = ComfyQueueGate(2, lambda: None)
+        self.assertTrue(gate.acquire(timeout=0.1))
+        self.assertTrue(gate.acquire(timeout=0.1))
+        self.assertFalse(gate.acquire(timeout=0.1))
+
+        gate.release()
+        self.assertTrue(gate.acquire(timeout=0.1))
+        self.assertEqual(gate.in_comfy, 2)
+
+    def test_honours_reported_queue_size(self):
+        reported = {"queue_remaining": 2}
+        gate = ComfyQueueGate(2, lambda: reported["queue_remaining"])
+        self.assertFalse(gate.acquire(timeout=0.1))
+
+        reported["queue_remaining"] = 1
+        self.assertTrue(gate.acquire(timeout=0.1))
+
+    def test_release_wakes_waiting_job(self):
+        gate = ComfyQueueGate(1, lambda: None)
+        gate.acquire()
+        acquired = threading.Event()
+
+        def wait_for_slot():
+            gate.acquire()
+            acquired.set()
+
+        threading.Thread(target=wait_for_slot, daemon=True).start()
+        self.assertFalse(acquired.wait(0.1))
+        gate.release()
+        self.assertTrue(acquired.wait(1))
+
+    def test_aborted_wait_gives_up_when_notified(self):
+        gate = ComfyQueueGate(1, lambda: None)
+        gate.acquire()
+        aborted = threading.Event()
+        result = []
+
+        def wait_for_slot():
+            result.append(gate.acquire(abort=aborted.is_set))
+
+        waiter = threading.Thread(target=wait_for_slot, daemon=True)
+        waiter.start()
+        time.sleep(0.05)
+        aborted.set()
+        gate.notify()
+        waiter.join(1)
+
+        self.assertEqual(result, [False])
+        self.assertEqual(gate.stats()["waiting"], 0)
+
+
+def _lora_workflow(lora="character.safetensors", strength=1.0, seed=1, prefix=""):
+    return {
+        f"{prefix}1": {"class_type": "UNETLoader", "inputs": {"unet_name": "z_image.safetensors"}},
+        f"{prefix}2": {
+            "class_type": "LoraLoaderModelOnly",
+            "inputs": {"model": [f"{prefix}1", 0], "lora_name": lora, "strength_model": strength},
+        },
+        f"{prefix}3": {"class_type": "KSampler", "inputs": {"model": [f"{prefix}2", 0], "seed": seed}},
+    }
+
+
+class TestModelFingerprint(unittest.TestCase):
+    def test_only_the_loaders_count(self):
+        base = model_fingerprint(_lora_workflow())
+        self.assertEqual(base, model_fingerprint(_lora_workflow(seed=2, prefix="x")))
+        self.assertNotEqual(base, model_fingerprint(_lora_workflow(strength=0.5)))
+        self.assertNotEqual(base, model_fingerprint(_lora_workflow(lora="realism.safetensors")))
+        self.assertIsNone(model_fingerprint({"1": {"class_type": "EmptyLatentImage", "inputs": {}}}))
+
+
+class TestAffinityOrdering(unittest.TestCase):
+    def setUp(self):
+        self.admitted = []
+
+    def queue_waiters(self, gate, fingerprints):
+        for fingerprint in fingerprints:
+            waiting = gate.stats()["waiting"]
+
+            def wait_for_slot(fingerprint=fingerprint):
+                gate.acquire(fingerprint=fingerprint)
+                self.admitted.append(fingerprint)
+
+            threading.Thread(target=wait_for_slot, daemon=True).start()
+            while gate.stats()["waiting"] == waiting:
+                time.sleep(0.01)
+
+    def release_and_wait(self, gate):
+        count = len(self.admitted)
+        gate.release()
+        deadline = time.monotonic() + 1
+        while len(self.admitted) == count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.admitted[-1]
+
+    def test_jobs_matching_resident_models_go_first(self):
+        gate = ComfyQueueGate(1, lambda: None, max_skips=3)
+        gate.acquire(fingerprint="A")
+        self.queue_waiters(gate, ["B", "A"])
+
+        self.assertEqual(self.release_and_wait(gate), "A")
+        self.assertEqual(self.release_and_wait(gate), "B")
+        self.assertEqual(gate.stats(), {"admitted": 3, "swaps": 1, "swaps_avoided": 1, "waiting": 0})
+
+    def test_passed_over_job_is_not_starved(self):
+        gate = ComfyQueueGate(1, lambda: None, max_skips=1)
+        gate.acquire(fingerprint="A")
+        self.queue_waiters(gate, ["B", "A", "A"])
+
+        self.assertEqual([self.release_and_wait(gate) for _ in range(3)], ["A", "B", "A"])
+
+    def test_strict_arrival_order_without_skips(self):
+        gate = ComfyQueueGate(1, lambda: None)
+        gate.acquire(fingerprint="A")
+        self.queue_waiters(gate, ["B", "A"])
+
+        self.assertEqual([self.release_and_wait(gate) for _ in range(2)], ["B", "A"])
+        self.assertEqual(gate.stats()["swaps_avoided"], 0)
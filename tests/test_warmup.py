@@ -0,0 +1,58 @@
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+from warmup import WarmupTimeline, warmup_workflow
+from workflow_templates import WorkflowTemplate
+
+TEMPLATE = WorkflowTemplate(
+    "tiny",
+    {
+        "params": {
+            "width": {"type": "int", "targets": [{"node": "1", "input": "width"}]},
+            "steps": {"type": "int", "targets": [{"node": "2", "input": "steps"}]},
+        },
+        "workflow": {
+            "1": {"class_type": "EmptySD3LatentImage", "inputs": {"width": 1024}},
+            "2": {"class_type": "KSampler", "inputs": {"latent_image": ["1", 0], "steps": 8}},
+            "3": {"class_type": "VAEDecode", "inputs": {"samples": ["2", 0]}},
+            "4": {"class_type": "SaveImage", "inputs": {"images": ["3", 0], "filename_prefix": "z"}},
+        },
+    },
+)
+
+
+class TestWarmupWorkflow(unittest.TestCase):
+    def test_binds_known_params_and_previews_instead_of_saving(self):
+        workflow = warmup_workflow(TEMPLATE, {"width": 256, "steps": 1, "height": 256})
+
+        self.assertEqual(workflow["1"]["inputs"]["width"], 256)
+        self.assertEqual(workflow["2"]["inputs"]["steps"], 1)
+        self.assertEqual(workflow["4"], {"class_type": "PreviewImage", "inputs": {"images": ["3", 0]}})
+        # The template itself is untouched
+        self.assertEqual(TEMPLATE.workflow["4"]["class_type"], "SaveImage")
+
+
+class TestWarmupTimeline(unittest.TestCase):
+    def test_phases_follow_the_prompt_events(self):
+        timeline = WarmupTimeline(0)
+        timeline.watch(warmup_workflow(TEMPLATE, {}))
+        timeline.mark("server_up")
+        timeline.on_event({"type": "executing", "data": {"node": "1"}})
+        self.assertFalse(timeline.reached("models_loaded"))
+        timeline.on_event({"type": "executing", "data": {"node": "2"}})
+        timeline.on_event({"type": "progress", "data": {"value": 1, "max": 1}})
+        timeline.on_event({"type": "progress", "data": {"value": 2, "max": 2}})
+        timeline.mark("done")
+
+        report = timeline.report()
+        self.assertEqual(
+            [p["phase"] for p in report["phases"]],
+            ["server_up", "models_loaded", "first_sample", "done"],
+        )
+        self.assertEqual(report["total_ms"], report["phases"][-1]["at_ms"])
+
+
+if __name__ == "__main__":
+    unittest.main()
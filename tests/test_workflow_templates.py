@@ -0,0 +1,94 @@
+import unittest
+import sys
+import os
+import json
+import shutil
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(os.path.join(ROOT, "src"))
+from workflow_templates import TemplateError, WorkflowTemplate, load_templates
+
+TEMPLATE = {
+    "params": {
+        "prompt": {
+            "type": "string",
+            "targets": [{"node": "2", "input": "text", "format": "fixed, {value}, tags"}],
+        },
+        "seed": {"type": "int", "default": "random", "min": 0, "targets": [{"node": "1", "input": "seed"}]},
+        "size": {
+            "type": "int",
+            "choices": [512, 1024],
+            "targets": [{"node": "1", "input": "width"}, {"node": "1", "input": "height"}],
+        },
+    },
+    "workflow": {
+        "1": {"class_type": "KSampler", "inputs": {"seed": 1, "width": 1024, "height": 1024}},
+        "2": {"class_type": "CLIPTextEncode", "inputs": {"text": "fixed, a cat, tags"}},
+    },
+}
+
+
+class TestWorkflowTemplate(unittest.TestCase):
+    def setUp(self):
+        self.template = WorkflowTemplate("test", TEMPLATE)
+
+    def test_params_are_bound_into_a_copy(self):
+        workflow = self.template.bind({"prompt": "a dog", "seed": 7, "size": 512})
+
+        self.assertEqual(workflow["2"]["inputs"]["text"], "fixed, a dog, tags")
+        self.assertEqual(workflow["1"]["inputs"], {"seed": 7, "width": 512, "height": 512})
+        self.assertEqual(TEMPLATE["workflow"]["1"]["inputs"]["width"], 1024)
+
+        workflow["2"]["inputs"]["text"] = "changed by the job"
+        self.assertEqual(self.template.bind({})["2"]["inputs"]["text"], "fixed, a cat, tags")
+
+    def test_random_default(self):
+        seeds = {self.template.bind({})["1"]["inputs"]["seed"] for _ in range(5)}
+        self.assertGreater(len(seeds), 1)
+
+    def test_invalid_params_are_rejected(self):
+        for params, message in [
+            ({"steps": 5}, "Unknown parameter(s) for template 'test': steps"),
+            ({"seed": "5"}, "Parameter 'seed' must be of type int"),
+            ({"seed": True}, "Parameter 'seed' must be of type int"),
+            ({"seed": -1}, "Parameter 'seed' must be >= 0"),
+            ({"size": 768}, "Parameter 'size' must be one of [512, 1024]"),
+        ]:
+            with self.assertRaises(TemplateError) as ctx:
+                self.template.bind(params)
+            self.assertIn(message, str(ctx.exception))
+
+    def test_targets_are_checked_when_loading(self):
+        broken = json.loads(json.dumps(TEMPLATE))
+        broken["params"]["seed"]["targets"] = [{"node": "1", "input": "noise_seed"}]
+
+        with self.assertRaises(TemplateError):
+            WorkflowTemplate("broken", broken)
+
+
+class TestLoadTemplates(unittest.TestCase):
+    def test_shipped_templates_load(self):
+        templates = load_templates(os.path.join(ROOT, "src", "templates"))
+
+        template = templates["z_image_s4v4nn4h"]
+        with open(os.path.join(ROOT, "test_input.json")) as f:
+            reference = json.load(f)
+        workflow = template.bind({"seed": 1})
+        # Defaults reproduce the reference workflow
+        self.assertEqual(workflow["29"], reference["29"])
+        self.assertEqual(workflow["28:3"], reference["28:3"])
+
+    def test_broken_files_are_skipped(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with open(os.path.join(directory, "good.json"), "w") as f:
+            json.dump(TEMPLATE, f)
+        with open(os.path.join(directory, "bad.json"), "w") as f:
+            f.write("{not json")
+
+        self.assertEqual(list(load_templates(directory)), ["good"])
+
+
+if __name__ == "__main__":
+    unittest.main()